@@ -1,10 +1,16 @@
 from django.contrib import admin
-from .models import Course, Level, Module, Lesson, LessonProgress, Enrollment
+from .models import Course, Level, Module, Lesson, LessonProgress, Enrollment, Tag
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ['title', 'category', 'rating']
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'course_count']
+    readonly_fields = ['course_count']
+    search_fields = ['name']
+
 @admin.register(Level)
 class LevelAdmin(admin.ModelAdmin):
     list_display = ['name', 'course', 'order']
@@ -20,7 +26,7 @@ class LessonAdmin(admin.ModelAdmin):
 
 @admin.register(LessonProgress)
 class LessonProgressAdmin(admin.ModelAdmin):
-    list_display = ['user', 'lesson', 'watched_time', 'completed']
+    list_display = ['user', 'lesson', 'watched_time', 'completed', 'updated_at']
     list_filter = ['completed', 'lesson']
     search_fields = ['user__username', 'lesson__title']
 
@@ -0,0 +1,178 @@
+import json
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from users.authentication import AsyncJWTAuthentication
+
+from .cache import aget_course_structure, aget_lesson_course
+from .conditional import async_conditional_get, progress_scopes, structure_scopes
+from .models import Course, Enrollment, LessonProgress
+from .progress import save_progress
+from .progress_buffer import buffering_enabled, get_pending_progress, record_progress
+from .routers import async_read_replica
+from .sharding import shard_for
+from .serializers import LessonProgressSerializer
+from .user_stats import apply_stats
+
+# Versiones async (ASGI) de las vistas de progreso y estructura.
+# Se activan con COURSES_ASYNC_VIEWS = True (ver courses/urls.py) y responden
+# igual que las de courses.views.
+
+
+class AsyncAPIView(View):
+    authenticated = True
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Como las APIView de DRF: autenticación por JWT, sin CSRF
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.authenticated:
+            authenticator = AsyncJWTAuthentication()
+            try:
+                result = await authenticator.aauthenticate(request)
+            except (APIException, InvalidToken) as exc:
+                return self.auth_error(request, authenticator, exc)
+            if result is None:
+                return self.auth_error(request, authenticator, NotAuthenticated())
+            request.user, request.auth = result
+        return await super().dispatch(request, *args, **kwargs)
+
+    # Igual que el exception_handler de DRF: el detalle tal cual (InvalidToken
+    # trae un dict con code y messages) y WWW-Authenticate en los 401
+    def auth_error(self, request, authenticator, exc):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = JsonResponse(data, status=exc.status_code, safe=False)
+        header = authenticator.authenticate_header(request)
+        if header:
+            response['WWW-Authenticate'] = header
+        return response
+
+    def parse_body(self, request):
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+
+
+# Estructura completa de un curso (niveles, módulos, lecciones)
+class AsyncCourseStructureView(AsyncAPIView):
+    authenticated = False
+
+    @async_read_replica(structure_scopes)
+    @async_conditional_get(structure_scopes)
+    async def get(self, request, course_id):
+        data = await aget_course_structure(course_id)
+        if data is None:
+            return JsonResponse({"detail": "Curso no encontrado."}, status=404)
+        return JsonResponse(data)
+
+
+# Progreso de un curso para el usuario autenticado
+class AsyncCourseProgressView(AsyncAPIView):
+    @async_read_replica(progress_scopes)
+    @async_conditional_get(progress_scopes, per_user=True)
+    async def get(self, request, course_id):
+        counters = await Enrollment.objects.using(shard_for(request.user.id)).filter(
+            user=request.user, course_id=course_id
+        ).values_list('total_lessons', 'completed_lessons').afirst()
+        if counters is None:
+            if not await Course.objects.filter(id=course_id).aexists():
+                return JsonResponse({'detail': 'Curso no encontrado'}, status=404)
+            return JsonResponse({'progress': 0, 'completed': False, 'enrolled': False})
+        total_lessons, completed_lessons = counters
+        if total_lessons == 0:
+            return JsonResponse({'progress': 0, 'completed': False, 'enrolled': True})
+        progress_percent = min(int((completed_lessons / total_lessons) * 100), 100)
+        return JsonResponse({
+            'progress': progress_percent,
+            'completed': progress_percent == 100,
+            'enrolled': True
+        })
+
+
+# Progreso de todas las lecciones de un curso para el usuario autenticado
+class AsyncLessonProgressCourseView(AsyncAPIView):
+    @async_read_replica()
+    async def get(self, request):
+        course_id = request.GET.get('course_id')
+        progresses = LessonProgress.objects.using(shard_for(request.user.id)).filter(
+            user=request.user, course_id=course_id
+        ).values_list(
+            'lesson_id', 'watched_time', 'completed'
+        )
+        data = [
+            {"lesson": lesson_id, "watched_time": watched_time, "completed": completed}
+            async for lesson_id, watched_time, completed in progresses
+        ]
+        return JsonResponse(data, safe=False)
+
+
+# Guarda y recupera progreso de UNA lección (heartbeat del reproductor)
+class AsyncLessonProgressDetail(AsyncAPIView):
+    async def get(self, request, lesson_id):
+        pending = get_pending_progress(request.user.id, lesson_id) if buffering_enabled() else None
+        progress = await LessonProgress.objects.using(shard_for(request.user.id)).filter(
+            user=request.user, lesson_id=lesson_id
+        ).afirst()
+        if progress is None:
+            if pending:
+                return JsonResponse({'watched_time': pending[0], 'completed': pending[1]})
+            return JsonResponse({'watched_time': 0, 'completed': False})
+        if pending:
+            progress.watched_time = max(progress.watched_time, pending[0])
+            progress.completed = progress.completed or pending[1]
+        return JsonResponse(LessonProgressSerializer(progress).data)
+
+    async def put(self, request, lesson_id):
+        data = self.parse_body(request)
+        try:
+            watched_time = int(data.get('watched_time', 0))
+        except (AttributeError, TypeError, ValueError):
+            return JsonResponse({'detail': 'watched_time debe ser un número.'}, status=400)
+        completed = bool(data.get('completed', False))
+        user_id = request.user.id
+
+        if buffering_enabled():
+            # Acumular en memoria no bloquea; sólo la finalización escribe en la base
+            if await aget_lesson_course(lesson_id) is None:
+                return JsonResponse({'detail': 'Lección no encontrada'}, status=404)
+            if completed:
+                result = await sync_to_async(record_progress)(user_id, lesson_id, watched_time, completed)
+            else:
+                result = record_progress(user_id, lesson_id, watched_time, completed)
+            if result is None:
+                return JsonResponse({'detail': 'Lección no encontrada'}, status=404)
+            return JsonResponse({'lesson': lesson_id, **result}, status=202)
+
+        if not completed:
+            # Heartbeat habitual: un UPDATE con el ORM async condicionado al
+            # valor leído, para sumar a UserStats justo lo que avanza y mover
+            # updated_at como save_progress
+            progress_qs = LessonProgress.objects.using(shard_for(user_id)).filter(user_id=user_id, lesson_id=lesson_id)
+            progress = await progress_qs.afirst()
+            if progress is not None and watched_time <= progress.watched_time:
+                return JsonResponse(LessonProgressSerializer(progress).data)
+            if progress is not None:
+                previous, now = progress.watched_time, timezone.now()
+                if await progress_qs.filter(watched_time=previous).aupdate(watched_time=watched_time, updated_at=now):
+                    await sync_to_async(apply_stats)({user_id: Counter(watched_seconds=watched_time - previous)})
+                    progress.watched_time, progress.updated_at = watched_time, now
+                    return JsonResponse(LessonProgressSerializer(progress).data)
+
+        # Primera vez, lección completada u otra escritura a la vez: necesita
+        # transacción y contadores
+        results = await sync_to_async(save_progress)({(user_id, lesson_id): (watched_time, completed)})
+        progress = results.get((user_id, lesson_id))
+        if progress is None:
+            return JsonResponse({'detail': 'Lección no encontrada'}, status=404)
+        return JsonResponse(LessonProgressSerializer(progress).data)
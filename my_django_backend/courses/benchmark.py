@@ -0,0 +1,343 @@
+import random
+import time
+from contextlib import ExitStack
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import get_token_state
+
+from .cache import CATALOG_SCOPE, PROGRESS_SCOPE, bump_version, course_scope, user_scope
+from .loadtest import percentile
+from .models import Course, CourseTag, Enrollment, Lesson, LessonProgress, Level, Module, Tag
+from .search import get_search_backend
+from .sharding import progress_databases, shard_for, sharded_count
+from .tags import parse_tags, recount_tags
+from .user_stats import rebuild_user_stats
+
+# Datos sintéticos y banco de pruebas de los endpoints de courses/urls.py.
+#
+# generate_catalog() crea un catálogo grande con bulk_create en lotes de
+# batch_size filas: los objetos se generan de forma perezosa y los ids se
+# asignan de antemano, así que nunca hay más de un lote en memoria ni hace
+# falta releer lo insertado. Al terminar se ponen al día las secuencias de
+# esos ids (PostgreSQL), o el siguiente INSERT normal chocaría con ellos. Los
+# contadores (Tag.course_count, Enrollment.total_lessons/completed_lessons)
+# se calculan al generar.
+#
+# run_endpoints() pide cada endpoint varias veces con el cliente de pruebas,
+# cuenta las consultas en todas las bases de progreso y compara el máximo con
+# el presupuesto de ENDPOINTS.
+
+WORDS = [
+    'python', 'datos', 'redes', 'visión', 'lenguaje', 'modelos', 'estadística',
+    'agentes', 'nube', 'ética', 'robótica', 'señales', 'grafos', 'optimización',
+]
+CATEGORIES = ['IA', 'Programación', 'Datos', 'Negocios', 'Diseño']
+TAGS = ['ia', 'python', 'datos', 'web', 'cloud', 'ml', 'nlp', 'visión', 'estadística', 'ética', 'sql', 'api']
+BENCH_PASSWORD = 'bench-password'
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _next_id(model):
+    return (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+
+
+# Las secuencias no avanzan con ids explícitos; en SQLite no hay nada que hacer
+def _reset_sequences(*models):
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def bench_email(index):
+    return f'bench-user-{index}@example.com'
+
+
+# Usuarios con la misma contraseña (un solo hash) para poder iniciar sesión;
+# los que ya existen se conservan
+def create_bench_users(count, batch_size=5000):
+    password = make_password(BENCH_PASSWORD)
+    emails = [bench_email(index) for index in range(count)]
+    for batch in _batched(emails, batch_size):
+        User.objects.bulk_create(
+            [User(username=email, email=email, password=password) for email in batch], ignore_conflicts=True
+        )
+    user_ids = []
+    for batch in _batched(emails, 900):
+        user_ids.extend(User.objects.filter(username__in=batch).order_by('id').values_list('id', flat=True))
+    return user_ids
+
+
+def generate_catalog(courses=100, levels=2, modules=5, lessons=5, users=100, progress=10000,
+                     batch_size=5000, seed=0, log=None):
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    lessons_per_course = levels * modules * lessons
+    counts = {}
+
+    Tag.objects.bulk_create([Tag(name=name) for name in TAGS], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(name__in=TAGS).values_list('name', 'id'))
+
+    course_base = _next_id(Course)
+
+    def course_rows():
+        for index in range(courses):
+            first, second = rng.sample(WORDS, 2)
+            yield Course(
+                id=course_base + index,
+                title=f'{first.capitalize()} y {second} {index}',
+                description=f'Curso sintético de {first} aplicado a {second}.',
+                category=rng.choice(CATEGORIES),
+                tags=','.join(rng.sample(TAGS, 3)),
+                duration=f'{rng.randint(2, 12)} semanas',
+                rating=round(rng.uniform(3.0, 5.0), 1),
+                cover_image_url='https://example.com/cover.png',
+            )
+
+    counts['courses'] = 0
+    for batch in _batched(course_rows(), batch_size):
+        Course.objects.bulk_create(batch)
+        CourseTag.objects.bulk_create([
+            CourseTag(course_id=course.id, tag_id=tag_ids[name])
+            for course in batch for name in parse_tags(course.tags)
+        ])
+        counts['courses'] += len(batch)
+    recount_tags()
+    log(f"{counts['courses']} cursos")
+
+    # Ids consecutivos: las lecciones del curso i son lesson_base + i * lessons_per_course + k
+    level_base, module_base, lesson_base = _next_id(Level), _next_id(Module), _next_id(Lesson)
+
+    def level_rows():
+        for index in range(courses * levels):
+            yield Level(id=level_base + index, course_id=course_base + index // levels,
+                        name=f'Nivel {index % levels + 1}', order=index % levels + 1)
+
+    def module_rows():
+        for index in range(courses * levels * modules):
+            yield Module(id=module_base + index, level_id=level_base + index // modules,
+                         name=f'Módulo {index % modules + 1}', order=index % modules + 1)
+
+    def lesson_rows():
+        for index in range(courses * lessons_per_course):
+            yield Lesson(
+                id=lesson_base + index,
+                module_id=module_base + index // lessons,
+                course_id=course_base + index // lessons_per_course,
+                title=f'Lección {index % lessons + 1} de {rng.choice(WORDS)}',
+                duration=f'{rng.randint(3, 20)}:{rng.randint(0, 59):02}',
+                video_id='dQw4w9WgXcQ',
+                order=index % lessons + 1,
+            )
+
+    for name, model, rows in (('levels', Level, level_rows), ('modules', Module, module_rows),
+                              ('lessons', Lesson, lesson_rows)):
+        counts[name] = 0
+        for batch in _batched(rows(), batch_size):
+            model.objects.bulk_create(batch)
+            counts[name] += len(batch)
+        log(f'{counts[name]} {name}')
+    _reset_sequences(Course, Level, Module, Lesson)
+
+    user_ids = create_bench_users(users, batch_size)
+    counts['users'] = len(user_ids)
+    log(f"{counts['users']} usuarios")
+
+    # Progreso: cada usuario recorre cursos al azar, lección a lección, hasta su cuota
+    progress = min(progress, len(user_ids) * courses * lessons_per_course)
+    buffers = {'progress': {}, 'enrollments': {}}
+    counts['lesson_progress'] = counts['enrollments'] = 0
+
+    def flush(kind, alias, force=False):
+        rows = buffers[kind].get(alias)
+        if rows and (force or len(rows) >= batch_size):
+            model = LessonProgress if kind == 'progress' else Enrollment
+            model.objects.using(alias).bulk_create(rows)
+            counts['lesson_progress' if kind == 'progress' else 'enrollments'] += len(rows)
+            buffers[kind][alias] = []
+
+    for position, user_id in enumerate(user_ids):
+        quota = progress // len(user_ids) + (position < progress % len(user_ids))
+        alias = shard_for(user_id) or DEFAULT_DB_ALIAS
+        taken = -(-quota // lessons_per_course)
+        for course_index in rng.sample(range(courses), taken) if quota else ():
+            course_id = course_base + course_index
+            first_lesson = lesson_base + course_index * lessons_per_course
+            completed = 0
+            for offset in range(min(quota, lessons_per_course)):
+                done = rng.random() < 0.6
+                completed += done
+                buffers['progress'].setdefault(alias, []).append(LessonProgress(
+                    user_id=user_id, lesson_id=first_lesson + offset, course_id=course_id,
+                    watched_time=600 if done else rng.randint(1, 599), completed=done,
+                ))
+            quota -= min(quota, lessons_per_course)
+            buffers['enrollments'].setdefault(alias, []).append(Enrollment(
+                user_id=user_id, course_id=course_id,
+                total_lessons=lessons_per_course, completed_lessons=completed,
+            ))
+            flush('progress', alias)
+            flush('enrollments', alias)
+    for kind in buffers:
+        for alias in list(buffers[kind]):
+            flush(kind, alias, force=True)
+    log(f"{counts['lesson_progress']} filas de progreso, {counts['enrollments']} inscripciones")
+
+    get_search_backend().rebuild()
+    rebuild_user_stats(user_ids, chunk_size=batch_size)
+    # bulk_create no emite señales: invalidación explícita
+    bump_version(
+        CATALOG_SCOPE, PROGRESS_SCOPE,
+        *(course_scope(course_base + index) for index in range(courses)),
+        *(user_scope(user_id) for user_id in user_ids),
+    )
+    return counts
+
+
+def dataset_counts():
+    return {
+        'courses': Course.objects.count(),
+        'lessons': Lesson.objects.count(),
+        'users': User.objects.count(),
+        'enrollments': sharded_count(Enrollment.objects.all()),
+        'lesson_progress': sharded_count(LessonProgress.objects.all()),
+    }
+
+
+# Presupuesto de consultas por endpoint: máximo en cualquier iteración,
+# incluida la primera con las versiones de cache recién invalidadas.
+# `shard_queries` se suma por cada base de progreso además de 'default' en
+# los endpoints que recorren todos los shards.
+ENDPOINTS = [
+    {'name': 'course-list', 'method': 'get', 'path': '/api/courses/', 'max_queries': 2},
+    {'name': 'course-list-fields', 'method': 'get', 'path': '/api/courses/?page_size=50&fields=id,title,rating',
+     'max_queries': 2},
+    {'name': 'course-list-tags', 'method': 'get', 'path': '/api/courses/?tags=ia,python', 'max_queries': 2},
+    {'name': 'course-search', 'method': 'get', 'path': '/api/courses/search/?q={word}', 'max_queries': 5},
+    {'name': 'tag-list', 'method': 'get', 'path': '/api/tags/', 'max_queries': 1},
+    {'name': 'course-structure', 'method': 'get', 'path': '/api/courses/{course}/structure/', 'max_queries': 4},
+    {'name': 'enroll-course', 'method': 'post', 'path': '/api/courses/{course}/enroll/', 'max_queries': 2},
+    {'name': 'course-progress', 'method': 'get', 'path': '/api/courses/{course}/progress/', 'max_queries': 1},
+    {'name': 'lesson-progress-detail', 'method': 'get', 'path': '/api/lesson-progress/{lesson}/', 'max_queries': 1},
+    {'name': 'lesson-progress-put', 'method': 'put', 'path': '/api/lesson-progress/{lesson}/',
+     'body': {'watched_time': 30}, 'max_queries': 6},
+    {'name': 'lesson-progress-batch', 'method': 'post', 'path': '/api/lesson-progress/batch/',
+     'body': 'batch', 'max_queries': 7},
+    {'name': 'lesson-progress-list', 'method': 'get', 'path': '/api/lesson-progress/?course_id={course}',
+     'max_queries': 1},
+    {'name': 'user-bootstrap', 'method': 'get', 'path': '/api/user/bootstrap/', 'max_queries': 3},
+    # Endpoints de staff: el usuario del banco es is_staff
+    {'name': 'course-announcement', 'method': 'post', 'path': '/api/courses/{course}/announcements/',
+     'body': {'message': 'Anuncio del banco de pruebas'}, 'max_queries': 8, 'shard_queries': 1},
+    {'name': 'course-bulk-enroll', 'method': 'post', 'path': '/api/courses/{course}/enrollments/bulk/',
+     'upload': 'roster', 'max_queries': 10, 'shard_queries': 6},
+    {'name': 'report-progress', 'method': 'get', 'path': '/api/reports/progress/?course={course}',
+     'max_queries': 5, 'shard_queries': 1},
+    {'name': 'report-enrollments', 'method': 'get', 'path': '/api/reports/enrollments/?course={course}',
+     'max_queries': 4, 'shard_queries': 2},
+]
+
+
+def bench_context(course_id=None):
+    lessons = Lesson.objects.order_by('course_id', 'id')
+    if course_id is not None:
+        lessons = lessons.filter(course_id=course_id)
+    lesson_ids = list(lessons.filter(course_id=lessons.values('course_id')[:1]).values_list('id', flat=True)[:50])
+    if not lesson_ids:
+        return None
+    course = Course.objects.only('id', 'title').get(lessons=lesson_ids[0])
+    email = 'bench-endpoints@example.com'
+    user, _ = User.objects.update_or_create(username=email, defaults={'email': email, 'is_staff': True})
+    roster = User.objects.filter(username__startswith='bench-user-').order_by('id').values_list('email', flat=True)
+    return {
+        'course': course.id,
+        'lesson': lesson_ids[0],
+        'word': course.title.split()[0].lower(),
+        'batch': [{'lesson': lesson_id, 'watched_time': 60} for lesson_id in lesson_ids],
+        'roster': '\n'.join(['email', *roster[:50]]).encode(),
+        'user': user,
+    }
+
+
+def _capture_queries(stack):
+    aliases = dict.fromkeys([DEFAULT_DB_ALIAS, *progress_databases()])
+    return [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in aliases]
+
+
+def run_endpoint(client, endpoint, context, iterations):
+    path = endpoint['path'].format(**context)
+    body = endpoint.get('body')
+    if isinstance(body, str):
+        body = context[body]
+    # Primera iteración en frío: versiones nuevas para catálogo, curso y usuario
+    bump_version(CATALOG_SCOPE, PROGRESS_SCOPE, course_scope(context['course']), user_scope(context['user'].id))
+    timings, queries, statuses = [], [], set()
+    for _ in range(iterations):
+        if 'upload' in endpoint:
+            # Multipart con un fichero nuevo en cada petición
+            kwargs = {'data': {'file': SimpleUploadedFile('bench.csv', context[endpoint['upload']])}}
+        else:
+            kwargs = {'data': body, 'content_type': 'application/json'}
+        with ExitStack() as stack:
+            captures = _capture_queries(stack)
+            started = time.perf_counter()
+            response = getattr(client, endpoint['method'])(path, **kwargs)
+            if response.streaming:
+                # Las consultas de un informe se hacen al recorrer el contenido
+                b''.join(response.streaming_content)
+            timings.append(time.perf_counter() - started)
+        queries.append(sum(len(capture.captured_queries) for capture in captures))
+        statuses.add(response.status_code)
+    warm = timings[1:] or timings
+    budget = endpoint['max_queries'] + endpoint.get('shard_queries', 0) * (len(progress_databases()) - 1)
+    return {
+        'method': endpoint['method'].upper(),
+        'path': path,
+        'status': sorted(statuses),
+        'queries': max(queries),
+        'queries_warm': queries[-1],
+        'max_queries': budget,
+        'cold_ms': round(timings[0] * 1000, 3),
+        'mean_ms': round(sum(warm) / len(warm) * 1000, 3),
+        'p50_ms': round(percentile(warm, 50) * 1000, 3),
+        'p95_ms': round(percentile(warm, 95) * 1000, 3),
+        'ok': max(queries) <= budget and max(statuses) < 400,
+    }
+
+
+def run_endpoints(iterations=20, course_id=None, endpoints=None):
+    context = bench_context(course_id)
+    if context is None:
+        return None
+    Enrollment.objects.using(shard_for(context['user'].id)).get_or_create(
+        user=context['user'], course_id=context['course']
+    )
+    # La fila de UserStats se crea una vez por usuario, no en cada petición
+    rebuild_user_stats([context['user'].id])
+    # El estado del usuario (is_active, versión de tokens) se lee una vez cada TTL, no por petición
+    get_token_state(context['user'].id)
+    client = Client(headers={'Authorization': f"Bearer {AccessToken.for_user(context['user'])}"})
+    return {
+        'dataset': dataset_counts(),
+        'iterations': iterations,
+        'endpoints': {
+            endpoint['name']: run_endpoint(client, endpoint, context, iterations)
+            for endpoint in endpoints or ENDPOINTS
+        },
+    }
@@ -0,0 +1,141 @@
+import codecs
+import csv
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .cache import bump_version, user_scope
+from .counters import recount_enrollments
+from .models import Enrollment
+from .sharding import shard_for
+from .user_stats import apply_stats, enrollment_delta
+
+# Inscripción masiva de un curso desde un CSV de correos. El fichero se lee
+# fila a fila y se procesa en lotes de CHUNK_SIZE: una consulta IN para los
+# usuarios, otra por shard para las inscripciones que ya existen y un
+# bulk_create(ignore_conflicts=True) para las nuevas, así que la memoria no
+# depende del tamaño del fichero. bulk_create no emite señales: contadores,
+# UserStats y versiones de cache se actualizan aquí.
+
+CHUNK_SIZE = 1000
+ENCODING = 'utf-8-sig'
+
+INVALID_EMAIL = 'Correo no válido'
+UNKNOWN_USER = 'Usuario no encontrado'
+INACTIVE_USER = 'Usuario inactivo'
+DUPLICATE = 'Repetido en el fichero'
+
+
+# Comprueba que todo el fichero (binario, con seek) se decodifica antes de
+# inscribir a nadie: un error a mitad dejaría confirmados los lotes
+# anteriores. Lee por bloques, vuelve al principio y lanza UnicodeDecodeError.
+def check_encoding(binary, encoding=ENCODING, block_size=64 * 1024):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while block := binary.read(block_size):
+        decoder.decode(block)
+    decoder.decode(b'', final=True)
+    binary.seek(0)
+
+
+# (línea, correo) de cada fila con datos. Si la primera fila tiene una
+# columna "email" se usa esa columna; si no, la primera.
+def read_emails(lines):
+    reader = csv.reader(lines)
+    column = 0
+    for row in reader:
+        cells = [cell.strip() for cell in row]
+        if not any(cells):
+            continue
+        if reader.line_num == 1 and 'email' in (cell.lower() for cell in cells):
+            column = [cell.lower() for cell in cells].index('email')
+            continue
+        yield reader.line_num, cells[column] if column < len(cells) else ''
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Inscribe en course_id a los usuarios de `lines` (iterable de líneas CSV).
+# Cada fila que no se puede inscribir se pasa a on_error(línea, correo, motivo).
+# Devuelve el recuento {'rows', 'enrolled', 'already_enrolled', 'failed'}.
+def bulk_enroll(course_id, lines, chunk_size=CHUNK_SIZE, on_error=None):
+    report = Counter(rows=0, enrolled=0, already_enrolled=0, failed=0)
+
+    def fail(line, email, reason):
+        report['failed'] += 1
+        if on_error is not None:
+            on_error(line, email, reason)
+
+    for chunk in _chunks(read_emails(lines), chunk_size):
+        report['rows'] += len(chunk)
+        # Los repetidos se detectan dentro del lote; entre lotes cuentan como
+        # ya inscritos (recordar todo el fichero no sería memoria constante)
+        valid = {}
+        for line, email in chunk:
+            try:
+                validate_email(email)
+            except ValidationError:
+                fail(line, email, INVALID_EMAIL)
+                continue
+            key = email.lower()
+            if key in valid:
+                fail(line, email, DUPLICATE)
+                continue
+            valid[key] = (line, email)
+        if not valid:
+            continue
+
+        # Los correos se comparan sin distinguir mayúsculas en los dos lados
+        users = {}
+        matches = (
+            get_user_model().objects.annotate(email_key=Lower('email')).filter(email_key__in=valid)
+            .order_by('id').values_list('id', 'email_key', 'is_active')
+        )
+        for user_id, key, is_active in matches:
+            users.setdefault(key, (user_id, is_active))
+        per_shard = defaultdict(list)
+        for key, (line, email) in valid.items():
+            if key not in users:
+                fail(line, email, UNKNOWN_USER)
+            elif not users[key][1]:
+                fail(line, email, INACTIVE_USER)
+            else:
+                per_shard[shard_for(users[key][0])].append(users[key][0])
+
+        for alias, user_ids in per_shard.items():
+            enrolled, existing = _enroll_shard(alias, course_id, user_ids)
+            report['enrolled'] += enrolled
+            report['already_enrolled'] += existing
+    return dict(report)
+
+
+def _enroll_shard(alias, course_id, user_ids):
+    enrollments = Enrollment.objects.using(alias).filter(course_id=course_id)
+    with transaction.atomic(using=alias):
+        existing = set(enrollments.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        new_ids = [user_id for user_id in user_ids if user_id not in existing]
+        if not new_ids:
+            return 0, len(existing)
+        Enrollment.objects.using(alias).bulk_create(
+            [Enrollment(user_id=user_id, course_id=course_id) for user_id in new_ids], ignore_conflicts=True
+        )
+        # Contadores iniciales como en init_enrollment_counters (cuenta el
+        # progreso previo a la inscripción)
+        created = enrollments.filter(user_id__in=new_ids)
+        recount_enrollments(created)
+        counters = list(created.values_list('user_id', 'total_lessons', 'completed_lessons'))
+        bump_version(*(user_scope(user_id) for user_id in new_ids), using=alias)
+    apply_stats({user_id: enrollment_delta(None, (total, completed)) for user_id, total, completed in counters})
+    return len(new_ids), len(existing)
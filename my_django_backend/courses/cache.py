@@ -0,0 +1,175 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import Course, Lesson, Level, Module
+
+MISSING = 'missing'
+
+
+def get_cache():
+    return caches[getattr(settings, 'COURSES_CACHE_ALIAS', 'default')]
+
+
+# Versiones de contenido. Cada ámbito ('course:<id>', ...) guarda la marca de
+# tiempo de su último cambio; las claves de datos incluyen esa versión, así que
+# al cambiarla las entradas anteriores simplemente dejan de usarse.
+#
+# Las versiones caducan a los COURSES_CACHE_VERSION_TIMEOUT segundos. Con una
+# cache por proceso (LocMemCache) la versión que renueva un worker no llega a
+# los demás: como mucho ese tiempo después su clave caduca, se crea otra y se
+# vuelve a leer la base. Con una cache compartida puede ser None (sin caducidad).
+def _version_key(scope):
+    return f'courses:version:{scope}'
+
+
+def version_timeout():
+    return getattr(settings, 'COURSES_CACHE_VERSION_TIMEOUT', 60)
+
+
+def get_version(scope):
+    cache = get_cache()
+    version = cache.get(_version_key(scope))
+    if version is None:
+        # Sin versión conocida (cache vacía o expulsada): se crea una nueva
+        version = time.time()
+        if not cache.add(_version_key(scope), version, timeout=version_timeout()):
+            version = cache.get(_version_key(scope), version)
+    return version
+
+
+# Se aplica al confirmar la transacción: si se hiciera antes, una lectura
+# concurrente podría cachear datos antiguos bajo la versión nueva.
+async def aget_version(scope):
+    cache = get_cache()
+    version = await cache.aget(_version_key(scope))
+    if version is None:
+        version = time.time()
+        if not await cache.aadd(_version_key(scope), version, timeout=version_timeout()):
+            version = await cache.aget(_version_key(scope), version)
+    return version
+
+
+# `using` es el alias de la transacción que escribe los datos (el shard del
+# progreso); sin él se espera a la de 'default'
+def bump_version(*scopes, using=None):
+    def bump():
+        get_cache().set_many({_version_key(scope): time.time() for scope in scopes}, timeout=version_timeout())
+    transaction.on_commit(bump, using=using)
+
+
+# Ámbitos: el catálogo, la estructura de cada curso, el progreso de cada
+# usuario y una época global de progreso (para recálculos masivos).
+CATALOG_SCOPE = 'catalog'
+PROGRESS_SCOPE = 'progress'
+
+
+def course_scope(course_id):
+    return f'course:{course_id}'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def build_course_structure(course_id):
+    lessons = Lesson.objects.order_by('order')
+    modules = Module.objects.order_by('order').prefetch_related(Prefetch('lessons', queryset=lessons))
+    levels = Level.objects.order_by('order').prefetch_related(Prefetch('modules', queryset=modules))
+    try:
+        course = Course.objects.prefetch_related(Prefetch('levels', queryset=levels)).get(id=course_id)
+    except Course.DoesNotExist:
+        return None
+
+    return {
+        "id": course.id,
+        "title": course.title,
+        "description": course.description,
+        "cover_image_url": course.cover_image_url,
+        "levels": [
+            {
+                "id": level.id,
+                "name": level.name,
+                "order": level.order,
+                "modules": [
+                    {
+                        "id": module.id,
+                        "name": module.name,
+                        "order": module.order,
+                        "lessons": [
+                            {
+                                "id": lesson.id,
+                                "title": lesson.title,
+                                "duration": lesson.duration,
+                                "video_id": lesson.video_id,
+                                "order": lesson.order,
+                            }
+                            for lesson in module.lessons.all()
+                        ]
+                    }
+                    for module in level.modules.all()
+                ]
+            }
+            for level in course.levels.all()
+        ]
+    }
+
+
+def _structure_key(course_id, version):
+    return f'courses:structure:{course_id}:{version}'
+
+
+# Estructura serializada de un curso, cacheada por versión de contenido (y
+# como mucho version_timeout() segundos). Devuelve None si el curso no existe.
+def get_course_structure(course_id):
+    cache = get_cache()
+    key = _structure_key(course_id, get_version(course_scope(course_id)))
+    data = cache.get(key)
+    if data is None:
+        data = build_course_structure(course_id)
+        cache.set(key, MISSING if data is None else data, timeout=version_timeout())
+    return None if data == MISSING else data
+
+
+async def aget_course_structure(course_id):
+    cache = get_cache()
+    key = _structure_key(course_id, await aget_version(course_scope(course_id)))
+    data = await cache.aget(key)
+    if data is None:
+        # Sólo en un fallo de cache: la construcción con prefetch es síncrona
+        data = await sync_to_async(build_course_structure)(course_id)
+        await cache.aset(key, MISSING if data is None else data, timeout=version_timeout())
+    return None if data == MISSING else data
+
+
+def _lesson_key(lesson_id, version):
+    return f'courses:lesson:{lesson_id}:{version}'
+
+
+# Curso de una lección, cacheado con la versión del catálogo: el buffer de
+# heartbeats lo consulta antes de aceptar progreso. Sólo se cachean las
+# lecciones que existen; un id inexistente es una consulta por clave primaria.
+def get_lesson_course(lesson_id):
+    cache = get_cache()
+    key = _lesson_key(lesson_id, get_version(CATALOG_SCOPE))
+    course_id = cache.get(key)
+    if course_id is None:
+        course_id = Lesson.objects.filter(id=lesson_id).values_list('course_id', flat=True).first()
+        if course_id is not None:
+            cache.set(key, course_id, timeout=version_timeout())
+    return course_id
+
+
+async def aget_lesson_course(lesson_id):
+    cache = get_cache()
+    key = _lesson_key(lesson_id, await aget_version(CATALOG_SCOPE))
+    course_id = await cache.aget(key)
+    if course_id is None:
+        course_id = await Lesson.objects.filter(id=lesson_id).values_list('course_id', flat=True).afirst()
+        if course_id is not None:
+            await cache.aset(key, course_id, timeout=version_timeout())
+    return course_id
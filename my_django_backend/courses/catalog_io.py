@@ -0,0 +1,304 @@
+import json
+import re
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+
+from .cache import CATALOG_SCOPE, bump_version, course_scope
+from .counters import recount_course
+from .models import Course, CourseTag, Lesson, Level, Module, Tag
+from .search import schedule_reindex
+from .tags import parse_tags, recount_tags
+
+# Importación y exportación del catálogo en JSON lines: una línea por curso
+# con su árbol completo (levels → modules → lessons). Cada nodo se identifica
+# por external_id. Si un nivel, módulo o lección no lo trae, se busca entre
+# los hijos que ya tiene su padre uno con el mismo nombre (título en las
+# lecciones); sólo si no hay ninguno se deriva del padre y su posición
+# ("curso-ia/1/2"). Así insertar una lección en medio de un módulo no cambia
+# el contenido de las siguientes ni mueve su progreso a otra lección.
+#
+# La exportación no escribe en la base: las filas sin external_id salen como
+# "<prefijo>-<pk>" ("course-12") y al importar ese fichero la fila con ese pk
+# y sin external_id lo recibe, así que se actualiza en vez de duplicarse.
+# Nada se borra: lo que no aparece en el fichero se queda como está.
+#
+# La importación trabaja por lotes de cursos con un bulk_create por nivel de
+# la jerarquía (update_conflicts sobre external_id) y sin señales; el
+# recuento de inscripciones, etiquetas, búsqueda y versiones de cache se
+# actualiza al final de cada lote.
+
+BATCH_SIZE = 200
+
+COURSE_FIELDS = ['title', 'description', 'category', 'tags', 'duration', 'rating', 'cover_image_url', 'trailer_url']
+LEVEL_FIELDS = ['name', 'order']
+MODULE_FIELDS = ['name', 'order']
+LESSON_FIELDS = ['title', 'duration', 'video_id', 'order']
+
+
+class CatalogImportError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f'línea {line}: {message}')
+        self.line = line
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# ---------------------------------------------------------------- exportación
+
+def _children(model, parent_field, parent_ids, fields):
+    children = {}
+    rows = (
+        model.objects.filter(**{f'{parent_field}__in': parent_ids})
+        .order_by(parent_field, 'order', 'id')
+        .values('id', 'external_id', parent_field, *fields)
+    )
+    for row in rows:
+        children.setdefault(row[parent_field], []).append(row)
+    return children
+
+
+# external_id de una fila: el suyo o el que le da la exportación
+def _external_id(external_id, pk, prefix):
+    return external_id or f'{prefix}-{pk}'
+
+
+def _node(row, fields, prefix):
+    external_id = _external_id(row['external_id'], row['id'], prefix)
+    return {'external_id': external_id, **{field: row[field] for field in fields}}
+
+
+# Una línea JSON por curso, en lotes de batch_size cursos (cuatro consultas por lote)
+def export_courses(course_ids=None, batch_size=BATCH_SIZE):
+    courses = Course.objects.order_by('id')
+    if course_ids:
+        courses = courses.filter(id__in=course_ids)
+    ids = courses.values_list('id', flat=True).iterator(chunk_size=batch_size)
+    for batch in _batched(ids, batch_size):
+        rows = Course.objects.filter(id__in=batch).order_by('id').values('id', 'external_id', *COURSE_FIELDS)
+        levels = _children(Level, 'course_id', batch, LEVEL_FIELDS)
+        level_ids = [level['id'] for course_levels in levels.values() for level in course_levels]
+        modules = _children(Module, 'level_id', level_ids, MODULE_FIELDS)
+        module_ids = [module['id'] for level_modules in modules.values() for module in level_modules]
+        lessons = _children(Lesson, 'module_id', module_ids, LESSON_FIELDS)
+        for row in rows:
+            course = _node(row, COURSE_FIELDS, 'course')
+            course['levels'] = []
+            for level in levels.get(row['id'], []):
+                level_node = {**_node(level, LEVEL_FIELDS, 'level'), 'modules': []}
+                for module in modules.get(level['id'], []):
+                    level_node['modules'].append({
+                        **_node(module, MODULE_FIELDS, 'module'),
+                        'lessons': [_node(lesson, LESSON_FIELDS, 'lesson') for lesson in lessons.get(module['id'], [])],
+                    })
+                course['levels'].append(level_node)
+            yield json.dumps(course, ensure_ascii=False, default=str) + '\n'
+
+
+# ---------------------------------------------------------------- importación
+
+# (línea, curso) de cada línea no vacía
+def read_courses(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            course = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise CatalogImportError(number, f'JSON no válido ({exc.msg})') from exc
+        if not isinstance(course, dict) or not course.get('external_id'):
+            raise CatalogImportError(number, 'cada curso necesita external_id')
+        yield number, course
+
+
+def _values(number, node, fields, required):
+    missing = [field for field in required if node.get(field) in (None, '')]
+    if missing:
+        raise CatalogImportError(number, f"faltan {', '.join(missing)} en {node.get('external_id')}")
+    return {field: node[field] for field in fields if field in node}
+
+
+# Inserta o actualiza las filas por external_id con un único INSERT ... ON
+# CONFLICT y devuelve {external_id: pk}
+def _upsert(model, rows, update_fields):
+    objects = [model(external_id=external_id, **values) for external_id, values in rows]
+    if not objects:
+        return {}
+    model.objects.bulk_create(
+        objects, update_conflicts=True, unique_fields=['external_id'], update_fields=update_fields,
+    )
+    return {obj.external_id: obj.pk for obj in objects}
+
+
+# Las filas sin external_id que la exportación nombró "<prefijo>-<pk>" lo
+# reciben aquí, antes del upsert por external_id
+def _adopt(model, prefix, keys):
+    pks = {}
+    for key in keys:
+        match = re.fullmatch(rf'{re.escape(prefix)}-(\d+)', key)
+        if match:
+            pks[int(match[1])] = key
+    if not pks:
+        return
+    taken = set(model.objects.filter(external_id__in=pks.values()).values_list('external_id', flat=True))
+    adopted = [
+        model(pk=pk, external_id=pks[pk])
+        for pk in model.objects.filter(pk__in=pks, external_id__isnull=True).values_list('pk', flat=True)
+        if pks[pk] not in taken
+    ]
+    model.objects.bulk_update(adopted, ['external_id'])
+
+
+# Claves de los hijos que ya existen, {clave del padre: {nombre: [clave, ...]}}
+# en orden, para emparejar por nombre los nodos sin external_id
+def _existing_children(model, parent_field, label, prefix, parent_keys):
+    children = defaultdict(lambda: defaultdict(list))
+    rows = (
+        model.objects.filter(**{f'{parent_field}__external_id__in': parent_keys})
+        .order_by('order', 'id').values_list(f'{parent_field}__external_id', label, 'external_id', 'id')
+    )
+    for parent, name, external_id, pk in rows:
+        children[parent][name].append(_external_id(external_id, pk, prefix))
+    return children
+
+
+# Resuelve la clave de cada hijo de `parents` ([(línea, clave del padre,
+# clave del curso, nodos)]): su external_id, el de un hijo existente con el
+# mismo nombre o, si no hay, "<padre>/<posición>" sin pisar ninguna clave
+# existente. Devuelve [(línea, clave del padre, clave del curso, clave, nodo)].
+def _resolve_children(model, parent_field, label, prefix, parents):
+    existing = _existing_children(model, parent_field, label, prefix, {parent for _, parent, _, _ in parents})
+    resolved = []
+    for number, parent, course, nodes in parents:
+        by_name = {name: list(keys) for name, keys in existing.get(parent, {}).items()}
+        taken = {key for keys in by_name.values() for key in keys}
+        for position, node in enumerate(nodes, 1):
+            if node.get('external_id'):
+                key = str(node['external_id'])
+            elif by_name.get(node.get(label)):
+                key = by_name[node.get(label)].pop(0)
+            else:
+                key, suffix = f'{parent}/{position}', 1
+                while key in taken:
+                    suffix += 1
+                    key = f'{parent}/{position}.{suffix}'
+            taken.add(key)
+            resolved.append((number, parent, course, key, node))
+    _adopt(model, prefix, [key for _, _, _, key, _ in resolved])
+    return resolved
+
+
+# Un nodo que ya existe no cambia de padre al importar: moverlo exige llevar
+# el progreso al curso nuevo y recontar el anterior (señales de
+# courses.signals al guardar desde el admin), y aquí no hay señales
+def _check_parents(model, parent_field, nodes, lines):
+    current = model.objects.filter(external_id__in=nodes).values_list('external_id', f'{parent_field}__external_id')
+    for key, parent in current:
+        if parent != nodes[key][0]:
+            raise CatalogImportError(lines[key], f'{key} pertenece a {parent}; no se puede mover al importar')
+
+
+def _import_batch(batch):
+    courses, levels, modules, lessons = {}, {}, {}, {}
+    lines = {}
+    for number, course in batch:
+        values = _values(number, course, COURSE_FIELDS, ['title', 'category', 'duration', 'rating'])
+        values.setdefault('description', '')
+        values.setdefault('tags', '')
+        values.setdefault('cover_image_url', '')
+        # El último gana si un curso aparece dos veces en el lote
+        courses[str(course['external_id'])] = values
+    _adopt(Course, 'course', courses)
+    existing = set(Course.objects.filter(external_id__in=courses).values_list('id', flat=True))
+
+    # De arriba abajo: los hijos se emparejan con los del padre ya resuelto
+    level_nodes = _resolve_children(Level, 'course', 'name', 'level', [
+        (number, str(course['external_id']), str(course['external_id']), course.get('levels') or [])
+        for number, course in batch
+    ])
+    for number, parent, _, key, level in level_nodes:
+        levels[key] = (parent, _values(number, level, LEVEL_FIELDS, ['name']))
+        lines[key] = number
+    module_nodes = _resolve_children(Module, 'level', 'name', 'module', [
+        (number, key, course, level.get('modules') or []) for number, _, course, key, level in level_nodes
+    ])
+    for number, parent, _, key, module in module_nodes:
+        modules[key] = (parent, _values(number, module, MODULE_FIELDS, ['name']))
+        lines[key] = number
+    lesson_nodes = _resolve_children(Lesson, 'module', 'title', 'lesson', [
+        (number, key, course, module.get('lessons') or []) for number, _, course, key, module in module_nodes
+    ])
+    for number, parent, course, key, lesson in lesson_nodes:
+        values = _values(number, lesson, LESSON_FIELDS, ['title', 'video_id'])
+        values.setdefault('duration', '')
+        lessons[key] = (parent, course, values)
+        lines[key] = number
+
+    _check_parents(Level, 'course', levels, lines)
+    _check_parents(Module, 'level', modules, lines)
+    _check_parents(Lesson, 'module', lessons, lines)
+
+    # Un INSERT por nivel de la jerarquía, de arriba abajo
+    course_pks = _upsert(Course, courses.items(), COURSE_FIELDS)
+    level_pks = _upsert(
+        Level, [(key, {'course_id': course_pks[parent], **values}) for key, (parent, values) in levels.items()],
+        LEVEL_FIELDS,
+    )
+    module_pks = _upsert(
+        Module, [(key, {'level_id': level_pks[parent], **values}) for key, (parent, values) in modules.items()],
+        MODULE_FIELDS,
+    )
+    # Lesson.save() no se llama: la copia de course se rellena aquí
+    _upsert(
+        Lesson,
+        [(key, {'module_id': module_pks[parent], 'course_id': course_pks[course], **values})
+         for key, (parent, course, values) in lessons.items()],
+        LESSON_FIELDS,
+    )
+
+    # Etiquetas normalizadas como en sync_course_tags, en bloque
+    tag_names = {pk: set(parse_tags(courses[key]['tags'])) for key, pk in course_pks.items()}
+    names = set().union(*tag_names.values())
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    CourseTag.objects.filter(course_id__in=existing).delete()
+    CourseTag.objects.bulk_create(
+        [CourseTag(course_id=pk, tag_id=tag_ids[name]) for pk, course_names in tag_names.items()
+         for name in course_names],
+        ignore_conflicts=True,
+    )
+
+    # Las inscripciones de cursos que ya existían pueden tener otro total
+    for course_id in existing:
+        recount_course(course_id)
+    return {
+        'courses': len(course_pks),
+        'created': len(set(course_pks.values()) - existing),
+        'levels': len(level_pks),
+        'modules': len(module_pks),
+        'lessons': len(lessons),
+        'course_ids': list(course_pks.values()),
+    }
+
+
+# Importa un iterable de líneas JSON en una transacción. Devuelve el
+# recuento de filas escritas por tipo (nuevas o actualizadas).
+def import_courses(lines, batch_size=BATCH_SIZE):
+    report = {'courses': 0, 'created': 0, 'levels': 0, 'modules': 0, 'lessons': 0}
+    course_ids = []
+    with transaction.atomic():
+        for batch in _batched(read_courses(lines), batch_size):
+            counts = _import_batch(batch)
+            course_ids += counts.pop('course_ids')
+            for key, value in counts.items():
+                report[key] += value
+        if course_ids:
+            recount_tags()
+            schedule_reindex(*course_ids)
+            bump_version(CATALOG_SCOPE, *(course_scope(course_id) for course_id in course_ids))
+    return report
@@ -0,0 +1,105 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .cache import (
+    CATALOG_SCOPE, PROGRESS_SCOPE, aget_version, course_scope, get_cache, get_version, user_scope, version_timeout,
+)
+
+
+# El ETag es un hash del contenido (response.data en DRF, el cuerpo en las
+# vistas async), así que todos los procesos dan el mismo para los mismos
+# datos. Para responder 304 sin ejecutar la vista se recuerda en cache el ETag
+# de cada ruta y versiones de sus ámbitos; sin él se ejecuta la vista y se
+# compara el ETag recién calculado. No hay Last-Modified: los modelos del
+# catálogo no guardan fecha de cambio.
+def _memo_key(request, scopes, versions):
+    digest = hashlib.sha1(
+        '|'.join([request.get_full_path(), *scopes, *map(repr, versions)]).encode()
+    ).hexdigest()
+    return f'courses:etag:{digest}'
+
+
+def _content_etag(response):
+    data = getattr(response, 'data', None)
+    if data is not None:
+        content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    else:
+        content = response.content
+    return quote_etag(hashlib.sha1(content).hexdigest())
+
+
+def _add_headers(response, etag, per_user):
+    response.headers['ETag'] = etag
+    if per_user:
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+# GET condicional con ETag fuerte. `get_scopes(request, *args, **kwargs)`
+# devuelve los ámbitos de contenido de los que depende la respuesta; si el
+# cliente ya tiene el ETag recordado para sus versiones se responde 304 sin
+# ejecutar la vista ni el serializer.
+def conditional_get(get_scopes, per_user=False):
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            scopes = get_scopes(request, *args, **kwargs)
+            memo_key = _memo_key(request, scopes, [get_version(scope) for scope in scopes])
+            etag = get_cache().get(memo_key)
+            if etag is not None:
+                response = get_conditional_response(request, etag=etag)
+                if response is not None:
+                    return _add_headers(response, etag, per_user)
+            response = method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            etag = _content_etag(response)
+            get_cache().set(memo_key, etag, timeout=version_timeout())
+            return _add_headers(get_conditional_response(request, etag=etag) or response, etag, per_user)
+        return wrapper
+    return decorator
+
+
+# Igual que conditional_get para las vistas async (courses.async_views)
+def async_conditional_get(get_scopes, per_user=False):
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(self, request, *args, **kwargs):
+            scopes = get_scopes(request, *args, **kwargs)
+            memo_key = _memo_key(request, scopes, [await aget_version(scope) for scope in scopes])
+            etag = await get_cache().aget(memo_key)
+            if etag is not None:
+                response = get_conditional_response(request, etag=etag)
+                if response is not None:
+                    return _add_headers(response, etag, per_user)
+            response = await method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            etag = _content_etag(response)
+            await get_cache().aset(memo_key, etag, timeout=version_timeout())
+            return _add_headers(get_conditional_response(request, etag=etag) or response, etag, per_user)
+        return wrapper
+    return decorator
+
+
+def catalog_scopes(request, *args, **kwargs):
+    user = request.user
+    if user and user.is_authenticated:
+        return [CATALOG_SCOPE, PROGRESS_SCOPE, user_scope(user.id)]
+    return [CATALOG_SCOPE]
+
+
+def structure_scopes(request, course_id):
+    return [course_scope(course_id)]
+
+
+def progress_scopes(request, course_id):
+    return [course_scope(course_id), PROGRESS_SCOPE, user_scope(request.user.id)]
@@ -0,0 +1,95 @@
+from collections import Counter, defaultdict
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .cache import bump_version, user_scope
+from .models import Enrollment, Lesson, LessonProgress
+from .sharding import shard_for, sharded_querysets
+from .user_stats import apply_stats, enrollment_delta, rebuild_user_stats
+
+
+def _count_subquery(queryset, group_by):
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values(group_by).annotate(total=Count('id')).values('total'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+# Recalcula total_lessons y completed_lessons de las inscripciones indicadas
+# con un único UPDATE (sirve tanto para una fila como para toda la tabla).
+def recount_enrollments(enrollments=None):
+    if enrollments is None:
+        return sum(recount_enrollments(qs) for qs in sharded_querysets(Enrollment.objects.all()))
+    completed = LessonProgress.objects.filter(user=OuterRef('user'), course=OuterRef('course'), completed=True)
+    if enrollments.db == DEFAULT_DB_ALIAS:
+        lessons = Lesson.objects.filter(course=OuterRef('course'))
+        return enrollments.update(
+            total_lessons=_count_subquery(lessons, 'course'),
+            completed_lessons=_count_subquery(completed, 'user'),
+        )
+
+    # En un shard no está el catálogo: los totales se leen del primario y se
+    # aplican con un UPDATE por curso
+    course_ids = set(enrollments.order_by().values_list('course_id', flat=True).distinct())
+    totals = dict(
+        Lesson.objects.filter(course_id__in=course_ids).order_by().values('course_id')
+        .annotate(total=Count('id')).values_list('course_id', 'total')
+    )
+    return sum(
+        enrollments.filter(course_id=course_id).update(
+            total_lessons=totals.get(course_id, 0),
+            completed_lessons=_count_subquery(completed, 'user'),
+        )
+        for course_id in course_ids
+    )
+
+
+# Un cambio de estructura puede completar o reabrir el curso para cualquier
+# inscrito: sus UserStats se reconstruyen después del recuento
+def recount_course(course_id):
+    if course_id is not None:
+        for enrollments in sharded_querysets(Enrollment.objects.filter(course_id=course_id)):
+            if recount_enrollments(enrollments):
+                rebuild_user_stats(list(enrollments.order_by('user_id').values_list('user_id', flat=True)))
+
+
+def _counters(enrollment):
+    return enrollment.values_list('total_lessons', 'completed_lessons').first()
+
+
+# `watched_seconds` es el cambio de tiempo visto que acompaña al recuento
+def recount_user_course(user_id, course_id, watched_seconds=0):
+    enrollment = Enrollment.objects.using(shard_for(user_id)).filter(user_id=user_id, course_id=course_id)
+    before = _counters(enrollment)
+    recount_enrollments(enrollment)
+    delta = enrollment_delta(before, _counters(enrollment))
+    delta['watched_seconds'] += watched_seconds
+    apply_stats({user_id: delta})
+    bump_version(user_scope(user_id), using=shard_for(user_id))
+
+
+# Suma las lecciones que acaban de pasar a completadas.
+# `flips` es una lista de (user_id, course_id), uno por lección; `stats`
+# ({user_id: Counter}) son otros deltas de UserStats que se aplican a la vez.
+def apply_completed_flips(flips, stats=None):
+    stats = defaultdict(Counter, stats or {})
+    per_enrollment = Counter(flips)
+    for (user_id, course_id), count in per_enrollment.items():
+        enrollment = Enrollment.objects.using(shard_for(user_id)).filter(user_id=user_id, course_id=course_id)
+        before = _counters(enrollment)
+        if before is None:
+            # Progreso sin inscripción: no hay contador que mover
+            continue
+        enrollment.update(completed_lessons=F('completed_lessons') + count)
+        stats[user_id].update(enrollment_delta(before, (before[0], before[1] + count)))
+    apply_stats(stats)
+    scopes = defaultdict(set)
+    for user_id, _ in per_enrollment:
+        scopes[shard_for(user_id)].add(user_scope(user_id))
+    for alias, shard_scopes in scopes.items():
+        bump_version(*shard_scopes, using=alias)
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import re
+import time
+from urllib.parse import urlsplit
+
+# Cliente HTTP/1.1 mínimo sobre asyncio para los comandos de carga
+# (bench_heartbeat, load_viewers). Mantiene la conexión abierta entre peticiones, como
+# un navegador, y no depende de librerías externas.
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+
+class HTTPError(Exception):
+    pass
+
+
+def is_local(base_url):
+    return urlsplit(base_url).hostname in LOCAL_HOSTS
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body or b'null')
+
+
+class HTTPConnection:
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        if parts.scheme != 'http':
+            raise ValueError('Sólo se admite http:// (servidor local)')
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, json_body=None):
+        for attempt in range(2):
+            if self.writer is None:
+                await self.connect()
+            try:
+                return await asyncio.wait_for(self._send(method, path, headers, json_body), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # El servidor cerró la conexión keep-alive: reconectar una vez
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _send(self, method, path, headers, json_body):
+        body = b'' if json_body is None else json.dumps(json_body).encode()
+        lines = [
+            f'{method} {self.prefix}{path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Connection: keep-alive',
+            f'Content-Length: {len(body)}',
+        ]
+        if json_body is not None:
+            lines.append('Content-Type: application/json')
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b'\r\n')
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise HTTPError(f'Respuesta inválida: {status_line!r}')
+        response_headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readuntil(b'\r\n')
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            response_body = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            response_body = await self.reader.readexactly(int(response_headers['content-length']))
+        elif status in (204, 304):
+            response_body = b''
+        else:
+            response_body = await self.reader.read()
+            await self.close()
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return Response(status, response_headers, response_body)
+
+
+_SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# Suma de las muestras `name` de un texto de Prometheus (GET /metrics) cuyas
+# etiquetas incluyen `labels`
+def metric_total(text, name, **labels):
+    total = 0.0
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match is None or match.group(1) != name:
+            continue
+        sample_labels = dict(_LABEL.findall(match.group(2)))
+        if all(sample_labels.get(key) == value for key, value in labels.items()):
+            total += float(match.group(3))
+    return total
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+# Acumula latencias y errores de una ejecución
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, latency):
+        self.latencies.append(latency)
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return {
+            'requests': len(self.latencies),
+            'errors': dict(self.errors),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(self.latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(self.latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(self.latencies, 99) * 1000, 2),
+        }
@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from courses.benchmark import ENDPOINTS, run_endpoints
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia y consultas SQL de cada endpoint de courses/urls.py contra la base actual '
+        '(ver generate_catalog) y falla si alguno supera su presupuesto de consultas. '
+        'Con --output escribe el informe en JSON para compararlo entre commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Peticiones por endpoint.')
+        parser.add_argument('--course', type=int, help='Curso a usar (por defecto el primero con lecciones).')
+        parser.add_argument('--only', action='append', help='Limitar a uno o varios endpoints (nombre).')
+        parser.add_argument('--output', help='Fichero JSON para el informe.')
+        parser.add_argument('--baseline', help='Informe anterior con el que comparar.')
+
+    def handle(self, *args, **options):
+        endpoints = ENDPOINTS
+        if options['only']:
+            endpoints = [endpoint for endpoint in ENDPOINTS if endpoint['name'] in options['only']]
+            if not endpoints:
+                raise CommandError(f"Ningún endpoint se llama {', '.join(options['only'])}.")
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            report = run_endpoints(max(1, options['iterations']), options['course'], endpoints)
+        if report is None:
+            raise CommandError('No hay lecciones; crea datos primero con generate_catalog.')
+
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)['endpoints']
+        for name, result in report['endpoints'].items():
+            line = (
+                f"{name:<24} {result['status']}  p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                f"frío {result['cold_ms']:8.2f} ms  consultas {result['queries']}/{result['max_queries']}"
+            )
+            if name in baseline:
+                previous = baseline[name]
+                line += (
+                    f"  (p50 {result['p50_ms'] - previous['p50_ms']:+.2f} ms, "
+                    f"consultas {result['queries'] - previous['queries']:+d})"
+                )
+            self.stdout.write(line if result['ok'] else self.style.ERROR(line))
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+        failed = [name for name, result in report['endpoints'].items() if not result['ok']]
+        if failed:
+            raise CommandError(f"Fuera de presupuesto o con error: {', '.join(failed)}.")
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from courses.loadtest import HTTPConnection, Stats
+from courses.models import Lesson
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide cuántas conexiones concurrentes de heartbeat (PUT /api/lesson-progress/<id>/ '
+        'cada segundo) sostiene un servidor local. Ejecutar contra un worker de uvicorn/daphne '
+        '(COURSES_ASYNC_VIEWS=1) y contra gunicorn con workers síncronos para compararlos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Servidor a medir.')
+        parser.add_argument('--concurrency', default='10,50,100,200',
+                            help='Niveles de conexiones concurrentes, separados por comas.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Segundos por nivel.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Segundos entre heartbeats.')
+        parser.add_argument('--lesson', type=int, help='Lección a usar (por defecto la primera).')
+        parser.add_argument('--json', action='store_true', help='Imprime el informe en JSON.')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',') if level.strip()]
+        lesson_id = options['lesson'] or Lesson.objects.values_list('id', flat=True).order_by('id').first()
+        if lesson_id is None:
+            raise CommandError('No hay lecciones; crea datos primero (generate_catalog o el admin).')
+        tokens = self.get_tokens(max(levels))
+
+        report = []
+        for level in levels:
+            stats = asyncio.run(self.run_level(options, level, lesson_id, tokens[:level]))
+            summary = stats.summary()
+            # Un nivel se sostiene si el servidor atiende todos los heartbeats previstos
+            expected = level * options['duration'] / options['interval']
+            summary.update(connections=level, sustained=summary['requests'] >= 0.95 * expected and not stats.errors)
+            report.append(summary)
+            if not options['json']:
+                self.stdout.write(
+                    f"{level:>5} conexiones: {summary['throughput_rps']:>8} req/s  "
+                    f"p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms  "
+                    f"errores {summary['errors'] or 0}  {'OK' if summary['sustained'] else 'SATURADO'}"
+                )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+
+    def get_tokens(self, count):
+        # Usuarios sintéticos: cada conexión escribe su propia fila de progreso
+        tokens = []
+        for index in range(count):
+            email = f'bench-{index}@example.com'
+            user, created = User.objects.get_or_create(username=email, defaults={'email': email})
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=['password'])
+            tokens.append(str(AccessToken.for_user(user)))
+        return tokens
+
+    async def run_level(self, options, level, lesson_id, tokens):
+        stats = Stats()
+        deadline = time.perf_counter() + options['duration']
+        await asyncio.gather(*[
+            self.viewer(options, lesson_id, token, deadline, stats) for token in tokens
+        ])
+        stats.stop()
+        return stats
+
+    async def viewer(self, options, lesson_id, token, deadline, stats):
+        connection = HTTPConnection(options['url'])
+        headers = {'Authorization': f'Bearer {token}'}
+        watched = 0
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                watched += 1
+                try:
+                    response = await connection.request(
+                        'PUT', f'/api/lesson-progress/{lesson_id}/', headers, {'watched_time': watched}
+                    )
+                except (OSError, asyncio.TimeoutError) as exc:
+                    stats.error(type(exc).__name__)
+                    await connection.close()
+                else:
+                    if response.status < 300:
+                        stats.record(time.perf_counter() - started)
+                    else:
+                        stats.error(f'HTTP {response.status}')
+                await asyncio.sleep(max(0.0, options['interval'] - (time.perf_counter() - started)))
+        finally:
+            await connection.close()
@@ -0,0 +1,72 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.urls import resolve
+
+from courses.metrics import MetricsMiddleware, _sql_usage
+
+METRICS_MIDDLEWARE = 'courses.metrics.MetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el coste de MetricsMiddleware: por petición (middleware aislado), por consulta SQL '
+        'y, con --url, de extremo a extremo comparando la misma URL con y sin el middleware.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Iteraciones por medida.')
+        parser.add_argument('--url', help='Ruta a pedir con el cliente de pruebas, p.ej. /api/courses/1/structure/.')
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        request = RequestFactory().get('/metrics')
+        request.resolver_match = resolve('/metrics')
+        response = HttpResponse(b'x' * 1024)
+
+        def bare(request):
+            return response
+
+        wrapped = MetricsMiddleware(bare)
+        base = self.per_call(lambda: bare(request), count)
+        measured = self.per_call(lambda: wrapped(request), count)
+        self.stdout.write(f'Middleware: {(measured - base) * 1e6:.2f} µs por petición')
+
+        with connection.cursor() as cursor:
+            def query():
+                cursor.execute('SELECT 1')
+            plain = self.per_call(query, count)
+            token = _sql_usage.set([0, 0.0])
+            try:
+                timed = self.per_call(query, count)
+            finally:
+                _sql_usage.reset(token)
+        self.stdout.write(f'SQL: {(timed - plain) * 1e6:.2f} µs por consulta ({plain * 1e6:.1f} µs sin medir)')
+
+        if options['url']:
+            without = [name for name in settings.MIDDLEWARE if name != METRICS_MIDDLEWARE]
+            results = {}
+            for label, middleware in (('sin métricas', without), ('con métricas', [METRICS_MIDDLEWARE, *without])):
+                with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=['testserver']):
+                    client = Client()
+                    # Calienta caches y conexiones
+                    status = client.get(options['url']).status_code
+                    if status >= 400:
+                        raise CommandError(f"{options['url']} respondió {status}.")
+                    results[label] = self.per_call(lambda: client.get(options['url']), max(1, count // 20))
+            overhead = results['con métricas'] - results['sin métricas']
+            self.stdout.write(
+                f"{options['url']}: {results['sin métricas'] * 1000:.3f} ms sin métricas, "
+                f"{results['con métricas'] * 1000:.3f} ms con métricas "
+                f"({overhead / results['sin métricas'] * 100:+.1f}%)"
+            )
+
+    def per_call(self, func, count):
+        started = time.perf_counter()
+        for _ in range(count):
+            func()
+        return (time.perf_counter() - started) / count
@@ -0,0 +1,60 @@
+import csv
+import io
+import shutil
+import sys
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.bulk_enrollment import CHUNK_SIZE, ENCODING, bulk_enroll, check_encoding
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = (
+        'Inscribe en un curso a los usuarios de un CSV de correos (columna "email" o la primera), '
+        'leyéndolo por lotes. Las filas fallidas se escriben con su motivo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', type=int, help='Id del curso.')
+        parser.add_argument('csv', help='Ruta del CSV, o - para leer de la entrada estándar.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Filas por lote.')
+        parser.add_argument('--errors', help='Escribe las filas fallidas en este CSV (por defecto, en stderr).')
+
+    def handle(self, *args, **options):
+        if not Course.objects.filter(id=options['course']).exists():
+            raise CommandError(f"No existe el curso {options['course']}.")
+        if options['csv'] == '-':
+            # La entrada estándar no se puede releer: se vuelca a un temporal
+            binary = tempfile.TemporaryFile()
+            shutil.copyfileobj(sys.stdin.buffer, binary)
+            binary.seek(0)
+        else:
+            binary = open(options['csv'], 'rb')
+        try:
+            check_encoding(binary)
+        except UnicodeDecodeError:
+            binary.close()
+            raise CommandError('El fichero debe estar en UTF-8.')
+        source = io.TextIOWrapper(binary, encoding=ENCODING, newline='')
+        errors_file = open(options['errors'], 'w', newline='', encoding='utf-8') if options['errors'] else None
+        try:
+            if errors_file is not None:
+                writer = csv.writer(errors_file)
+                writer.writerow(['line', 'email', 'error'])
+
+                def on_error(line, email, reason):
+                    writer.writerow([line, email, reason])
+            else:
+                def on_error(line, email, reason):
+                    self.stderr.write(f'línea {line}: {email} — {reason}')
+            report = bulk_enroll(options['course'], source, options['chunk_size'], on_error)
+        finally:
+            source.close()
+            if errors_file is not None:
+                errors_file.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} filas: {report['enrolled']} inscritos, "
+            f"{report['already_enrolled']} ya inscritos, {report['failed']} fallidas."
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from courses.catalog_io import BATCH_SIZE, export_courses
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta cursos con su árbol completo en JSON lines (una línea por curso), para import_courses. '
+        'Las filas sin external_id salen como "course-<id>" y no se modifican.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-', help='Fichero de salida (por defecto, la salida estándar).')
+        parser.add_argument('--course', type=int, action='append', help='Limitar a uno o varios cursos (id).')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Cursos por lote de consultas.')
+
+    def handle(self, *args, **options):
+        lines = export_courses(options['course'], options['batch_size'])
+        exported = 0
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+                exported += 1
+            # El resumen no se mezcla con el JSON
+            self.stderr.write(f'{exported} cursos exportados.')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            for line in lines:
+                output.write(line)
+                exported += 1
+        self.stdout.write(self.style.SUCCESS(f'{exported} cursos exportados en {options["output"]}.'))
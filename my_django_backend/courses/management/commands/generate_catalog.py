@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.benchmark import BENCH_PASSWORD, generate_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera un catálogo sintético (cursos, niveles, módulos, lecciones, usuarios y progreso) '
+        'con bulk_create en lotes, para pruebas de carga y bench_endpoints. Sólo añade filas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=10000)
+        parser.add_argument('--levels', type=int, default=2, help='Niveles por curso.')
+        parser.add_argument('--modules', type=int, default=5, help='Módulos por nivel.')
+        parser.add_argument('--lessons', type=int, default=5, help='Lecciones por módulo.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--progress', type=int, default=1000000, help='Filas de LessonProgress en total.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas por INSERT.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = generate_catalog(
+            courses=options['courses'],
+            levels=options['levels'],
+            modules=options['modules'],
+            lessons=options['lessons'],
+            users=options['users'],
+            progress=options['progress'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            log=lambda message: self.stdout.write(f'{time.perf_counter() - started:8.1f}s  {message}'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Catálogo generado en {time.perf_counter() - started:.1f}s: {counts['courses']} cursos, "
+            f"{counts['lessons']} lecciones, {counts['lesson_progress']} filas de progreso. "
+            f"Usuarios bench-user-<n>@example.com (load_viewers), contraseña '{BENCH_PASSWORD}'."
+        ))
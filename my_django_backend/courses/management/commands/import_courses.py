@@ -0,0 +1,32 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.catalog_io import BATCH_SIZE, CatalogImportError, import_courses
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa cursos en JSON lines (formato de export_courses) con bulk_create por nivel y en una '
+        'transacción. Es idempotente: los nodos se identifican por external_id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Fichero JSON lines, o - para leer de la entrada estándar.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Cursos por lote.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        source = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8-sig')
+        try:
+            report = import_courses(source, options['batch_size'])
+        except CatalogImportError as exc:
+            raise CommandError(f'{exc}. No se ha importado nada.') from exc
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['courses']} cursos ({report['created']} nuevos), {report['levels']} niveles, "
+            f"{report['modules']} módulos y {report['lessons']} lecciones en {time.perf_counter() - started:.1f}s."
+        ))
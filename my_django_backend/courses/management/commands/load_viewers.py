@@ -0,0 +1,174 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.benchmark import BENCH_PASSWORD, bench_email, create_bench_users
+from courses.loadtest import HTTPConnection, Stats, is_local, metric_total
+from courses.metrics import DATABASE_LOCKED
+from courses.models import Course, Lesson
+
+LOCKED = b'database is locked'
+PHASES = ('login', 'structure', 'lesson', 'heartbeat')
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula N alumnos concurrentes contra un servidor local: inicio de sesión en /api/auth/login/, '
+        'carga de la estructura del curso y del progreso de la lección y heartbeat PUT '
+        '/api/lesson-progress/<id>/ cada segundo (como VideoPlayerWrapper.jsx). Informa de '
+        'rendimiento, latencias p50/p95/p99 por fase y errores "database is locked", leídos del '
+        'contador http_request_errors_total de /metrics (con varios workers hace falta '
+        'METRICS_MULTIPROC_DIR); si /metrics no responde, de las respuestas con DEBUG=True.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Servidor local a medir.')
+        parser.add_argument('--users', type=int, default=100, help='Alumnos simultáneos.')
+        parser.add_argument('--duration', type=float, default=60.0,
+                            help='Segundos de heartbeats por alumno tras cargar la página.')
+        parser.add_argument('--ramp', type=float, default=10.0,
+                            help='Segundos en los que se reparten los inicios de sesión.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Segundos entre heartbeats.')
+        parser.add_argument('--lesson-seconds', type=int, default=120,
+                            help='Duración de cada lección; al terminarla se pasa a la siguiente.')
+        parser.add_argument('--course', type=int, help='Curso a ver (por defecto el primero con lecciones).')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Crea los usuarios bench-user-<n>@example.com que falten.')
+        parser.add_argument('--json', action='store_true', help='Imprime el informe en JSON.')
+
+    def handle(self, *args, **options):
+        if not is_local(options['url']):
+            raise CommandError('Sólo se admite un servidor local (localhost / 127.0.0.1).')
+        course_id = options['course'] or Lesson.objects.values_list('course_id', flat=True).order_by('id').first()
+        if course_id is None or not Course.objects.filter(id=course_id).exists():
+            raise CommandError('No hay cursos con lecciones; crea datos primero con generate_catalog.')
+        if options['create_users']:
+            create_bench_users(options['users'])
+
+        stats = {phase: Stats() for phase in PHASES}
+        locked, source = asyncio.run(self.run(options, course_id, stats))
+        for phase_stats in stats.values():
+            phase_stats.stop()
+
+        report = {
+            'url': options['url'],
+            'users': options['users'],
+            'course': course_id,
+            'database_locked': locked,
+            'database_locked_source': source,
+            **{phase: stats[phase].summary() for phase in PHASES},
+        }
+        # Se sostiene la carga si llegan todos los heartbeats previstos y sin errores
+        expected = options['users'] * options['duration'] / options['interval']
+        heartbeat = report['heartbeat']
+        report['sustained'] = heartbeat['requests'] >= 0.95 * expected and not any(
+            stats[phase].errors for phase in PHASES
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for phase in PHASES:
+            summary = report[phase]
+            self.stdout.write(
+                f"{phase:<10} {summary['requests']:>7} peticiones  {summary['throughput_rps']:>8} req/s  "
+                f"p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms  "
+                f"errores {summary['errors'] or 0}"
+            )
+        self.stdout.write(f'database is locked: {locked} (según {source})')
+        verdict = f"{options['users']} alumnos: {'OK' if report['sustained'] else 'SATURADO'}"
+        self.stdout.write(self.style.SUCCESS(verdict) if report['sustained'] else self.style.ERROR(verdict))
+
+    async def run(self, options, course_id, stats):
+        counter = {'locked': 0, 'watching': 0}
+        users = options['users']
+        before = await self.server_locked(options)
+        await asyncio.gather(*[
+            self.viewer(options, index, course_id, index * options['ramp'] / max(1, users), stats, counter)
+            for index in range(users)
+        ])
+        after = await self.server_locked(options)
+        if before is None or after is None:
+            return counter['locked'], 'responses'
+        return int(after - before), 'metrics'
+
+    # Errores "database is locked" que el servidor lleva contados (None sin /metrics)
+    async def server_locked(self, options):
+        connection = HTTPConnection(options['url'])
+        try:
+            response = await connection.request('GET', '/metrics')
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            await connection.close()
+        if response.status != 200:
+            return None
+        return metric_total(response.body.decode(), 'http_request_errors_total', error=DATABASE_LOCKED)
+
+    async def call(self, connection, stats, counter, phase, method, path, headers=None, body=None):
+        started = time.perf_counter()
+        try:
+            response = await connection.request(method, path, headers, body)
+        except (OSError, asyncio.TimeoutError) as exc:
+            stats[phase].error(type(exc).__name__)
+            await connection.close()
+            return None
+        if response.status >= 400:
+            if LOCKED in response.body:
+                counter['locked'] += 1
+                stats[phase].error('database is locked')
+            else:
+                stats[phase].error(f'HTTP {response.status}')
+            return None
+        stats[phase].record(time.perf_counter() - started)
+        return response
+
+    async def viewer(self, options, index, course_id, delay, stats, counter):
+        await asyncio.sleep(delay)
+        connection = HTTPConnection(options['url'])
+        try:
+            response = await self.call(connection, stats, counter, 'login', 'POST', '/api/auth/login/',
+                                       body={'username': bench_email(index), 'password': BENCH_PASSWORD})
+            if response is None:
+                return
+            headers = {'Authorization': f"Bearer {response.json()['access']}"}
+
+            response = await self.call(connection, stats, counter, 'structure', 'GET',
+                                       f'/api/courses/{course_id}/structure/')
+            if response is None:
+                return
+            lesson_ids = [
+                lesson['id']
+                for level in response.json()['levels']
+                for module in level['modules']
+                for lesson in module['lessons']
+            ]
+            if not lesson_ids:
+                stats['structure'].error('curso sin lecciones')
+                return
+            # Cada alumno empieza en una lección distinta para no escribir todos la misma fila
+            position = index % len(lesson_ids)
+            watched = 0
+            await self.call(connection, stats, counter, 'lesson', 'GET',
+                            f'/api/lesson-progress/{lesson_ids[position]}/', headers)
+
+            if not counter['watching']:
+                # El rendimiento de los heartbeats se mide desde el primero, no desde los logins
+                stats['heartbeat'].started = time.perf_counter()
+            counter['watching'] += 1
+            deadline = time.perf_counter() + options['duration']
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                watched += options['interval']
+                completed = watched >= options['lesson_seconds']
+                await self.call(connection, stats, counter, 'heartbeat', 'PUT',
+                                f'/api/lesson-progress/{lesson_ids[position]}/', headers,
+                                {'watched_time': int(watched), 'completed': completed})
+                if completed:
+                    position, watched = (position + 1) % len(lesson_ids), 0
+                    await self.call(connection, stats, counter, 'lesson', 'GET',
+                                    f'/api/lesson-progress/{lesson_ids[position]}/', headers)
+                await asyncio.sleep(max(0.0, options['interval'] - (time.perf_counter() - started)))
+        finally:
+            await connection.close()
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.profiling import (
+    HEADER,
+    list_profiles,
+    load_stacks,
+    make_token,
+    profiling_settings,
+    project_time,
+    self_time,
+    summarize_queries,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Lista los perfiles de peticiones guardados o resume uno (funciones con más muestras y '
+        'consultas SQL agrupadas por origen). Con --token imprime una cabecera X-Profile firmada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?', help='Perfil a resumir (por defecto se listan todos).')
+        parser.add_argument('--token', metavar='ETIQUETA', nargs='?', const='manual',
+                            help='Imprime la cabecera para perfilar una petición.')
+        parser.add_argument('--limit', type=int, default=20, help='Filas por sección.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Repeticiones de la misma consulta desde la misma línea que se marcan como N+1.')
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(f"{HEADER}: {make_token(options['token'])}")
+            return
+        directory = profiling_settings()['DIRECTORY']
+        profiles = list_profiles(directory)
+        if not options['profile_id']:
+            self.list(profiles[:options['limit']])
+            return
+        profile = next((p for p in profiles if p['id'] == options['profile_id']), None)
+        if profile is None:
+            raise CommandError(f"No existe el perfil {options['profile_id']} en {directory}.")
+        self.summarize(profile, load_stacks(directory, profile['id']), options)
+
+    def list(self, profiles):
+        if not profiles:
+            self.stdout.write('No hay perfiles guardados.')
+            return
+        for profile in profiles:
+            created = datetime.fromtimestamp(profile['created']).strftime('%Y-%m-%d %H:%M:%S')
+            self.stdout.write(
+                f"{profile['id']}  {created}  {profile['method']} {profile['path']}  "
+                f"[{profile['view']}] {profile['status']}  {profile['duration_ms']:.1f} ms  "
+                f"{len(profile['queries'])} consultas ({profile['sql_ms']:.1f} ms)  {profile['samples']} muestras"
+            )
+
+    def summarize(self, profile, stacks, options):
+        limit = options['limit']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{profile['method']} {profile['path']} [{profile['view']}] -> {profile['status']} "
+            f"en {profile['duration_ms']:.1f} ms ({profile['label']})"
+        ))
+        total = sum(stacks.values())
+        if total:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\nFunciones del proyecto ({total} muestras):'))
+            for label, count in project_time(stacks).most_common(limit):
+                self.stdout.write(f'{count / total:7.1%}  {label}')
+            self.stdout.write(self.style.MIGRATE_HEADING('\nTiempo propio (hoja de la pila):'))
+            for label, count in self_time(stacks).most_common(limit):
+                self.stdout.write(f'{count / total:7.1%}  {label}')
+
+        queries = profile['queries']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\nSQL: {len(queries)} consultas, {profile['sql_ms']:.1f} ms"
+        ))
+        for group in summarize_queries(queries)[:limit]:
+            flag = '  <- posible N+1' if group['count'] >= options['repeat'] else ''
+            self.stdout.write(
+                f"{group['count']:5}x {group['duration_ms']:8.2f} ms  {group['origin']}{flag}\n"
+                f"        {group['sql'][:200]}"
+            )
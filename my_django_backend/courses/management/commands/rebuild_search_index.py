@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from courses.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de cursos.'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruido ({type(backend).__name__}).'))
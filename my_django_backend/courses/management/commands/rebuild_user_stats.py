@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.user_stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los contadores de cursos de UserStats desde Enrollment y LessonProgress.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Limitar a uno o varios usuarios (id).')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Usuarios por lote.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuilt = rebuild_user_stats(options['user'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'{rebuilt} usuarios recalculados.'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.cache import PROGRESS_SCOPE, bump_version
+from courses.counters import recount_enrollments
+from courses.models import Enrollment
+from courses.sharding import sharded_querysets
+from courses.user_stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalcula total_lessons y completed_lessons de las inscripciones en bloque.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help='Limitar a uno o varios cursos (id).')
+        parser.add_argument('--user', type=int, action='append', help='Limitar a uno o varios usuarios (id).')
+
+    def handle(self, *args, **options):
+        enrollments = Enrollment.objects.all()
+        if options['course']:
+            enrollments = enrollments.filter(course_id__in=options['course'])
+        if options['user']:
+            enrollments = enrollments.filter(user_id__in=options['user'])
+        updated = 0
+        user_ids = set()
+        for shard_enrollments in sharded_querysets(enrollments):
+            with transaction.atomic(using=shard_enrollments.db):
+                updated += recount_enrollments(shard_enrollments)
+            if options['course']:
+                user_ids.update(shard_enrollments.values_list('user_id', flat=True))
+        # Los contadores por usuario dependen de los recalculados
+        rebuild_user_stats(sorted(user_ids) if options['course'] else options['user'])
+        # Invalida los ETag de progreso de todos los usuarios
+        bump_version(PROGRESS_SCOPE)
+        self.stdout.write(self.style.SUCCESS(f'{updated} inscripciones recalculadas.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.tags import recount_tags
+
+
+class Command(BaseCommand):
+    help = 'Recalcula course_count de todas las etiquetas.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount_tags()
+        self.stdout.write(self.style.SUCCESS('Contadores de etiquetas recalculados.'))
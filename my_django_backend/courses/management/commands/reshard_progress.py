@@ -0,0 +1,138 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from courses.cache import bump_version, user_scope
+from courses.counters import recount_enrollments
+from courses.models import Enrollment, LessonProgress
+from courses.sharding import delete_rows, progress_databases, shard_for
+from courses.user_stats import rebuild_user_stats
+
+# Clave única de cada modelo además del usuario
+UNIQUE_FIELD = {Enrollment: 'course_id', LessonProgress: 'lesson_id'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve las filas de Enrollment y LessonProgress al shard que les corresponde según '
+        'PROGRESS_SHARDS (tras añadir o quitar shards). Se puede repetir sin riesgo: copia '
+        'primero (fusionando con la fila que ya hubiera en el destino) y borra del origen después.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', action='append',
+            help='Alias a revisar (por defecto todos los shards y default). Útil para vaciar un shard retirado.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Filas por lote.')
+        parser.add_argument('--dry-run', action='store_true', help='Sólo cuenta lo que se movería.')
+
+    def handle(self, *args, **options):
+        shards = progress_databases()
+        sources = options['source'] or list(dict.fromkeys([DEFAULT_DB_ALIAS, *shards]))
+        unknown = [alias for alias in sources if alias not in settings.DATABASES]
+        if unknown:
+            raise CommandError(f'Alias desconocidos: {", ".join(unknown)}')
+
+        moved_users = defaultdict(set)
+        for model in (Enrollment, LessonProgress):
+            for source in sources:
+                moved = self.move_rows(model, source, shards, options, moved_users)
+                if moved:
+                    self.stdout.write(f'{model.__name__}: {moved} filas fuera de {source}.')
+
+        if not options['dry_run']:
+            # Las filas fusionadas cambian contadores y UserStats: se recalculan
+            for target, user_ids in moved_users.items():
+                user_ids = list(user_ids)
+                for start in range(0, len(user_ids), options['batch_size']):
+                    chunk = user_ids[start:start + options['batch_size']]
+                    with transaction.atomic(using=target):
+                        recount_enrollments(Enrollment.objects.using(target).filter(user_id__in=chunk))
+                        bump_version(*(user_scope(user_id) for user_id in chunk), using=target)
+                    rebuild_user_stats(chunk)
+
+        for alias in shards:
+            self.stdout.write(
+                f'{alias}: {Enrollment.objects.using(alias).count()} inscripciones, '
+                f'{LessonProgress.objects.using(alias).count()} progresos.'
+            )
+        self.stdout.write(self.style.SUCCESS('Dry run terminado.' if options['dry_run'] else 'Resharding terminado.'))
+
+    def target_of(self, user_id, shards):
+        return shard_for(user_id, shards) or shards[0]
+
+    def move_rows(self, model, source, shards, options, moved_users):
+        rows = model.objects.using(source).order_by('pk')
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        last_pk = 0
+        moved = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                return moved
+            last_pk = batch[-1].pk
+            per_target = defaultdict(list)
+            for row in batch:
+                target = self.target_of(row.user_id, shards)
+                if target != source:
+                    per_target[target].append(row)
+            for target, misplaced in per_target.items():
+                moved += len(misplaced)
+                moved_users[target].update(row.user_id for row in misplaced)
+                if options['dry_run']:
+                    continue
+                with transaction.atomic(using=target):
+                    self.copy_rows(model, target, misplaced, fields)
+                # Sin señales: el borrado de una fila movida no es una baja
+                with transaction.atomic(using=source):
+                    delete_rows(model, source, [row.pk for row in misplaced])
+
+    # Los ids no se conservan: cada shard tiene su propia secuencia. bulk_create
+    # no envía señales; los contadores se recalculan al final. Si el destino ya
+    # tiene la fila (una ejecución interrumpida, escrituras tras cambiar
+    # PROGRESS_SHARDS) se fusionan en vez de descartar la del origen.
+    def copy_rows(self, model, target, misplaced, fields):
+        unique = UNIQUE_FIELD[model]
+        rows = model.objects.using(target)
+        existing = {
+            (row.user_id, getattr(row, unique)): row
+            for row in rows.select_for_update().filter(
+                user_id__in={row.user_id for row in misplaced},
+                **{f'{unique}__in': {getattr(row, unique) for row in misplaced}},
+            )
+        }
+        copies, merged = [], []
+        for row in misplaced:
+            current = existing.get((row.user_id, getattr(row, unique)))
+            if current is None:
+                copies.append(model(**{field.attname: getattr(row, field.attname) for field in fields}))
+            else:
+                merged.append(merge_row(current, row))
+        rows.bulk_create(copies)
+        if merged:
+            rows.bulk_update(merged, MERGED_FIELDS[model])
+
+
+def _latest(first, second):
+    return max(filter(None, (first, second)), default=None)
+
+
+# Lo que se conserva de dos copias de la misma fila: el progreso nunca
+# retrocede (como save_progress) y la inscripción mantiene su primera fecha
+def merge_row(current, other):
+    if isinstance(current, LessonProgress):
+        current.watched_time = max(current.watched_time, other.watched_time)
+        current.completed = current.completed or other.completed
+        current.updated_at = _latest(current.updated_at, other.updated_at)
+    else:
+        current.enrolled_at = min(current.enrolled_at, other.enrolled_at)
+    return current
+
+
+MERGED_FIELDS = {
+    LessonProgress: ['watched_time', 'completed', 'updated_at'],
+    Enrollment: ['enrolled_at'],
+}
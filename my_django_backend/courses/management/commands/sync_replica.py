@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from courses.routers import replica_alias
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia la base SQLite primaria sobre la réplica de lectura (DATABASE_REPLICA_NAME). '
+        'Con --interval repite la copia, como una replicación con retraso.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Segundos entre copias (por defecto una sola).')
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError('No hay réplica configurada (define DATABASE_REPLICA_NAME).')
+        source, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if source.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica sólo copia bases SQLite; en Postgres usa la replicación del servidor.')
+
+        while True:
+            started = time.perf_counter()
+            source.ensure_connection()
+            target = sqlite3.connect(replica.settings_dict['NAME'])
+            try:
+                # API de backup de SQLite: copia consistente aunque haya escrituras
+                source.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(
+                f'Réplica actualizada en {(time.perf_counter() - started) * 1000:.0f} ms.'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
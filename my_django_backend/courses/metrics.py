@@ -0,0 +1,346 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+# Métricas por endpoint en formato de texto de Prometheus (GET /metrics).
+# Para cada nombre de URL resuelto y método se cuentan peticiones, códigos de
+# estado, un histograma de latencia, consultas SQL, tiempo en SQL y bytes
+# enviados, y las excepciones que la vista no captura por tipo (los
+# "database is locked" de SQLite como error="database_locked").
+#
+# Sin bloqueos: cada hilo escribe en su propio almacén y /metrics suma los de
+# todos. Con varios procesos (gunicorn) cada uno vuelca sus totales cada
+# FLUSH_INTERVAL segundos en MULTIPROCESS_DIR y /metrics los combina.
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    'MULTIPROCESS_DIR': None,
+    'FLUSH_INTERVAL': 5,  # segundos entre volcados en modo multiproceso
+}
+
+UNRESOLVED = '<unresolved>'
+DATABASE_LOCKED = 'database_locked'
+
+# Posiciones fijas de cada serie: [peticiones, suma de latencia, consultas,
+# tiempo SQL, bytes, *buckets]; el último bucket es +Inf
+COUNT, LATENCY, QUERIES, SQL_TIME, BYTES = range(5)
+FIRST_BUCKET = 5
+
+
+def metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class ThreadStore:
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.series = {}  # (view, method) -> [..]
+        self.statuses = {}  # (view, method, status) -> peticiones
+        self.errors = {}  # (view, method, error) -> excepciones
+
+    def merge_into(self, series, statuses, errors):
+        _merge(
+            series, statuses, errors,
+            list(self.series.items()), list(self.statuses.items()), list(self.errors.items()),
+        )
+
+
+def _merge(series, statuses, errors, more_series, more_statuses, more_errors):
+    for key, values in more_series:
+        total = series.setdefault(key, [0] * len(values))
+        for index, value in enumerate(values):
+            total[index] += value
+    for counts, more in ((statuses, more_statuses), (errors, more_errors)):
+        for key, count in more:
+            counts[key] = counts.get(key, 0) + count
+
+
+class Registry:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._stores = []
+        # Totales de hilos terminados (runserver crea uno por conexión)
+        self._retired = ThreadStore()
+        self._snapshot_lock = threading.Lock()
+
+    def store(self):
+        store = getattr(self._local, 'store', None)
+        if store is None:
+            store = self._local.store = ThreadStore()
+            self._stores.append(store)  # list.append es atómico
+        return store
+
+    def observe(self, view, method, status, duration, queries, sql_time, size):
+        store = self.store()
+        key = (view, method)
+        series = store.series.get(key)
+        if series is None:
+            series = store.series[key] = [0] * (FIRST_BUCKET + len(self.buckets) + 1)
+        series[COUNT] += 1
+        series[LATENCY] += duration
+        series[QUERIES] += queries
+        series[SQL_TIME] += sql_time
+        series[BYTES] += size
+        series[FIRST_BUCKET + bisect_left(self.buckets, duration)] += 1
+        status_key = (view, method, status)
+        store.statuses[status_key] = store.statuses.get(status_key, 0) + 1
+
+    def error(self, view, method, kind):
+        store = self.store()
+        key = (view, method, kind)
+        store.errors[key] = store.errors.get(key, 0) + 1
+
+    # Sólo la lectura se sincroniza; las escrituras nunca esperan
+    def snapshot(self):
+        with self._snapshot_lock:
+            retired = self._retired
+            for store in list(self._stores):
+                if not store.thread.is_alive():
+                    store.merge_into(retired.series, retired.statuses, retired.errors)
+                    self._stores.remove(store)
+            series, statuses, errors = {}, {}, {}
+            for store in [retired, *self._stores]:
+                store.merge_into(series, statuses, errors)
+        return series, statuses, errors
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = Registry(metrics_settings()['BUCKETS'])
+    return _registry
+
+
+# Consultas SQL de la petición en curso. El contador vive en un ContextVar, así
+# que también cuenta las consultas de las vistas async (hechas en otro hilo).
+_sql_usage = ContextVar('courses_sql_usage', default=None)
+
+
+def _time_sql(execute, sql, params, many, context):
+    usage = _sql_usage.get()
+    if usage is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        usage[0] += 1
+        usage[1] += time.perf_counter() - started
+
+
+def _install(connection, **kwargs):
+    if _time_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_sql)
+
+
+connection_created.connect(_install)
+
+
+# Volcado por proceso para el modo multiproceso
+def _dump_path(directory):
+    return os.path.join(directory, f'metrics-{os.getpid()}.json')
+
+
+def dump_process_metrics(directory):
+    series, statuses, errors = get_registry().snapshot()
+    data = {
+        'series': [[*key, values] for key, values in series.items()],
+        'statuses': [[*key, count] for key, count in statuses.items()],
+        'errors': [[*key, count] for key, count in errors.items()],
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(data, handle)
+    os.replace(tmp_path, _dump_path(directory))
+
+
+def _dump_at_exit(directory):
+    try:
+        dump_process_metrics(directory)
+    except OSError:
+        pass
+
+
+def collect():
+    series, statuses, errors = get_registry().snapshot()
+    directory = metrics_settings()['MULTIPROCESS_DIR']
+    if not directory:
+        return series, statuses, errors
+    # Los ficheros de procesos terminados se conservan: los contadores son acumulados
+    own = _dump_path(directory)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.startswith('metrics-') or path == own:
+            continue
+        try:
+            with open(path) as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        _merge(
+            series,
+            statuses,
+            errors,
+            [((view, method), values) for view, method, values in data['series']],
+            [((view, method, status), count) for view, method, status, count in data['statuses']],
+            # Los volcados anteriores a este contador no lo traen
+            [((view, method, kind), count) for view, method, kind, count in data.get('errors', [])],
+        )
+    return series, statuses, errors
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+
+
+def render(series, statuses, errors, buckets):
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    family('http_requests_total', 'counter', 'Peticiones por vista, método y código de estado.')
+    for (view, method, status), count in sorted(statuses.items()):
+        lines.append(f'http_requests_total{{{_labels(view=view, method=method, status=status)}}} {count}')
+
+    family('http_request_errors_total', 'counter', 'Excepciones no capturadas por la vista, por tipo.')
+    for (view, method, kind), count in sorted(errors.items()):
+        lines.append(f'http_request_errors_total{{{_labels(view=view, method=method, error=kind)}}} {count}')
+
+    family('http_request_duration_seconds', 'histogram', 'Latencia de las peticiones.')
+    for (view, method), values in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip([*buckets, '+Inf'], values[FIRST_BUCKET:]):
+            cumulative += count
+            labels = _labels(view=view, method=method, le=bound)
+            lines.append(f'http_request_duration_seconds_bucket{{{labels}}} {cumulative}')
+        labels = _labels(view=view, method=method)
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {values[LATENCY]}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {values[COUNT]}')
+
+    for name, index, help_text in (
+        ('http_request_sql_queries_total', QUERIES, 'Consultas SQL ejecutadas.'),
+        ('http_request_sql_seconds_total', SQL_TIME, 'Tiempo total en consultas SQL.'),
+        ('http_response_size_bytes_total', BYTES, 'Bytes enviados en el cuerpo de las respuestas.'),
+    ):
+        family(name, 'counter', help_text)
+        for (view, method), values in sorted(series.items()):
+            lines.append(f'{name}{{{_labels(view=view, method=method)}}} {values[index]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    series, statuses, errors = collect()
+    return HttpResponse(
+        render(series, statuses, errors, get_registry().buckets),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+# Tipo de error para http_request_errors_total
+def error_kind(exception):
+    if isinstance(exception, OperationalError) and 'database is locked' in str(exception):
+        return DATABASE_LOCKED
+    return type(exception).__name__
+
+
+def _response_size(response):
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    if getattr(response, 'streaming', False):
+        return 0
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = metrics_settings()
+        self.enabled = options['ENABLED']
+        self.directory = options['MULTIPROCESS_DIR']
+        self.flush_interval = options['FLUSH_INTERVAL']
+        self.next_flush = 0.0
+        self.registry = get_registry()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(_dump_at_exit, self.directory)
+        # Conexiones abiertas antes de cargar el middleware
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        usage = [0, 0.0]
+        token = _sql_usage.set(usage)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _sql_usage.reset(token)
+        self.record(request, response, time.perf_counter() - started, usage)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        usage = [0, 0.0]
+        token = _sql_usage.set(usage)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _sql_usage.reset(token)
+        self.record(request, response, time.perf_counter() - started, usage)
+        return response
+
+    # Django la llama con las excepciones de la vista antes de convertirlas en un 500
+    def process_exception(self, request, exception):
+        if self.enabled:
+            match = request.resolver_match
+            self.registry.error(match.view_name if match else UNRESOLVED, request.method, error_kind(exception))
+
+    def record(self, request, response, duration, usage):
+        match = request.resolver_match
+        self.registry.observe(
+            match.view_name if match else UNRESOLVED,
+            request.method,
+            response.status_code,
+            duration,
+            usage[0],
+            usage[1],
+            _response_size(response),
+        )
+        if self.directory and time.monotonic() >= self.next_flush:
+            self.next_flush = time.monotonic() + self.flush_interval
+            dump_process_metrics(self.directory)
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:43
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Lesson = apps.get_model('courses', 'Lesson')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+
+    def count(queryset, group_by):
+        return Coalesce(
+            Subquery(
+                queryset.order_by().values(group_by).annotate(total=Count('id')).values('total'),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+
+    Enrollment.objects.update(
+        total_lessons=count(Lesson.objects.filter(module__level__course=OuterRef('course')), 'module__level__course'),
+        completed_lessons=count(
+            LessonProgress.objects.filter(
+                user=OuterRef('user'), completed=True, lesson__module__level__course=OuterRef('course')
+            ),
+            'user',
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_enrollment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='total_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
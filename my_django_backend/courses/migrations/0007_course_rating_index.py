@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_enrollment_progress_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-rating', '-id'], name='course_rating_id_idx'),
+        ),
+    ]
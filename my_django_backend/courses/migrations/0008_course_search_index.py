@@ -0,0 +1,58 @@
+from django.db import migrations
+
+FTS_TABLE = 'courses_course_fts'
+
+
+def fts5_supported(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Algunas compilaciones cargan FTS5 sin declararlo en las opciones
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp._fts5_probe')
+        except Exception:
+            return False
+    return True
+
+
+# Índice de búsqueda de cursos con SQLite FTS5. En otros motores la búsqueda
+# usa el índice en memoria de courses.search.PythonIndexBackend.
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if not fts5_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            'title, description, tags, lessons, category UNINDEXED, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, tags, lessons, category) '
+            'SELECT c.id, c.title, c.description, c.tags, '
+            "COALESCE((SELECT group_concat(l.title, ' ') FROM courses_lesson l "
+            'JOIN courses_module m ON l.module_id = m.id '
+            'JOIN courses_level lv ON m.level_id = lv.id WHERE lv.course_id = c.id), \'\'), '
+            'c.category FROM courses_course c'
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_course_rating_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
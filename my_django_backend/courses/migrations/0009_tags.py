@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Separa los textos existentes de Course.tags en filas Tag/CourseTag
+def split_existing_tags(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Tag = apps.get_model('courses', 'Tag')
+    CourseTag = apps.get_model('courses', 'CourseTag')
+
+    course_names = {}
+    for course_id, value in Course.objects.values_list('id', 'tags').iterator():
+        names = []
+        for name in (value or '').split(','):
+            name = ' '.join(name.split()).lower()[:50]
+            if name and name not in names:
+                names.append(name)
+        course_names[course_id] = names
+
+    counts = {}
+    for names in course_names.values():
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+    Tag.objects.bulk_create([Tag(name=name, course_count=count) for name, count in counts.items()], batch_size=500)
+    tag_ids = dict(Tag.objects.values_list('name', 'id'))
+    CourseTag.objects.bulk_create(
+        [
+            CourseTag(course_id=course_id, tag_id=tag_ids[name])
+            for course_id, names in course_names.items()
+            for name in names
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_course_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('course_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-course_count', 'name'], name='tag_popularity_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_tags', to='courses.course')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_tags', to='courses.tag')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, related_name='courses', through='courses.CourseTag', to='courses.tag'),
+        ),
+        migrations.AddIndex(
+            model_name='coursetag',
+            index=models.Index(fields=['tag', 'course'], name='coursetag_tag_course_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='coursetag',
+            unique_together={('course', 'tag')},
+        ),
+        migrations.RunPython(split_existing_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_course(apps, schema_editor):
+    Lesson = apps.get_model('courses', 'Lesson')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    Module = apps.get_model('courses', 'Module')
+
+    Lesson.objects.update(
+        course_id=Subquery(Module.objects.filter(id=OuterRef('module_id')).values('level__course_id')[:1])
+    )
+    LessonProgress.objects.update(
+        course_id=Subquery(Lesson.objects.filter(id=OuterRef('lesson_id')).values('course_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='course',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lessons', to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='lessonprogress',
+            name='course',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lesson_progress', to='courses.course'),
+        ),
+        migrations.RunPython(backfill_course, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='lesson',
+            name='course',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='lessons', to='courses.course'),
+        ),
+        migrations.AlterField(
+            model_name='lessonprogress',
+            name='course',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='lesson_progress', to='courses.course'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonprogress',
+            index=models.Index(fields=['user', 'course', 'completed'], name='progress_user_course_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_external_ids'),
+    ]
+
+    operations = [
+        # Sin default al añadirla: las filas existentes quedan en null en vez
+        # de recibir la fecha de la migración
+        migrations.AddField(
+            model_name='lessonprogress',
+            name='updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='lessonprogress',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, null=True),
+        ),
+    ]
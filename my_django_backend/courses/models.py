@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class Course(models.Model):
     title = models.CharField(max_length=200)
@@ -10,38 +11,120 @@ class Course(models.Model):
     rating = models.FloatField()
     cover_image_url = models.URLField()
     trailer_url = models.URLField(blank=True, null=True)
+    # Identificador estable para import_courses/export_courses (también en
+    # Level, Module y Lesson): reimportar actualiza en vez de duplicar
+    external_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    # `tags` sigue siendo el texto separado por comas que ve la API;
+    # tag_set es su versión normalizada (se sincroniza al guardar)
+    tag_set = models.ManyToManyField('Tag', through='CourseTag', related_name='courses', blank=True)
+
+    class Meta:
+        indexes = [
+            # Orden del catálogo y paginación por cursor
+            models.Index(fields=['-rating', '-id'], name='course_rating_id_idx'),
+        ]
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    # Número de cursos con esta etiqueta, mantenido por courses.tags
+    course_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-course_count', 'name'], name='tag_popularity_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+class CourseTag(models.Model):
+    course = models.ForeignKey(Course, related_name='course_tags', on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, related_name='course_tags', on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('course', 'tag')
+        indexes = [
+            # "cursos con la etiqueta X" sin recorrer la tabla de cursos
+            models.Index(fields=['tag', 'course'], name='coursetag_tag_course_idx'),
+        ]
 
 class Level(models.Model):
     course = models.ForeignKey(Course, related_name='levels', on_delete=models.CASCADE)
+    external_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
     name = models.CharField(max_length=100)
     order = models.PositiveIntegerField(default=1)
 
 class Module(models.Model):
     level = models.ForeignKey(Level, related_name='modules', on_delete=models.CASCADE)
+    external_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
     name = models.CharField(max_length=100)
     order = models.PositiveIntegerField(default=1)
 
 class Lesson(models.Model):
     module = models.ForeignKey(Module, related_name='lessons', on_delete=models.CASCADE)
+    # Copia de module.level.course para no unir Lesson→Module→Level→Course
+    course = models.ForeignKey(Course, related_name='lessons', on_delete=models.CASCADE, editable=False)
     title = models.CharField(max_length=200)
     duration = models.CharField(max_length=10)  # Ej: '10:32'
     video_id = models.CharField(max_length=20)  # YouTube videoId
     order = models.PositiveIntegerField(default=1)
+    external_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
 
+    def save(self, *args, **kwargs):
+        if self.module_id is not None:
+            self.course_id = Level.objects.filter(modules=self.module_id).values_list('course_id', flat=True).get()
+        super().save(*args, **kwargs)
+
+# LessonProgress y Enrollment pueden vivir en otra base (courses.sharding):
+# sus claves ajenas no llevan restricción en la base de datos.
 class LessonProgress(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False)
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, db_constraint=False)
+    # Copia de lesson.course: el progreso por curso es un rango del índice
+    # (user, course, completed)
+    course = models.ForeignKey(
+        Course, related_name='lesson_progress', on_delete=models.CASCADE, editable=False, db_constraint=False
+    )
     watched_time = models.PositiveIntegerField(default=0)  # en segundos
     completed = models.BooleanField(default=False)
+    # Último cambio real de watched_time o completed (save() y
+    # progress.save_progress); no es auto_now para que copiar filas entre
+    # shards conserve la fecha. Las filas anteriores a la columna quedan en
+    # null: no se sabe cuándo cambiaron.
+    updated_at = models.DateTimeField(null=True, default=timezone.now)
 
     class Meta:
         unique_together = ('user', 'lesson')
+        indexes = [
+            models.Index(fields=['user', 'course', 'completed'], name='progress_user_course_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.course_id is None and self.lesson_id is not None:
+            self.course_id = Lesson.objects.filter(id=self.lesson_id).values_list('course_id', flat=True).get()
+        progress = (self.watched_time, self.completed)
+        if progress != getattr(self, '_saved_progress', None):
+            self.updated_at = timezone.now()
+        super().save(*args, **kwargs)
+        self._saved_progress = progress
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores guardados, para que save() sólo cambie updated_at si cambian
+        instance._saved_progress = (instance.__dict__.get('watched_time'), instance.__dict__.get('completed'))
+        return instance
         
         
 class Enrollment(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='enrollments')
-    course = models.ForeignKey('Course', on_delete=models.CASCADE, related_name='enrollments')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='enrollments', db_constraint=False
+    )
+    course = models.ForeignKey('Course', on_delete=models.CASCADE, related_name='enrollments', db_constraint=False)
     enrolled_at = models.DateTimeField(auto_now_add=True)
+    # Contadores mantenidos por courses.counters (evitan recontar en cada lectura)
+    total_lessons = models.PositiveIntegerField(default=0)
+    completed_lessons = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('user', 'course')
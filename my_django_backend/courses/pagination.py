@@ -0,0 +1,83 @@
+import base64
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# Paginación por cursor (keyset) del catálogo ordenado por rating e id.
+# Cada página es un rango sobre el índice (rating, id), así que cuesta lo mismo
+# en la primera página que en la página mil. Sólo se activa si el cliente
+# envía `page_size` o `cursor`; sin ellos se devuelve la lista completa como antes.
+class CourseCursorPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 20
+    max_page_size = 100
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('-rating', '-id')
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            rating, last_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(rating__lt=rating) | Q(rating=rating, id__lt=last_id))
+
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, course):
+        return base64.urlsafe_b64encode(f'{course.rating!r}:{course.id}'.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            rating, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+            return float(rating), int(last_id)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_cursor(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.get_next_cursor(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
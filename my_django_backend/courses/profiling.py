@@ -0,0 +1,360 @@
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Perfilado bajo demanda. Una petición se perfila si trae la cabecera
+# X-Profile con un valor firmado (`manage.py profiles --token`) o, sin
+# cabecera, con probabilidad SAMPLE_RATE. Durante la petición un hilo toma
+# muestras de la pila cada INTERVAL segundos y se anota cada consulta SQL con
+# su duración y el código del proyecto que la lanzó. En DIRECTORY quedan
+# <id>.collapsed (pilas colapsadas para flamegraph.pl / speedscope) y
+# <id>.json (datos de la petición y log SQL). Con SAMPLE_RATE se conservan
+# los MAX_PROFILES más recientes.
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.0,
+    'DIRECTORY': 'profiles',
+    'INTERVAL': 0.005,  # segundos entre muestras
+    'MAX_AGE': 3600,  # validez en segundos de la cabecera firmada
+    'MAX_PROFILES': 500,  # perfiles guardados como mucho al muestrear
+}
+
+HEADER = 'X-Profile'
+SIGNING_SALT = 'courses.profiling'
+PROJECT_ROOT = str(settings.BASE_DIR)
+# Envoltorios de SQL (este módulo y courses.metrics): no son el origen de una consulta
+_INSTRUMENTATION = {
+    os.path.abspath(__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics.py'),
+}
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_PROFILING', {})}
+
+
+def make_token(label='manual'):
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign(label)
+
+
+def read_token(value, max_age):
+    try:
+        return signing.TimestampSigner(salt=SIGNING_SALT).unsign(value, max_age=max_age)
+    except signing.BadSignature:
+        return None
+
+
+def _short(filename):
+    if filename.startswith(PROJECT_ROOT):
+        return os.path.relpath(filename, PROJECT_ROOT)
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return filename
+
+
+def _frame_label(frame):
+    return f'{frame.f_code.co_name} ({_short(frame.f_code.co_filename)})'
+
+
+def _is_project_frame(frame):
+    filename = frame.f_code.co_filename
+    return (
+        filename.startswith(PROJECT_ROOT)
+        and 'site-packages' not in filename
+        and os.path.abspath(filename) not in _INSTRUMENTATION
+    )
+
+
+# Muestreo estadístico de la pila de un hilo
+class StackSampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self._stopped.is_set():
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(labels))] += 1
+
+
+# Log SQL de la petición perfilada (también desde los hilos de las vistas async)
+_sql_log = ContextVar('courses_profile_sql', default=None)
+
+
+def _origin():
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < 5:
+        if _is_project_frame(frame):
+            frames.append(f'{_short(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}')
+        frame = frame.f_back
+    return frames
+
+
+def _log_sql(execute, sql, params, many, context):
+    log = _sql_log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.append({
+            'sql': sql,
+            'many': many,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            'origin': _origin(),
+        })
+
+
+def _install(connection, **kwargs):
+    if _log_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_log_sql)
+
+
+connection_created.connect(_install)
+
+
+class RequestProfile:
+    def __init__(self, request, label, interval):
+        self.id = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        self.request = request
+        self.label = label
+        self.queries = []
+        self.sampler = StackSampler(threading.get_ident(), interval)
+
+    def start(self):
+        self.token = _sql_log.set(self.queries)
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def abort(self):
+        self.sampler.stop()
+        _sql_log.reset(self.token)
+
+    def stop(self, response):
+        self.sampler.stop()
+        duration = time.perf_counter() - self.started
+        _sql_log.reset(self.token)
+        match = self.request.resolver_match
+        return {
+            'id': self.id,
+            'label': self.label,
+            'created': time.time(),
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'samples': sum(self.sampler.stacks.values()),
+            'interval': self.sampler.interval,
+            'sql_ms': round(sum(query['duration_ms'] for query in self.queries), 3),
+            'queries': self.queries,
+        }
+
+    # El .json se escribe el último: si existe, el perfil está completo
+    def save(self, directory, data):
+        os.makedirs(directory, exist_ok=True)
+        stacks = ''.join(f'{stack} {count}\n' for stack, count in self.sampler.stacks.most_common())
+        _write_atomic(os.path.join(directory, f'{self.id}.collapsed'), stacks)
+        _write_atomic(os.path.join(directory, f'{self.id}.json'), json.dumps(data, indent=1))
+
+
+# Temporal en el mismo directorio y os.replace: quien lea el fichero (el
+# comando profiles, otro worker) nunca lo ve a medias
+def _write_atomic(path, content):
+    handle = tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix='.tmp', delete=False)
+    try:
+        with handle:
+            handle.write(content)
+        os.replace(handle.name, path)
+    except BaseException:
+        os.remove(handle.name)
+        raise
+
+
+def _saved_at(entry):
+    try:
+        return entry.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+# Borra los perfiles más antiguos (por fecha del .json) por encima de `keep`
+def prune_profiles(directory, keep):
+    with os.scandir(directory) as entries:
+        saved = sorted((entry for entry in entries if entry.name.endswith('.json')), key=_saved_at)
+    for entry in saved[:max(len(saved) - keep, 0)]:
+        profile_id = entry.name[:-len('.json')]
+        for suffix in ('.json', '.collapsed'):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                # Otro worker lo ha borrado ya
+                pass
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def start_profile(self, request):
+        options = profiling_settings()
+        header = request.headers.get(HEADER)
+        label = read_token(header, options['MAX_AGE']) if header else None
+        if label is None:
+            if not options['SAMPLE_RATE'] or random.random() >= options['SAMPLE_RATE']:
+                return None
+            label = 'sample'
+        profile = RequestProfile(request, label, options['INTERVAL'])
+        profile.start()
+        return profile
+
+    def finish_profile(self, profile, response):
+        options = profiling_settings()
+        data = profile.stop(response)
+        profile.save(options['DIRECTORY'], data)
+        if profile.label == 'sample':
+            prune_profiles(options['DIRECTORY'], options['MAX_PROFILES'])
+        response.headers['X-Profile-Id'] = profile.id
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = self.start_profile(request)
+        if profile is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profile.abort()
+            raise
+        self.finish_profile(profile, response)
+        return response
+
+    async def __acall__(self, request):
+        profile = self.start_profile(request)
+        if profile is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            profile.abort()
+            raise
+        self.finish_profile(profile, response)
+        return response
+
+
+# Lectura de perfiles guardados (comando profiles). Se saltan los ficheros
+# ilegibles o que no son un perfil (borrados a la vez, copiados a mano...)
+def list_profiles(directory):
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as handle:
+                profile = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        if isinstance(profile, dict) and 'created' in profile:
+            profiles.append(profile)
+    return sorted(profiles, key=lambda profile: profile['created'], reverse=True)
+
+
+def load_stacks(directory, profile_id):
+    stacks = Counter()
+    path = os.path.join(directory, f'{profile_id}.collapsed')
+    if os.path.exists(path):
+        with open(path) as handle:
+            for line in handle:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                stacks[stack] += int(count)
+    return stacks
+
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def normalize_sql(sql):
+    return _IN_LIST.sub('IN (...)', ' '.join(sql.split()))
+
+
+# Consultas agrupadas por texto normalizado y origen: muchas repeticiones
+# desde la misma línea suelen ser un N+1 (p.ej. un get_* del serializer en bucle)
+def summarize_queries(queries):
+    groups = {}
+    for query in queries:
+        origin = query['origin'][0] if query['origin'] else '?'
+        group = groups.setdefault((normalize_sql(query['sql']), origin), {'count': 0, 'duration_ms': 0.0})
+        group['count'] += 1
+        group['duration_ms'] += query['duration_ms']
+    return sorted(
+        ({'sql': sql, 'origin': origin, **group} for (sql, origin), group in groups.items()),
+        key=lambda group: (group['count'], group['duration_ms']),
+        reverse=True,
+    )
+
+
+def self_time(stacks):
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    return leaves
+
+
+@lru_cache(maxsize=None)
+def is_project_label(label):
+    path = label.rsplit(' (', 1)[-1].rstrip(')')
+    return not os.path.isabs(path) and os.path.exists(os.path.join(PROJECT_ROOT, path))
+
+
+# Muestras en las que aparece cada función del proyecto (tiempo inclusivo)
+def project_time(stacks):
+    inclusive = Counter()
+    for stack, count in stacks.items():
+        for label in set(stack.split(';')):
+            if is_project_label(label):
+                inclusive[label] += count
+    return inclusive
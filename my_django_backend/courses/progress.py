@@ -0,0 +1,106 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from .counters import apply_completed_flips
+from .models import Enrollment, Lesson, LessonProgress
+from .routers import note_write
+from .sharding import shard_for
+from .user_stats import is_course_completed
+
+
+
+# Calcula inscripción y curso completado para una página entera de cursos
+# con una sola consulta sobre los contadores de Enrollment.
+def get_course_flags(user, course_ids):
+    course_ids = list(course_ids)
+    if not course_ids or not user or not user.is_authenticated:
+        return {}
+
+    counters = {
+        course_id: (total, completed)
+        for course_id, total, completed in Enrollment.objects.using(shard_for(user.id)).filter(
+            user=user, course_id__in=course_ids
+        ).values_list('course_id', 'total_lessons', 'completed_lessons')
+    }
+    flags = {}
+    for course_id in course_ids:
+        enrollment = counters.get(course_id)
+        flags[course_id] = {
+            'is_enrolled': enrollment is not None,
+            'completed': is_course_completed(*enrollment) if enrollment else False,
+        }
+    return flags
+
+
+# Guarda varias actualizaciones de progreso en bloque.
+# `updates` es {(user_id, lesson_id): (watched_time, completed)} y se aplica la
+# misma regla que LessonProgressDetail: watched_time nunca retrocede y
+# completed nunca vuelve a False. Devuelve {(user_id, lesson_id): LessonProgress}
+# sólo para lecciones existentes. Con sharding hay una transacción por shard.
+def save_progress(updates):
+    if not updates:
+        return {}
+    course_of = dict(
+        Lesson.objects.filter(id__in={lesson_id for _, lesson_id in updates})
+        .values_list('id', 'course_id')
+    )
+    per_shard = defaultdict(dict)
+    for (user_id, lesson_id), value in updates.items():
+        if lesson_id in course_of:
+            per_shard[shard_for(user_id)][(user_id, lesson_id)] = value
+
+    results = {}
+    for alias, shard_updates in per_shard.items():
+        with transaction.atomic(using=alias):
+            results.update(_save_shard_progress(alias, shard_updates, course_of))
+    if per_shard:
+        note_write()
+    return results
+
+
+def _save_shard_progress(alias, updates, course_of):
+    progress_rows = LessonProgress.objects.using(alias)
+    existing = {
+        (p.user_id, p.lesson_id): p
+        for p in progress_rows.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in updates}, lesson_id__in={lesson_id for _, lesson_id in updates}
+        )
+    }
+    results = {}
+    created = []
+    changed = []
+    flips = []
+    stats = defaultdict(Counter)
+    now = timezone.now()
+    for (user_id, lesson_id), (watched_time, completed) in updates.items():
+        progress = existing.get((user_id, lesson_id))
+        if progress is None:
+            progress = LessonProgress(user_id=user_id, lesson_id=lesson_id, course_id=course_of[lesson_id])
+        new_watched = max(progress.watched_time, int(watched_time))
+        new_completed = bool(completed) or progress.completed
+        if new_completed and not progress.completed:
+            flips.append((user_id, course_of[lesson_id]))
+        stats[user_id]['watched_seconds'] += new_watched - progress.watched_time
+        if progress.pk is None:
+            created.append(progress)
+            progress.updated_at = now
+        elif (new_watched, new_completed) != (progress.watched_time, progress.completed):
+            changed.append(progress)
+            progress.updated_at = now
+        progress.watched_time = new_watched
+        progress.completed = new_completed
+        results[(user_id, lesson_id)] = progress
+
+    if created:
+        # update_conflicts cubre la carrera con otra petición que cree la misma fila
+        progress_rows.bulk_create(
+            created,
+            update_conflicts=True,
+            unique_fields=['user', 'lesson'],
+            update_fields=['watched_time', 'completed', 'updated_at'],
+        )
+    if changed:
+        progress_rows.bulk_update(changed, ['watched_time', 'completed', 'updated_at'])
+    apply_completed_flips(flips, stats)
+    return results
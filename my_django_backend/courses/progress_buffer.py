@@ -0,0 +1,185 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .progress import save_progress
+from .routers import mark_written
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BACKEND': 'courses.progress_buffer.LocMemProgressBuffer',
+    'FLUSH_INTERVAL': 5,  # segundos
+    'MAX_ENTRIES': 500,
+}
+
+
+def get_buffer_settings():
+    return {**DEFAULTS, **getattr(settings, 'LESSON_PROGRESS_BUFFER', {})}
+
+
+# Interfaz de un buffer de progreso. Cada entrada es (user_id, lesson_id) y
+# sólo guarda el mayor watched_time y si alguna vez se marcó completed.
+class BaseProgressBuffer:
+    def add(self, user_id, lesson_id, watched_time, completed):
+        raise NotImplementedError
+
+    def get(self, user_id, lesson_id):
+        raise NotImplementedError
+
+    def pop(self, user_id, lesson_id):
+        raise NotImplementedError
+
+    def drain(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+# Buffer en memoria del proceso (uno por worker)
+class LocMemProgressBuffer(BaseProgressBuffer):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def add(self, user_id, lesson_id, watched_time, completed):
+        key = (user_id, lesson_id)
+        with self._lock:
+            old_watched, old_completed = self._entries.get(key, (0, False))
+            entry = (max(old_watched, int(watched_time)), bool(completed) or old_completed)
+            self._entries[key] = entry
+            return entry
+
+    def get(self, user_id, lesson_id):
+        with self._lock:
+            return self._entries.get((user_id, lesson_id))
+
+    def pop(self, user_id, lesson_id):
+        with self._lock:
+            return self._entries.pop((user_id, lesson_id), None)
+
+    def drain(self):
+        with self._lock:
+            entries, self._entries = self._entries, {}
+            return entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+# Vacía el buffer en la base de datos cada FLUSH_INTERVAL segundos
+# o en cuanto se alcanzan MAX_ENTRIES entradas.
+class ProgressFlusher:
+    def __init__(self, buffer, interval, max_entries):
+        self.buffer = buffer
+        self.interval = interval
+        self.max_entries = max_entries
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='progress-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def notify(self):
+        if len(self.buffer) >= self.max_entries:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            entries = self.buffer.drain()
+            if not entries:
+                return 0
+            try:
+                save_progress(entries)
+            except Exception:
+                logger.exception('No se pudo guardar el progreso en bloque; se reintentará')
+                for (user_id, lesson_id), (watched_time, completed) in entries.items():
+                    self.buffer.add(user_id, lesson_id, watched_time, completed)
+                raise
+            # Quien tenía progreso pendiente lee del primario un rato (ver courses.routers)
+            mark_written(*{user_id for user_id, _ in entries})
+            return len(entries)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 5)
+        # Flush garantizado al apagar el proceso
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                pass
+            finally:
+                close_old_connections()
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def get_flusher():
+    global _flusher
+    if _flusher is None:
+        with _flusher_lock:
+            if _flusher is None:
+                config = get_buffer_settings()
+                buffer = import_string(config['BACKEND'])()
+                _flusher = ProgressFlusher(buffer, config['FLUSH_INTERVAL'], config['MAX_ENTRIES'])
+                _flusher.start()
+    return _flusher
+
+
+def buffering_enabled():
+    return get_buffer_settings()['ENABLED']
+
+
+# Encola un heartbeat. Si la lección pasa a completada se escribe de forma
+# síncrona (junto con lo pendiente) para que el cambio sea visible al instante.
+def record_progress(user_id, lesson_id, watched_time, completed):
+    flusher = get_flusher()
+    if completed:
+        pending = flusher.buffer.pop(user_id, lesson_id)
+        if pending:
+            watched_time = max(pending[0], int(watched_time))
+        results = save_progress({(user_id, lesson_id): (watched_time, True)})
+        progress = results.get((user_id, lesson_id))
+        if progress is None:
+            return None
+        return {'watched_time': progress.watched_time, 'completed': progress.completed}
+    watched_time, completed = flusher.buffer.add(user_id, lesson_id, watched_time, completed)
+    flusher.notify()
+    return {'watched_time': watched_time, 'completed': completed}
+
+
+def get_pending_progress(user_id, lesson_id):
+    if _flusher is None:
+        return None
+    return _flusher.buffer.get(user_id, lesson_id)
+
+
+def flush_progress_buffer():
+    if _flusher is None:
+        return 0
+    return _flusher.flush()
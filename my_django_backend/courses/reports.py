@@ -0,0 +1,116 @@
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Course, Enrollment, Lesson, LessonProgress
+from .sharding import sharded_querysets
+
+# Exportación de progreso e inscripciones para informes, en CSV o JSON lines.
+# Las filas se leen con values_list().iterator(chunk_size) (cursor de
+# servidor donde la base lo permite) y se completan lote a lote con el correo
+# del usuario y los títulos de curso y lección: con sharding el progreso no
+# está en la misma base que auth_user y el catálogo, así que no hay JOIN.
+# La memoria depende de chunk_size, no del tamaño de la exportación.
+
+CHUNK_SIZE = 2000
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson'}
+
+REPORTS = {
+    'progress': {
+        'model': LessonProgress,
+        'date_field': 'updated_at',
+        'fields': ['user_id', 'course_id', 'lesson_id', 'watched_time', 'completed', 'updated_at'],
+        'columns': ['user_id', 'email', 'course_id', 'course_title', 'lesson_id', 'lesson_title',
+                    'watched_time', 'completed', 'updated_at'],
+    },
+    'enrollments': {
+        'model': Enrollment,
+        'date_field': 'enrolled_at',
+        'fields': ['user_id', 'course_id', 'total_lessons', 'completed_lessons', 'enrolled_at'],
+        'columns': ['user_id', 'email', 'course_id', 'course_title', 'total_lessons', 'completed_lessons',
+                    'enrolled_at'],
+    },
+}
+
+
+# Fecha (2024-05-01) o fecha y hora ISO; sin zona se entiende la del proyecto
+def parse_report_date(value):
+    try:
+        parsed = parse_datetime(value) or parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f'Fecha no válida: {value}')
+    if not isinstance(parsed, datetime):
+        parsed = datetime.combine(parsed, datetime.min.time())
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def report_columns(kind):
+    return REPORTS[kind]['columns']
+
+
+def _lookup(model, ids, field):
+    return dict(model.objects.filter(id__in=ids).values_list('id', field)) if ids else {}
+
+
+def _chunks(iterator, size):
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# Filas (tuplas en el orden de report_columns) filtradas por curso y por
+# fecha (since <= fecha < until) sobre updated_at / enrolled_at
+def report_rows(kind, course_ids=None, since=None, until=None, chunk_size=CHUNK_SIZE):
+    report = REPORTS[kind]
+    queryset = report['model'].objects.order_by('pk')
+    if course_ids:
+        queryset = queryset.filter(course_id__in=course_ids)
+    if since is not None:
+        queryset = queryset.filter(**{f"{report['date_field']}__gte": since})
+    if until is not None:
+        queryset = queryset.filter(**{f"{report['date_field']}__lt": until})
+
+    for shard_queryset in sharded_querysets(queryset):
+        rows = shard_queryset.values_list(*report['fields']).iterator(chunk_size=chunk_size)
+        for chunk in _chunks(rows, chunk_size):
+            emails = _lookup(get_user_model(), {row[0] for row in chunk}, 'email')
+            courses = _lookup(Course, {row[1] for row in chunk}, 'title')
+            if kind == 'progress':
+                lessons = _lookup(Lesson, {row[2] for row in chunk}, 'title')
+                for user_id, course_id, lesson_id, *rest in chunk:
+                    yield (user_id, emails.get(user_id, ''), course_id, courses.get(course_id, ''),
+                           lesson_id, lessons.get(lesson_id, ''), *rest)
+            else:
+                for user_id, course_id, *rest in chunk:
+                    yield (user_id, emails.get(user_id, ''), course_id, courses.get(course_id, ''), *rest)
+
+
+# Buffer de una línea para csv.writer: devuelve lo escrito en vez de guardarlo
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+# Líneas de texto (cabecera incluida en CSV) listas para escribir o enviar
+def render_rows(kind, rows, fmt='csv'):
+    columns = report_columns(kind)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([_cell(value) for value in row])
+    elif fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(columns, map(_cell, row))), ensure_ascii=False) + '\n'
+    else:
+        raise ValueError(f'Formato desconocido: {fmt}')
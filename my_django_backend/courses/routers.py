@@ -0,0 +1,174 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import aget_version, get_cache, get_version
+
+# Réplica de lectura. Las vistas de sólo lectura (catálogo, estructura,
+# resúmenes de progreso) se marcan con @read_replica y sus consultas van al
+# alias DATABASE_REPLICA['ALIAS']; todo lo demás, y cualquier escritura, va a
+# 'default'. Si el alias no está en DATABASES el router no cambia nada.
+#
+# La réplica puede ir por detrás del primario. Durante STICKY_SECONDS después
+# de escribir, un usuario lee del primario (ve enseguida la lección que acaba
+# de completar), y lo mismo cualquier vista cuyo contenido cambió en esa
+# ventana, para no servir (ni cachear) datos viejos bajo una versión nueva.
+#
+# Esto supone que la réplica va menos de STICKY_SECONDS por detrás. Si el
+# retraso es mayor, una lectura de la réplica puede cachear filas viejas bajo
+# la versión nueva; esas entradas (y la versión misma) caducan a los
+# COURSES_CACHE_VERSION_TIMEOUT segundos, que acotan cuánto se sirven.
+# Vigila el retraso de la réplica y ajusta STICKY_SECONDS por encima de él.
+
+DEFAULTS = {
+    'ALIAS': 'replica',
+    'STICKY_SECONDS': 10,
+}
+
+_use_replica = ContextVar('courses_use_replica', default=False)
+_request_writes = ContextVar('courses_request_writes', default=None)
+
+
+def replica_settings():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_REPLICA', {})}
+
+
+def replica_alias():
+    alias = replica_settings()['ALIAS']
+    return alias if alias in settings.DATABASES else None
+
+
+def _sticky_key(user_id):
+    return f'courses:sticky:{user_id}'
+
+
+def mark_written(*user_ids):
+    if user_ids:
+        get_cache().set_many(
+            {_sticky_key(user_id): time.time() for user_id in user_ids},
+            timeout=replica_settings()['STICKY_SECONDS'],
+        )
+
+
+def recently_wrote(user_id):
+    return get_cache().get(_sticky_key(user_id)) is not None
+
+
+async def arecently_wrote(user_id):
+    return await get_cache().aget(_sticky_key(user_id)) is not None
+
+
+# Apunta que la petición en curso escribió. Los routers lo hacen al elegir
+# base de escritura; las escrituras con .using(shard) no pasan por ellos y
+# las apunta quien las hace.
+def note_write():
+    writes = _request_writes.get()
+    if writes is not None:
+        writes['wrote'] = True
+
+
+@contextmanager
+def replica_reads():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        note_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema del primario (replicación o sync_replica)
+        if db == replica_settings()['ALIAS']:
+            return False
+        return None
+
+
+# Recuerda qué usuarios escribieron en la base durante la petición
+class StickyWriteMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = {'wrote': False}
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        # DRF deja en la petición de Django el usuario autenticado por JWT
+        user = getattr(request, 'user', None)
+        if writes['wrote'] and user is not None and user.is_authenticated:
+            mark_written(user.id)
+        return response
+
+
+def _fresh(versions):
+    horizon = time.time() - replica_settings()['STICKY_SECONDS']
+    return any(version > horizon for version in versions)
+
+
+def _user_id(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.id
+    return None
+
+
+# Ejecuta la vista leyendo de la réplica salvo que el usuario haya escrito o
+# los ámbitos de `get_scopes` (ver courses.conditional) hayan cambiado hace
+# menos de STICKY_SECONDS.
+def read_replica(get_scopes=None):
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if replica_alias() is None:
+                return method(self, request, *args, **kwargs)
+            user_id = _user_id(request)
+            if user_id is not None and recently_wrote(user_id):
+                return method(self, request, *args, **kwargs)
+            scopes = get_scopes(request, *args, **kwargs) if get_scopes else []
+            if _fresh([get_version(scope) for scope in scopes]):
+                return method(self, request, *args, **kwargs)
+            with replica_reads():
+                return method(self, request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Igual que read_replica para las vistas async (courses.async_views)
+def async_read_replica(get_scopes=None):
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(self, request, *args, **kwargs):
+            if replica_alias() is None:
+                return await method(self, request, *args, **kwargs)
+            user_id = _user_id(request)
+            if user_id is not None and await arecently_wrote(user_id):
+                return await method(self, request, *args, **kwargs)
+            scopes = get_scopes(request, *args, **kwargs) if get_scopes else []
+            if _fresh([await aget_version(scope) for scope in scopes]):
+                return await method(self, request, *args, **kwargs)
+            with replica_reads():
+                return await method(self, request, *args, **kwargs)
+        return wrapper
+    return decorator
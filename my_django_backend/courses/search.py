@@ -0,0 +1,266 @@
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from .cache import CATALOG_SCOPE, get_version
+from .models import Course, Lesson
+
+FTS_TABLE = 'courses_course_fts'
+
+# Peso de cada campo en el ranking
+FIELD_WEIGHTS = {'title': 10.0, 'tags': 5.0, 'lessons': 2.0, 'description': 1.0}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '').lower()
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def course_documents(course_ids=None):
+    courses = Course.objects.only('id', 'title', 'description', 'tags', 'category')
+    lessons = Lesson.objects.values_list('course_id', 'title').order_by()
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+        lessons = lessons.filter(course_id__in=course_ids)
+    lesson_titles = defaultdict(list)
+    for course_id, title in lessons:
+        lesson_titles[course_id].append(title)
+    for course in courses:
+        yield {
+            'id': course.id,
+            'category': course.category,
+            'title': course.title,
+            'description': course.description,
+            'tags': course.tags,
+            'lessons': ' '.join(lesson_titles[course.id]),
+        }
+
+
+# Interfaz común de los índices de búsqueda de cursos
+class BaseSearchBackend:
+    def index_courses(self, course_ids):
+        raise NotImplementedError
+
+    def remove_courses(self, course_ids):
+        raise NotImplementedError
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    # Devuelve ([course_id, ...] ordenados por relevancia, total, {category: count})
+    def search(self, query, category=None, limit=20, offset=0):
+        raise NotImplementedError
+
+
+# Índice SQLite FTS5 (tabla virtual creada por la migración 0008)
+class SQLiteFTSBackend(BaseSearchBackend):
+    def index_courses(self, course_ids):
+        course_ids = list(course_ids)
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._delete(cursor, course_ids)
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description, tags, lessons, category) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                [
+                    (doc['id'], doc['title'], doc['description'], doc['tags'], doc['lessons'], doc['category'])
+                    for doc in course_documents(course_ids)
+                ],
+            )
+
+    def remove_courses(self, course_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, list(course_ids))
+
+    def _delete(self, cursor, course_ids):
+        if course_ids:
+            placeholders = ', '.join(['%s'] * len(course_ids))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', course_ids)
+
+    def rebuild(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.index_courses(Course.objects.values_list('id', flat=True))
+
+    def match_expression(self, query):
+        # Cada término como prefijo entre comillas: evita inyectar sintaxis FTS5
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, query, category=None, limit=20, offset=0):
+        match = self.match_expression(query)
+        if not match:
+            return [], 0, {}
+        weights = ', '.join(str(FIELD_WEIGHTS[name]) for name in ('title', 'description', 'tags', 'lessons'))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT category, COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s GROUP BY category',
+                [match],
+            )
+            facets = dict(cursor.fetchall())
+            params = [match]
+            where = f'{FTS_TABLE} MATCH %s'
+            if category:
+                where += ' AND category = %s'
+                params.append(category)
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {where} '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}, 0) LIMIT %s OFFSET %s',
+                params + [limit, offset],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        total = facets.get(category, 0) if category else sum(facets.values())
+        return ids, total, facets
+
+
+# Índice invertido en memoria del proceso para bases de datos sin FTS5.
+# Se construye la primera vez que se usa y las señales lo mantienen con los
+# cambios hechos en este proceso. Los de otros procesos sólo llegan por la
+# versión del catálogo (CATALOG_SCOPE) con la que se construyó: si cambia, la
+# siguiente búsqueda lo reconstruye. Con una cache por proceso (LocMemCache)
+# eso ocurre como mucho COURSES_CACHE_VERSION_TIMEOUT segundos después; con
+# varios workers usa una cache compartida o SQLiteFTSBackend.
+class PythonIndexBackend(BaseSearchBackend):
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None  # versión del catálogo indexada; None sin construir
+        self._postings = defaultdict(dict)  # término -> {course_id: peso}
+        self._doc_terms = {}  # course_id -> términos indexados
+        self._categories = {}
+        self._terms = []  # términos ordenados, para búsqueda por prefijo
+
+    def _add(self, doc):
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(doc[field]):
+                weights[token] += weight
+        for token, weight in weights.items():
+            self._postings[token][doc['id']] = weight
+        self._doc_terms[doc['id']] = set(weights)
+        self._categories[doc['id']] = doc['category']
+
+    def _remove(self, course_id):
+        for token in self._doc_terms.pop(course_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(course_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._categories.pop(course_id, None)
+
+    def _ensure_built(self):
+        if self._version != get_version(CATALOG_SCOPE):
+            self.rebuild()
+
+    def index_courses(self, course_ids):
+        with self._lock:
+            if self._version is None:
+                # Se indexará todo (ya actualizado) en la primera búsqueda
+                return
+            course_ids = list(course_ids)
+            for course_id in course_ids:
+                self._remove(course_id)
+            for doc in course_documents(course_ids):
+                self._add(doc)
+            self._terms = sorted(self._postings)
+
+    def remove_courses(self, course_ids):
+        with self._lock:
+            for course_id in course_ids:
+                self._remove(course_id)
+            self._terms = sorted(self._postings)
+
+    def rebuild(self):
+        with self._lock:
+            # Leída antes de indexar: un cambio durante la construcción
+            # provoca otra en la siguiente búsqueda
+            version = get_version(CATALOG_SCOPE)
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._categories.clear()
+            for doc in course_documents():
+                self._add(doc)
+            self._terms = sorted(self._postings)
+            self._version = version
+
+    def _expand(self, prefix):
+        for index in range(bisect_left(self._terms, prefix), len(self._terms)):
+            term = self._terms[index]
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def search(self, query, category=None, limit=20, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return [], 0, {}
+        with self._lock:
+            self._ensure_built()
+            total_docs = max(len(self._doc_terms), 1)
+            scores = None
+            for token in tokens:
+                # Todos los términos deben aparecer (AND); cada uno como prefijo
+                token_scores = Counter()
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total_docs / len(postings))
+                    for course_id, weight in postings.items():
+                        token_scores[course_id] += weight * idf
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = Counter({cid: scores[cid] + s for cid, s in token_scores.items() if cid in scores})
+                if not scores:
+                    return [], 0, {}
+            facets = Counter(self._categories[course_id] for course_id in scores)
+            if category:
+                scores = {cid: score for cid, score in scores.items() if self._categories[cid] == category}
+        ranked = sorted(scores, key=lambda cid: (-scores[cid], cid))
+        return ranked[offset:offset + limit], len(ranked), dict(facets)
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'COURSES_SEARCH_BACKEND', None)
+                if path:
+                    _backend = import_string(path)()
+                elif fts5_available():
+                    _backend = SQLiteFTSBackend()
+                else:
+                    _backend = PythonIndexBackend()
+    return _backend
+
+
+# Reindexa al confirmar la transacción (mismo criterio que las versiones de cache)
+def schedule_reindex(*course_ids):
+    course_ids = [course_id for course_id in course_ids if course_id is not None]
+    if course_ids:
+        transaction.on_commit(lambda: get_search_backend().index_courses(course_ids))
+
+
+def schedule_removal(*course_ids):
+    transaction.on_commit(lambda: get_search_backend().remove_courses(course_ids))
@@ -1,6 +1,18 @@
 from rest_framework import serializers, generics
-from .models import Course, LessonProgress, Enrollment, Lesson
+from .models import Course, LessonProgress, Enrollment
 from rest_framework.permissions import AllowAny
+from .progress import get_course_flags, is_course_completed
+from .sharding import shard_for
+
+# Para listas de cursos calcula los flags del usuario de una sola vez
+class CourseListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        courses = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        if {'is_enrolled', 'completed'} & set(self.child.fields):
+            self.child.course_flags = get_course_flags(user, [course.id for course in courses])
+        return super().to_representation(courses)
 
 class CourseSerializer(serializers.ModelSerializer):
     is_enrolled = serializers.SerializerMethodField()
@@ -12,26 +24,44 @@ class CourseSerializer(serializers.ModelSerializer):
             'id', 'title', 'description', 'category', 'tags', 'duration', 'rating', 'cover_image_url',
             'is_enrolled', 'completed',  # <-- Agrega aquí
         )
+        list_serializer_class = CourseListSerializer
+
+    course_flags = None
+
+    # `fields` permite pedir sólo algunos campos (?fields=id,title,rating)
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def _get_flag(self, obj, name):
+        if self.course_flags is not None:
+            return self.course_flags.get(obj.id, {}).get(name, False)
+        return None
 
     def get_is_enrolled(self, obj):
+        flag = self._get_flag(obj, 'is_enrolled')
+        if flag is not None:
+            return flag
         request = self.context.get('request')
         user = getattr(request, 'user', None)
         if user and user.is_authenticated:
-            return obj.enrollments.filter(user=user).exists()
+            return Enrollment.objects.using(shard_for(user.id)).filter(user=user, course=obj).exists()
         return False
 
     def get_completed(self, obj):
+        flag = self._get_flag(obj, 'completed')
+        if flag is not None:
+            return flag
         request = self.context.get('request')
         user = getattr(request, 'user', None)
         if not user or not user.is_authenticated:
             return False
-        # Obtén todas las lecciones del curso
-        lesson_ids = Lesson.objects.filter(module__level__course=obj).values_list('id', flat=True)
-        total = len(lesson_ids)
-        if total == 0:
-            return False
-        completed = LessonProgress.objects.filter(user=user, lesson_id__in=lesson_ids, completed=True).count()
-        return completed == total
+        counters = Enrollment.objects.using(shard_for(user.id)).filter(user=user, course=obj).values_list(
+            'total_lessons', 'completed_lessons'
+        ).first()
+        return is_course_completed(*counters) if counters else False
 
 class LessonProgressSerializer(serializers.ModelSerializer):
     class Meta:
@@ -39,6 +69,12 @@ class LessonProgressSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'lesson', 'watched_time', 'completed']
         read_only_fields = ['user', 'lesson']
         
+# Un elemento de POST /api/lesson-progress/batch/
+class LessonProgressBatchItemSerializer(serializers.Serializer):
+    lesson = serializers.IntegerField(min_value=1)
+    watched_time = serializers.IntegerField(min_value=0, default=0)
+    completed = serializers.BooleanField(default=False)
+
 class EnrollmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
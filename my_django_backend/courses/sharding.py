@@ -0,0 +1,173 @@
+import zlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, Max, Min, Sum
+
+from .routers import note_write
+
+# Sharding del progreso por usuario. Las filas de LessonProgress y Enrollment
+# de un usuario viven en uno de los alias de PROGRESS_SHARDS, elegido por hash
+# de su id; el catálogo (Course, Level, Module, Lesson, etiquetas) y los
+# usuarios siguen en 'default'. Con un solo alias (lo normal) shard_for()
+# devuelve None y todo funciona como sin sharding.
+#
+# Django no sabe a qué usuario va una consulta, así que el código que lee o
+# escribe progreso usa .using(shard_for(user_id)); las consultas que abarcan
+# a todos los usuarios recorren sharded_querysets().
+
+SHARDED_MODELS = {'lessonprogress', 'enrollment'}
+
+
+def progress_databases():
+    return list(getattr(settings, 'PROGRESS_SHARDS', None) or [DEFAULT_DB_ALIAS])
+
+
+def sharding_enabled():
+    return len(progress_databases()) > 1
+
+
+def shard_for(user_id, shards=None):
+    shards = shards or progress_databases()
+    if len(shards) == 1:
+        # Sin sharding la decisión queda en manos de los routers (réplica, sticky)
+        return None
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'courses' and model._meta.model_name in SHARDED_MODELS
+
+
+# El mismo queryset en cada shard (o tal cual sin sharding)
+def sharded_querysets(queryset):
+    if not sharding_enabled():
+        return [queryset]
+    return [queryset.using(alias) for alias in progress_databases()]
+
+
+# Borra en los shards lo que la cascada de Django (sólo en 'default') no
+# alcanza. Es un DELETE directo por igualdad de columnas (`lesson_id=3`): sin
+# señales ni colector, que cargarían cada fila para recontarla una a una.
+def purge_shards(model, **filters):
+    if not sharding_enabled():
+        return
+    for alias in progress_databases():
+        if alias == DEFAULT_DB_ALIAS:
+            continue
+        quote = connections[alias].ops.quote_name
+        where = ' AND '.join(f'{quote(model._meta.get_field(field).column)} = %s' for field in filters)
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {quote(model._meta.db_table)} WHERE {where}', list(filters.values()))
+
+
+# Igual, por clave primaria y en un solo alias (reshard_progress)
+def delete_rows(model, alias, pks):
+    if not pks:
+        return
+    quote = connections[alias].ops.quote_name
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} IN ({placeholders})',
+            list(pks),
+        )
+
+
+class ShardRouter:
+    def _user_id(self, instance):
+        if instance is None:
+            return None
+        if is_sharded(type(instance)):
+            return instance.user_id
+        if isinstance(instance, get_user_model()):
+            return instance.pk
+        return None
+
+    def _route(self, model, hints):
+        if not sharding_enabled():
+            return None
+        instance = hints.get('instance')
+        if is_sharded(model):
+            user_id = self._user_id(instance)
+            return shard_for(user_id) if user_id is not None else None
+        if instance is not None and is_sharded(type(instance)):
+            # lesson, course o user de una fila de progreso: están en el primario
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        alias = self._route(model, hints)
+        if alias is not None:
+            # ReplicaRouter, que apunta las escrituras, ya no se consulta
+            note_write()
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding_enabled() and (is_sharded(type(obj1)) or is_sharded(type(obj2))):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in progress_databases():
+            return None
+        # Los shards reciben todo el esquema (vacío salvo el progreso) pero no
+        # las migraciones de datos, que no indican modelo
+        return model_name is not None
+
+
+# Agregados entre shards para informes. Count, Sum, Min y Max se combinan
+# sumando o comparando los parciales; Count(distinct=True) sólo es exacto si
+# lo contado no se repite entre shards (usuarios, no cursos).
+def _sum(values):
+    return sum(values) if values else None
+
+
+COMBINE = {
+    Count: sum,
+    Sum: _sum,
+    Max: lambda values: max(values, default=None),
+    Min: lambda values: min(values, default=None),
+}
+
+
+def _combiners(aggregates):
+    combiners = {}
+    for name, aggregate in aggregates.items():
+        if type(aggregate) not in COMBINE:
+            raise TypeError(f'{type(aggregate).__name__} no se puede combinar entre shards; usa Sum y Count.')
+        combiners[name] = COMBINE[type(aggregate)]
+    return combiners
+
+
+def _combine(combiners, partials):
+    return {
+        name: combine([partial[name] for partial in partials if partial[name] is not None])
+        for name, combine in combiners.items()
+    }
+
+
+def sharded_count(queryset):
+    return sum(qs.count() for qs in sharded_querysets(queryset))
+
+
+def sharded_aggregate(queryset, **aggregates):
+    combiners = _combiners(aggregates)
+    return _combine(combiners, [qs.aggregate(**aggregates) for qs in sharded_querysets(queryset)])
+
+
+# Como queryset.values(*group_by).annotate(**aggregates) sobre todos los shards
+def sharded_values(queryset, group_by, **aggregates):
+    combiners = _combiners(aggregates)
+    groups = {}
+    for qs in sharded_querysets(queryset):
+        for row in qs.order_by().values(*group_by).annotate(**aggregates):
+            groups.setdefault(tuple(row[field] for field in group_by), []).append(row)
+    return [
+        {**dict(zip(group_by, key)), **_combine(combiners, rows)}
+        for key, rows in groups.items()
+    ]
@@ -0,0 +1,188 @@
+from django.conf import settings
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import CATALOG_SCOPE, bump_version, course_scope, user_scope
+from .counters import recount_course, recount_user_course
+from .models import Course, Enrollment, Lesson, LessonProgress, Level, Module
+from .search import schedule_reindex, schedule_removal
+from .sharding import purge_shards, sharded_querysets, sharding_enabled
+from .tags import release_course_tags, sync_course_tags
+from .user_stats import apply_stats, enrollment_delta, rebuild_user_stats
+
+
+def _course_id_of(instance):
+    if isinstance(instance, Module):
+        return Level.objects.filter(id=instance.level_id).values_list('course_id', flat=True).first()
+    return instance.course_id
+
+
+# Mantiene la copia de course en Lesson y LessonProgress cuando un nivel,
+# módulo o lección cambia de curso
+def _move_lessons(instance, course_id):
+    if isinstance(instance, Level):
+        lessons = Lesson.objects.filter(module__level=instance)
+    elif isinstance(instance, Module):
+        lessons = Lesson.objects.filter(module=instance)
+    else:
+        lessons = Lesson.objects.filter(pk=instance.pk)
+    lesson_ids = list(lessons.values_list('id', flat=True))
+    lessons.update(course_id=course_id)
+    for progress in sharded_querysets(LessonProgress.objects.filter(lesson_id__in=lesson_ids)):
+        progress.update(course_id=course_id)
+
+
+# Si un nivel, módulo o lección cambia de curso hay que recontar también el curso anterior
+@receiver(pre_save, sender=Level)
+@receiver(pre_save, sender=Module)
+@receiver(pre_save, sender=Lesson)
+def remember_previous_course(sender, instance, raw=False, **kwargs):
+    instance._previous_course_id = None
+    if instance.pk and not raw:
+        old = sender.objects.filter(pk=instance.pk).first()
+        if old is not None:
+            instance._previous_course_id = _course_id_of(old)
+
+
+@receiver(post_save, sender=Level)
+@receiver(post_save, sender=Module)
+@receiver(post_save, sender=Lesson)
+def recount_after_structure_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    course_id = _course_id_of(instance)
+    previous = getattr(instance, '_previous_course_id', None)
+    moved = previous not in (None, course_id)
+    if moved:
+        _move_lessons(instance, course_id)
+    # Los totales sólo cambian con una lección nueva o una rama que cambia de
+    # curso; renombrar no recuenta las inscripciones
+    if moved or (created and sender is Lesson):
+        recount_course(course_id)
+    bump_version(course_scope(course_id), CATALOG_SCOPE)
+    schedule_reindex(course_id)
+    if moved:
+        recount_course(previous)
+        bump_version(course_scope(previous))
+        schedule_reindex(previous)
+
+
+# Borrado en cascada desde otro objeto (el nivel, el módulo o el curso)
+def _cascaded(instance, origin):
+    return isinstance(origin, Model) and origin is not instance
+
+
+# En una cascada recuenta una vez el nivel o módulo que la origina (tras
+# borrar todas sus lecciones), no cada lección; el curso borrado no recuenta
+@receiver(post_delete, sender=Lesson)
+def recount_after_lesson_delete(sender, instance, origin=None, **kwargs):
+    purge_shards(LessonProgress, lesson_id=instance.pk)
+    course_id = _course_id_of(instance)
+    if not _cascaded(instance, origin):
+        recount_course(course_id)
+    schedule_reindex(course_id)
+
+
+@receiver(post_delete, sender=Level)
+@receiver(post_delete, sender=Module)
+def recount_after_branch_delete(sender, instance, origin=None, **kwargs):
+    if not _cascaded(instance, origin):
+        recount_course(_course_id_of(instance))
+
+
+# Cualquier cambio en la estructura invalida la cache del curso (incluido el admin)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def bump_course_version(sender, instance, raw=False, **kwargs):
+    bump_version(course_scope(instance.pk), CATALOG_SCOPE)
+
+
+@receiver(post_save, sender=Course)
+def reindex_course(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_reindex(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+def sync_tags_after_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_course_tags(instance)
+
+
+@receiver(pre_delete, sender=Course)
+def release_tags_before_delete(sender, instance, **kwargs):
+    release_course_tags(instance)
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    schedule_removal(instance.pk)
+
+
+# La cascada de Django sólo borra el progreso guardado en 'default'
+@receiver(post_delete, sender=Course)
+def purge_course_progress(sender, instance, **kwargs):
+    user_ids = set()
+    if sharding_enabled():
+        for model in (LessonProgress, Enrollment):
+            for rows in sharded_querysets(model.objects.filter(course_id=instance.pk)):
+                user_ids.update(rows.order_by().values_list('user_id', flat=True).distinct())
+    purge_shards(LessonProgress, course_id=instance.pk)
+    purge_shards(Enrollment, course_id=instance.pk)
+    # _raw_delete no emite señales
+    if user_ids:
+        rebuild_user_stats(sorted(user_ids))
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def purge_user_progress(sender, instance, **kwargs):
+    purge_shards(LessonProgress, user_id=instance.pk)
+    purge_shards(Enrollment, user_id=instance.pk)
+
+
+@receiver(post_delete, sender=Level)
+@receiver(post_delete, sender=Module)
+@receiver(post_delete, sender=Lesson)
+def bump_version_after_structure_delete(sender, instance, **kwargs):
+    course_id = _course_id_of(instance)
+    if course_id is not None:
+        bump_version(course_scope(course_id), CATALOG_SCOPE)
+
+
+# Escrituras directas (admin, .save()). Las escrituras en bloque de
+# progress.save_progress actualizan los contadores por su cuenta.
+@receiver(pre_save, sender=LessonProgress)
+def remember_previous_watched(sender, instance, raw=False, **kwargs):
+    instance._previous_watched = 0
+    if instance.pk and not raw:
+        instance._previous_watched = (
+            sender.objects.using(kwargs['using']).filter(pk=instance.pk)
+            .values_list('watched_time', flat=True).first() or 0
+        )
+
+
+@receiver(post_save, sender=LessonProgress)
+def recount_after_progress_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    watched = instance.watched_time - getattr(instance, '_previous_watched', 0)
+    recount_user_course(instance.user_id, instance.course_id, watched)
+
+
+@receiver(post_delete, sender=LessonProgress)
+def recount_after_progress_delete(sender, instance, **kwargs):
+    recount_user_course(instance.user_id, instance.course_id, -instance.watched_time)
+
+
+@receiver(post_save, sender=Enrollment)
+def init_enrollment_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        recount_user_course(instance.user_id, instance.course_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def bump_user_after_unenroll(sender, instance, **kwargs):
+    counters = (instance.total_lessons, instance.completed_lessons)
+    apply_stats({instance.user_id: enrollment_delta(counters, None)})
+    bump_version(user_scope(instance.user_id), using=kwargs['using'])
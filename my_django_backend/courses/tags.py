@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Course, CourseTag, Tag
+
+MAX_TAG_LENGTH = Tag._meta.get_field('name').max_length
+
+
+# 'IA, Python,ia' -> ['ia', 'python']
+def parse_tags(value):
+    names = []
+    for name in (value or '').split(','):
+        name = ' '.join(name.split()).lower()[:MAX_TAG_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+# Sincroniza tag_set con el texto de Course.tags y ajusta los contadores
+@transaction.atomic
+def sync_course_tags(course):
+    # Dos guardados del mismo curso a la vez no deben contar dos veces una etiqueta
+    list(Course.objects.select_for_update().filter(pk=course.pk).values_list('pk'))
+    names = set(parse_tags(course.tags))
+    current = dict(
+        CourseTag.objects.filter(course=course).values_list('tag__name', 'tag_id')
+    )
+    added = names - set(current)
+    removed = [tag_id for name, tag_id in current.items() if name not in names]
+
+    if added:
+        Tag.objects.bulk_create([Tag(name=name) for name in added], ignore_conflicts=True)
+        tag_ids = set(Tag.objects.filter(name__in=added).values_list('id', flat=True))
+        # Sólo cuentan los enlaces que se insertan ahora, no los que ya existían
+        tag_ids -= set(
+            CourseTag.objects.filter(course=course, tag_id__in=tag_ids).values_list('tag_id', flat=True)
+        )
+        CourseTag.objects.bulk_create(
+            [CourseTag(course=course, tag_id=tag_id) for tag_id in tag_ids], ignore_conflicts=True
+        )
+        Tag.objects.filter(id__in=tag_ids).update(course_count=F('course_count') + 1)
+    if removed:
+        CourseTag.objects.filter(course=course, tag_id__in=removed).delete()
+        Tag.objects.filter(id__in=removed).update(course_count=F('course_count') - 1)
+
+
+def release_course_tags(course):
+    tag_ids = list(CourseTag.objects.filter(course=course).values_list('tag_id', flat=True))
+    if tag_ids:
+        Tag.objects.filter(id__in=tag_ids).update(course_count=F('course_count') - 1)
+
+
+# Cursos que tienen todas las etiquetas indicadas (usa el índice tag, course)
+def filter_by_tags(queryset, names):
+    names = parse_tags(','.join(names))
+    if not names:
+        return queryset
+    matching = (
+        CourseTag.objects.filter(tag__name__in=names)
+        .values('course')
+        .annotate(matches=Count('tag'))
+        .filter(matches=len(names))
+        .values('course')
+    )
+    return queryset.filter(id__in=matching)
+
+
+def recount_tags():
+    Tag.objects.update(course_count=0)
+    for tag_id, total in CourseTag.objects.values_list('tag').annotate(total=Count('id')).order_by():
+        Tag.objects.filter(id=tag_id).update(course_count=total)
+
+
+def popular_tags(limit=None):
+    tags = Tag.objects.filter(course_count__gt=0).order_by('-course_count', 'name')
+    if limit:
+        tags = tags[:max(limit, 1)]
+    return tags.values('name', 'course_count')
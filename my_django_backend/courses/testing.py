@@ -0,0 +1,71 @@
+from contextlib import ExitStack
+
+from django import test
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework import test as drf_test
+
+from .sharding import shard_for
+
+# Bases y utilidades de los tests del proyecto. Con PROGRESS_SHARDS=N
+# Enrollment y LessonProgress se leen y escriben en los N alias de progreso,
+# así que cada test abre todas las bases: la suite pasa igual con y sin shards.
+
+
+#
+# Un alias espejo (TEST['MIRROR'], p. ej. la réplica con DATABASE_REPLICA_NAME)
+# sólo copia el NAME de su primario: con SQLite en memoria abriría una segunda
+# conexión a la misma base compartida y la transacción del test en una
+# bloquearía a la otra ("database table is locked"). Como hace
+# LiveServerTestCase con las bases en memoria, el espejo usa durante la clase
+# la misma conexión que su primario.
+class SharedMirrorsMixin:
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        for alias in connections:
+            mirror = connections.settings[alias]['TEST'].get('MIRROR')
+            if mirror and connections[alias] is not connections[mirror]:
+                connections[alias] = connections[mirror]
+                # La siguiente clase vuelve a crear la conexión desde DATABASES
+                cls.addClassCleanup(connections.__delitem__, alias)
+        super().setUpClass()
+
+
+class TestCase(SharedMirrorsMixin, test.TestCase):
+    pass
+
+
+class APITestCase(SharedMirrorsMixin, drf_test.APITestCase):
+    pass
+
+
+class LiveServerTestCase(SharedMirrorsMixin, test.LiveServerTestCase):
+    pass
+
+
+# Alias del progreso de un usuario, p. ej. para captureOnCommitCallbacks(using=...)
+def user_db(user):
+    return shard_for(user.id) or DEFAULT_DB_ALIAS
+
+
+# Filas de progreso de un usuario en su shard, como las escribe la
+# aplicación: Manager.create() no pasa la instancia al router y sin
+# .using() acabaría en 'default'
+def user_rows(model, user):
+    return model.objects.using(user_db(user))
+
+
+# CaptureQueriesContext sobre todas las conexiones
+class CaptureAllQueries(ExitStack):
+    def __enter__(self):
+        super().__enter__()
+        # Un espejo comparte conexión con su primario: cada conexión una vez
+        unique = {id(connection): connection for connection in connections.all()}
+        self.contexts = [self.enter_context(CaptureQueriesContext(connection)) for connection in unique.values()]
+        return self
+
+    @property
+    def captured_queries(self):
+        return [query for context in self.contexts for query in context.captured_queries]
@@ -1,3 +1,1467 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+from django.db.models import Avg, Count, F, Sum
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import UserStats
+from users.notifications import notify_users
+
+from . import benchmark, metrics, profiling, progress_buffer, reports, routers
+from .async_views import AsyncCourseProgressView, AsyncCourseStructureView, AsyncLessonProgressDetail
+from .bulk_enrollment import bulk_enroll
+from .cache import CATALOG_SCOPE, bump_version, get_cache, get_course_structure, get_version, user_scope
+from .counters import recount_enrollments
+from .loadtest import metric_total
+from .models import Course, CourseTag, Enrollment, Lesson, LessonProgress, Level, Module, Tag
+from .progress import save_progress
+from .progress_buffer import LocMemProgressBuffer, ProgressFlusher
+from .routers import ReplicaRouter, recently_wrote, replica_reads
+from .search import PythonIndexBackend
+from .sharding import sharded_aggregate, sharded_count, sharded_querysets, sharded_values, shard_for
+from .testing import APITestCase, CaptureAllQueries, LiveServerTestCase, TestCase, user_db, user_rows
+from .user_stats import get_user_stats
+
+
+def create_course(title='Curso', lessons=1, rating=4.5):
+    course = Course.objects.create(
+        title=title,
+        description='Descripción',
+        category='IA',
+        tags='ia,python',
+        duration='8 semanas',
+        rating=rating,
+        cover_image_url='https://example.com/cover.png',
+    )
+    level = Level.objects.create(course=course, name='Nivel 1')
+    module = Module.objects.create(level=level, name='Módulo 1')
+    for order in range(1, lessons + 1):
+        Lesson.objects.create(module=module, title=f'Lección {order}', duration='10:00', video_id='abc', order=order)
+    return course
+
+
+class CourseListQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data
+
+    def test_query_count_does_not_grow_with_courses(self):
+        for i in range(2):
+            create_course(f'Curso {i}', lessons=2)
+        small, _ = self.count_queries('/api/courses/')
+
+        for i in range(2, 12):
+            create_course(f'Curso {i}', lessons=2)
+        large, data = self.count_queries('/api/courses/')
+
+        self.assertEqual(len(data), 12)
+        self.assertEqual(small, large)
+
+    def test_flags_match_user_progress(self):
+        enrolled = create_course('Inscrito', lessons=2)
+        finished = create_course('Terminado', lessons=1)
+        create_course('Sin inscribir', lessons=1)
+        user_rows(Enrollment, self.user).create(user=self.user, course=enrolled)
+        user_rows(Enrollment, self.user).create(user=self.user, course=finished)
+        lesson = Lesson.objects.get(module__level__course=finished)
+        user_rows(LessonProgress, self.user).create(user=self.user, lesson=lesson, watched_time=600, completed=True)
+        partial = Lesson.objects.filter(module__level__course=enrolled).first()
+        user_rows(LessonProgress, self.user).create(user=self.user, lesson=partial, watched_time=600, completed=True)
+
+        _, data = self.count_queries('/api/courses/')
+        flags = {item['title']: (item['is_enrolled'], item['completed']) for item in data}
+        self.assertEqual(flags['Inscrito'], (True, False))
+        self.assertEqual(flags['Terminado'], (True, True))
+        self.assertEqual(flags['Sin inscribir'], (False, False))
+
+    def test_anonymous_user_gets_false_flags(self):
+        create_course()
+        self.client.force_authenticate(None)
+        _, data = self.count_queries('/api/courses/')
+        self.assertFalse(data[0]['is_enrolled'])
+        self.assertFalse(data[0]['completed'])
+
+
+@override_settings(LESSON_PROGRESS_BUFFER={'ENABLED': True})
+class LessonProgressBufferTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.client.force_authenticate(self.user)
+        self.lesson = Lesson.objects.get(module__level__course=create_course())
+        self.url = f'/api/lesson-progress/{self.lesson.id}/'
+        # Sin hilo de fondo: los tests vacían el buffer a mano
+        self.flusher = ProgressFlusher(LocMemProgressBuffer(), interval=3600, max_entries=1000)
+        patcher = mock.patch.object(progress_buffer, '_flusher', self.flusher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_heartbeats_are_coalesced_until_flush(self):
+        for seconds in (5, 12, 8):
+            response = self.client.put(self.url, {'watched_time': seconds}, format='json')
+            self.assertEqual(response.status_code, 202)
+        self.assertFalse(user_rows(LessonProgress, self.user).exists())
+        self.assertEqual(self.client.get(self.url).data['watched_time'], 12)
+
+        self.assertEqual(self.flusher.flush(), 1)
+        progress = user_rows(LessonProgress, self.user).get(user=self.user, lesson=self.lesson)
+        self.assertEqual(progress.watched_time, 12)
+        self.assertFalse(progress.completed)
+
+    def test_flush_keeps_greater_stored_watched_time(self):
+        user_rows(LessonProgress, self.user).create(user=self.user, lesson=self.lesson, watched_time=30)
+        self.client.put(self.url, {'watched_time': 10}, format='json')
+        self.flusher.flush()
+        self.assertEqual(user_rows(LessonProgress, self.user).get().watched_time, 30)
+
+    def test_unknown_lesson_is_not_buffered(self):
+        response = self.client.put('/api/lesson-progress/99999/', {'watched_time': 10}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(self.flusher.buffer), 0)
+        # Las lecciones existentes se comprueban en la cache, no en la base
+        self.client.put(self.url, {'watched_time': 5}, format='json')
+        with CaptureAllQueries() as ctx:
+            self.assertEqual(self.client.put(self.url, {'watched_time': 6}, format='json').status_code, 202)
+        self.assertFalse([q for q in ctx.captured_queries if 'courses_lesson' in q['sql']])
+
+    def test_completion_is_written_synchronously(self):
+        self.client.put(self.url, {'watched_time': 40}, format='json')
+        response = self.client.put(self.url, {'watched_time': 20, 'completed': True}, format='json')
+        self.assertEqual(response.status_code, 202)
+        progress = user_rows(LessonProgress, self.user).get(user=self.user, lesson=self.lesson)
+        self.assertEqual((progress.watched_time, progress.completed), (40, True))
+        self.assertEqual(len(self.flusher.buffer), 0)
+
+
+class LessonProgressBatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.client.force_authenticate(self.user)
+        course = create_course(lessons=3)
+        self.lessons = list(Lesson.objects.filter(module__level__course=course).order_by('order'))
+
+    def test_batch_applies_monotonic_rule_and_reports_per_item(self):
+        first, second, _ = self.lessons
+        user_rows(LessonProgress, self.user).create(user=self.user, lesson=first, watched_time=50)
+        payload = [
+            {'lesson': first.id, 'watched_time': 20},
+            {'lesson': second.id, 'watched_time': 15, 'completed': True},
+            {'lesson': second.id, 'watched_time': 30},
+            {'lesson': 99999, 'watched_time': 10},
+            {'watched_time': 'x'},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/lesson-progress/batch/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), 8)
+
+        statuses = [item['status'] for item in response.data]
+        self.assertEqual(statuses, ['ok', 'ok', 'ok', 'error', 'error'])
+        self.assertEqual(response.data[0]['watched_time'], 50)
+        self.assertEqual((response.data[1]['watched_time'], response.data[1]['completed']), (30, True))
+        self.assertEqual(user_rows(LessonProgress, self.user).get(lesson=second).watched_time, 30)
+
+    def test_batch_requires_a_list(self):
+        response = self.client.post('/api/lesson-progress/batch/', {'lesson': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class EnrollmentCounterTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.client.force_authenticate(self.user)
+        self.course = create_course(lessons=2)
+        self.lessons = list(Lesson.objects.filter(module__level__course=self.course).order_by('order'))
+        self.client.post(f'/api/courses/{self.course.id}/enroll/')
+
+    def counters(self):
+        enrollment = user_rows(Enrollment, self.user).get(user=self.user, course=self.course)
+        return enrollment.total_lessons, enrollment.completed_lessons
+
+    def test_enrollment_starts_with_course_totals(self):
+        self.assertEqual(self.counters(), (2, 0))
+
+    def test_completion_updates_counters_and_progress(self):
+        for lesson in self.lessons:
+            self.client.put(f'/api/lesson-progress/{lesson.id}/', {'watched_time': 5, 'completed': True}, format='json')
+            # Repetir el heartbeat no vuelve a sumar
+            self.client.put(f'/api/lesson-progress/{lesson.id}/', {'watched_time': 6, 'completed': True}, format='json')
+        self.assertEqual(self.counters(), (2, 2))
+
+        with CaptureAllQueries() as ctx:
+            response = self.client.get(f'/api/courses/{self.course.id}/progress/')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.data, {'progress': 100, 'completed': True, 'enrolled': True})
+
+    def test_structure_changes_update_totals(self):
+        module = self.lessons[0].module
+        Lesson.objects.create(module=module, title='Extra', duration='1:00', video_id='x', order=3)
+        self.assertEqual(self.counters(), (3, 0))
+        user_rows(LessonProgress, self.user).create(user=self.user, lesson=self.lessons[0], completed=True)
+        self.assertEqual(self.counters(), (3, 1))
+        module.level.delete()
+        self.assertEqual(self.counters(), (0, 0))
+
+    def enrollment_updates(self, action):
+        with CaptureAllQueries() as ctx:
+            action()
+        return [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "courses_enrollment"')]
+
+    def test_renames_do_not_recount(self):
+        lesson = self.lessons[0]
+        lesson.title = 'Otro título'
+        self.assertEqual(self.enrollment_updates(lesson.save), [])
+        module = lesson.module
+        module.name = 'Otro módulo'
+        self.assertEqual(self.enrollment_updates(module.save), [])
+
+    def test_cascades_recount_once(self):
+        module = self.lessons[0].module
+        for order in range(3, 8):
+            Lesson.objects.create(module=module, title=f'Lección {order}', duration='1:00', video_id='x', order=order)
+        # Lo mismo que borrar una sola lección (un recuento por shard)
+        single = len(self.enrollment_updates(Lesson.objects.get(order=7).delete))
+        self.assertEqual(self.counters(), (6, 0))
+        self.assertEqual(len(self.enrollment_updates(module.level.delete)), single)
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_recount_command_repairs_counters(self):
+        user_rows(Enrollment, self.user).update(total_lessons=0, completed_lessons=9)
+        call_command('recount_progress', stdout=StringIO())
+        self.assertEqual(self.counters(), (2, 0))
+
+
+
+class UserStatsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.client.force_authenticate(self.user)
+        self.courses = [create_course(title=f'Curso {index}', lessons=2) for index in range(2)]
+        for course in self.courses:
+            self.client.post(f'/api/courses/{course.id}/enroll/')
+        # La primera lectura crea la fila; a partir de ahí se mantiene con deltas
+        self.client.get('/api/user/courses/count/')
+
+    def stats(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/user/courses/count/')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        return response.data
+
+    def put(self, lesson, **data):
+        self.client.put(f'/api/lesson-progress/{lesson.id}/', data, format='json')
+
+    def test_counters_follow_progress(self):
+        self.assertEqual(
+            self.stats(), {'count': 2, 'enrolled': 2, 'in_progress': 0, 'completed': 0, 'watched_seconds': 0}
+        )
+        first, second = Lesson.objects.filter(course=self.courses[0]).order_by('order')
+        self.put(first, watched_time=40, completed=True)
+        self.put(first, watched_time=30)
+        self.assertEqual((self.stats()['in_progress'], self.stats()['watched_seconds']), (1, 40))
+        self.put(second, watched_time=60, completed=True)
+        stats = self.stats()
+        self.assertEqual((stats['in_progress'], stats['completed'], stats['watched_seconds']), (0, 1, 100))
+
+        # Una lección nueva reabre el curso
+        Lesson.objects.create(module=first.module, title='Extra', duration='1:00', video_id='x', order=3)
+        self.assertEqual((self.stats()['in_progress'], self.stats()['completed']), (1, 0))
+        user_rows(LessonProgress, self.user).filter(lesson=second).delete()
+        self.assertEqual(self.stats()['watched_seconds'], 40)
+        user_rows(Enrollment, self.user).get(course=self.courses[0]).delete()
+        self.assertEqual(self.stats(), {'count': 1, 'enrolled': 1, 'in_progress': 0, 'completed': 0,
+                                        'watched_seconds': 40})
+
+    def test_missing_row_is_rebuilt_on_read(self):
+        lesson = Lesson.objects.filter(course=self.courses[1]).first()
+        self.put(lesson, watched_time=15, completed=True)
+        UserStats.objects.all().delete()
+        response = self.client.get('/api/user/courses/count/')
+        self.assertEqual(response.data, {'count': 2, 'enrolled': 2, 'in_progress': 1, 'completed': 0,
+                                         'watched_seconds': 15})
+
+    def test_notifications_keep_course_counters(self):
+        UserStats.objects.all().delete()
+        notify_users([self.user.id], 'Hola')
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.enrolled_courses, stats.unread_notifications), (2, 1))
+
+    def test_rebuild_command_repairs_counters(self):
+        notify_users([self.user.id], 'Hola')
+        UserStats.objects.update(enrolled_courses=9, completed_courses=9)
+        call_command('rebuild_user_stats', user=[self.user.id], stdout=StringIO())
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.enrolled_courses, stats.completed_courses, stats.unread_notifications), (2, 0, 1))
+
+
+
+class BulkEnrollmentTests(APITestCase):
+    def setUp(self):
+        self.course = create_course(lessons=2)
+        self.users = [
+            User.objects.create_user(username=f'u{index}@example.com', email=f'u{index}@example.com', password='x')
+            for index in range(4)
+        ]
+        User.objects.filter(id=self.users[3].id).update(is_active=False)
+        user_rows(Enrollment, self.users[0]).create(user=self.users[0], course=self.course)
+        lesson = Lesson.objects.filter(course=self.course).first()
+        user_rows(LessonProgress, self.users[1]).create(user=self.users[1], lesson=lesson, completed=True)
+        self.csv = (
+            'nombre,email\n'
+            'Uno,u0@example.com\n'
+            'Dos,U1@example.com\n'
+            'Tres,u2@example.com\n'
+            'Tres,u2@example.com\n'
+            'Cuatro,u3@example.com\n'
+            'Nadie,nadie@example.com\n'
+            'Mal,no-es-un-correo\n'
+            '\n'
+        )
+
+    def test_endpoint_enrolls_and_reports_failures(self):
+        admin = User.objects.create_user(username='admin@example.com', password='x', is_staff=True)
+        self.client.force_authenticate(admin)
+        url = f'/api/courses/{self.course.id}/enrollments/bulk/'
+        upload = SimpleUploadedFile('alumnos.csv', self.csv.encode())
+        response = self.client.post(url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {key: response.data[key] for key in ('rows', 'enrolled', 'already_enrolled', 'failed')},
+            {'rows': 7, 'enrolled': 2, 'already_enrolled': 1, 'failed': 4},
+        )
+        self.assertEqual(
+            sorted((error['line'], error['error']) for error in response.data['errors']),
+            [(5, 'Repetido en el fichero'), (6, 'Usuario inactivo'), (7, 'Usuario no encontrado'),
+             (8, 'Correo no válido')],
+        )
+        # Contadores iniciales como con una inscripción normal
+        enrollment = user_rows(Enrollment, self.users[1]).get(user=self.users[1], course=self.course)
+        self.assertEqual((enrollment.total_lessons, enrollment.completed_lessons), (2, 1))
+        self.assertEqual(sharded_count(Enrollment.objects.filter(course=self.course)), 3)
+
+    def test_emails_match_regardless_of_case(self):
+        user = User.objects.create_user(username='Eva@Example.com', email='Eva@Example.com', password='x')
+        report = bulk_enroll(self.course.id, ['email', 'eva@example.COM'])
+        self.assertEqual(report['enrolled'], 1)
+        self.assertTrue(user_rows(Enrollment, user).filter(user=user, course=self.course).exists())
+
+    def test_invalid_encoding_enrolls_nobody(self):
+        admin = User.objects.create_user(username='admin@example.com', password='x', is_staff=True)
+        self.client.force_authenticate(admin)
+        content = self.csv.encode() + 'ñu@example.com\n'.encode('latin-1')
+        upload = SimpleUploadedFile('alumnos.csv', content)
+        response = self.client.post(f'/api/courses/{self.course.id}/enrollments/bulk/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, 'alumnos.csv')
+        with open(source, 'wb') as handle:
+            handle.write(content)
+        with self.assertRaises(CommandError):
+            call_command('bulk_enroll', self.course.id, source, chunk_size=1, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(sharded_count(Enrollment.objects.filter(course=self.course)), 1)
+
+    def test_endpoint_is_staff_only(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post(f'/api/courses/{self.course.id}/enrollments/bulk/', {}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+    def test_command_writes_errors_and_updates_user_stats(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source, errors = os.path.join(directory, 'alumnos.csv'), os.path.join(directory, 'errores.csv')
+        with open(source, 'w', encoding='utf-8') as handle:
+            handle.write(self.csv)
+        self.client.force_authenticate(self.users[1])
+        self.client.get('/api/user/courses/count/')
+        out = StringIO()
+        call_command('bulk_enroll', self.course.id, source, errors=errors, chunk_size=2, stdout=out)
+        self.assertIn('2 inscritos', out.getvalue())
+        with open(errors, encoding='utf-8') as handle:
+            self.assertEqual(len(handle.read().splitlines()), 5)
+        # Un segundo pase no duplica nada
+        call_command('bulk_enroll', self.course.id, source, stdout=StringIO(), stderr=StringIO())
+        stats = self.client.get('/api/user/courses/count/').data
+        self.assertEqual((stats['enrolled'], stats['in_progress']), (1, 1))
+
+
+
+# Cada test usa su propia cache de cursos en disco
+class FileCacheMixin:
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        caches_setting = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'courses': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir},
+        }
+        override = override_settings(CACHES=caches_setting)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class CourseStructureCacheTests(FileCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(lessons=2)
+        self.url = f'/api/courses/{self.course.id}/structure/'
+
+    def test_second_request_hits_no_database(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(first.data, second.data)
+
+    def test_structure_is_ordered(self):
+        module = Module.objects.get(level__course=self.course)
+        Lesson.objects.create(module=module, title='Primera', duration='1:00', video_id='x', order=0)
+        lessons = self.client.get(self.url).data['levels'][0]['modules'][0]['lessons']
+        self.assertEqual([lesson['title'] for lesson in lessons], ['Primera', 'Lección 1', 'Lección 2'])
+
+    def test_edits_invalidate_cached_structure(self):
+        self.client.get(self.url)
+        lesson = Lesson.objects.filter(module__level__course=self.course).first()
+        lesson.title = 'Renombrada'
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.save()
+        titles = [l['title'] for l in self.client.get(self.url).data['levels'][0]['modules'][0]['lessons']]
+        self.assertIn('Renombrada', titles)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Level.objects.filter(course=self.course).get().delete()
+        self.assertEqual(self.client.get(self.url).data['levels'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_versions_expire_for_other_processes(self):
+        self.client.get(self.url)
+        # Como un cambio cuya versión se renovó en la cache de otro proceso
+        Lesson.objects.filter(course=self.course).update(title='Renombrada')
+        lessons = self.client.get(self.url).data['levels'][0]['modules'][0]['lessons']
+        self.assertNotIn('Renombrada', [lesson['title'] for lesson in lessons])
+        with mock.patch('time.time', return_value=time.time() + settings.COURSES_CACHE_VERSION_TIMEOUT + 1):
+            lessons = self.client.get(self.url).data['levels'][0]['modules'][0]['lessons']
+        self.assertIn('Renombrada', [lesson['title'] for lesson in lessons])
+
+
+class ConditionalGetTests(FileCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.course = create_course(lessons=1)
+
+    def assertNotModified(self, url, response):
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+        return len(ctx.captured_queries)
+
+    def test_structure_returns_304_without_queries(self):
+        url = f'/api/courses/{self.course.id}/structure/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.assertNotModified(url, response), 0)
+        # El ETag sale del contenido: otro proceso (cache vacía) da el mismo
+        get_cache().clear()
+        self.assertNotModified(url, response)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = 'Nuevo título'
+            self.course.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_catalog_etag_is_per_user(self):
+        anonymous = self.client.get('/api/courses/')
+        self.assertNotModified('/api/courses/', anonymous)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/courses/')
+        self.assertIn('Authorization', response['Vary'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotModified('/api/courses/', response)
+
+        with self.captureOnCommitCallbacks(using=user_db(self.user), execute=True):
+            self.client.post(f'/api/courses/{self.course.id}/enroll/')
+        changed = self.client.get('/api/courses/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertTrue(changed.data[0]['is_enrolled'])
+
+    def test_progress_changes_after_completion(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/courses/{self.course.id}/enroll/')
+        url = f'/api/courses/{self.course.id}/progress/'
+        response = self.client.get(url)
+        self.assertNotModified(url, response)
+
+        lesson = Lesson.objects.get(module__level__course=self.course)
+        with self.captureOnCommitCallbacks(using=user_db(self.user), execute=True):
+            self.client.put(f'/api/lesson-progress/{lesson.id}/', {'completed': True}, format='json')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertTrue(changed.data['completed'])
+
+
+class CourseCatalogPaginationTests(APITestCase):
+    def setUp(self):
+        ratings = [4.5, 4.5, 4.5, 3.0, 5.0, 4.0, 4.5]
+        self.courses = [create_course(f'Curso {i}', rating=rating) for i, rating in enumerate(ratings)]
+
+    def test_cursor_walks_catalog_in_rating_order(self):
+        expected = [c.id for c in sorted(self.courses, key=lambda c: (-c.rating, -c.id))]
+        seen = []
+        url = '/api/courses/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_without_page_size_returns_plain_list(self):
+        response = self.client.get('/api/courses/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), len(self.courses))
+
+    def test_sparse_fields_skip_heavy_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/courses/?page_size=2&fields=id,title')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('description', ctx.captured_queries[0]['sql'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/courses/?cursor=nope').status_code, 404)
+
+
+class CourseSearchTests(APITestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python = create_course('Python para Ciencia de Datos', rating=4.8)
+            self.python.category = 'Programación'
+            self.python.save()
+            self.vision = create_course('Visión por computadora', rating=4.2)
+            lesson = Lesson.objects.get(module__level__course=self.vision)
+            lesson.title = 'Redes convolucionales con Python'
+            lesson.save()
+            self.other = create_course('Marketing digital', rating=3.9)
+            self.other.tags = 'ventas'
+            self.other.save()
+
+    def test_ranked_prefix_search_with_facets(self):
+        response = self.client.get('/api/courses/search/?q=pyth')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['id'] for c in response.data['results']], [self.python.id, self.vision.id])
+        self.assertEqual(response.data['facets']['category'], {'Programación': 1, 'IA': 1})
+
+        filtered = self.client.get('/api/courses/search/?q=pyth&category=IA')
+        self.assertEqual([c['id'] for c in filtered.data['results']], [self.vision.id])
+        self.assertEqual(filtered.data['count'], 1)
+
+    def test_accents_are_ignored(self):
+        response = self.client.get('/api/courses/search/?q=vision')
+        self.assertEqual([c['id'] for c in response.data['results']], [self.vision.id])
+
+    def test_index_follows_edits_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.title = 'Marketing con Python'
+            self.other.save()
+            self.vision.delete()
+        ids = {c['id'] for c in self.client.get('/api/courses/search/?q=python').data['results']}
+        self.assertEqual(ids, {self.python.id, self.other.id})
+
+    def test_python_backend_matches_fts(self):
+        backend = PythonIndexBackend()
+        ids, total, facets = backend.search('pyth')
+        self.assertEqual(ids, [self.python.id, self.vision.id])
+        self.assertEqual(total, 2)
+        self.assertEqual(facets, {'Programación': 1, 'IA': 1})
+        self.assertEqual(backend.search('pyth', category='IA')[0], [self.vision.id])
+
+    def test_python_backend_rebuilds_when_the_catalog_version_changes(self):
+        backend = PythonIndexBackend()
+        self.assertEqual(backend.search('marketing')[0], [self.other.id])
+        # Cambio hecho por otro proceso: sin señales en este, sólo la versión
+        Course.objects.filter(pk=self.other.pk).update(title='Ventas online')
+        self.assertEqual(backend.search('marketing')[0], [self.other.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version(CATALOG_SCOPE)
+        self.assertEqual(backend.search('marketing')[0], [])
+        self.assertEqual(backend.search('online')[0], [self.other.id])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM courses_course_fts')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/courses/search/?q=marketing').data['count'], 1)
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/courses/search/').status_code, 400)
+
+
+class CourseTagTests(APITestCase):
+    def setUp(self):
+        self.a = create_course('A')  # tags 'ia,python'
+        self.b = create_course('B')
+        self.b.tags = 'IA, Datos'
+        self.b.save()
+
+    def counts(self):
+        return dict(Tag.objects.values_list('name', 'course_count'))
+
+    def test_tags_are_normalized_with_counts(self):
+        self.assertEqual(self.counts(), {'ia': 2, 'python': 1, 'datos': 1})
+        self.assertEqual(
+            self.client.get('/api/tags/').data,
+            [{'name': 'ia', 'course_count': 2}, {'name': 'datos', 'course_count': 1}, {'name': 'python', 'course_count': 1}],
+        )
+
+    def test_counts_follow_edits_and_deletes(self):
+        self.b.tags = 'datos'
+        self.b.save()
+        self.a.delete()
+        self.assertEqual(self.counts(), {'ia': 0, 'python': 0, 'datos': 1})
+        self.assertEqual(self.client.get('/api/tags/').data, [{'name': 'datos', 'course_count': 1}])
+
+    def test_filter_courses_with_all_tags(self):
+        ids = [c['id'] for c in self.client.get('/api/courses/?tags=ia').data]
+        self.assertEqual(sorted(ids), sorted([self.a.id, self.b.id]))
+        ids = [c['id'] for c in self.client.get('/api/courses/?tags=IA,datos').data]
+        self.assertEqual(ids, [self.b.id])
+        # El campo tags de la API sigue siendo el texto original
+        self.assertEqual(self.client.get('/api/courses/?tags=datos').data[0]['tags'], 'IA, Datos')
+
+    def test_negative_limit_is_rejected(self):
+        self.assertEqual(self.client.get('/api/tags/?limit=-1').status_code, 400)
+        self.assertEqual(self.client.get('/api/tags/?limit=1').data, [{'name': 'ia', 'course_count': 2}])
+
+    def test_links_inserted_elsewhere_are_not_counted_twice(self):
+        datos = Tag.objects.get(name='datos')
+        bulk_create = Tag.objects.bulk_create
+
+        def concurrent(*args, **kwargs):
+            # Otro guardado enlaza la etiqueta entre la lectura y la inserción
+            CourseTag.objects.create(course=self.a, tag=datos)
+            Tag.objects.filter(id=datos.id).update(course_count=F('course_count') + 1)
+            return bulk_create(*args, **kwargs)
+
+        self.a.tags = 'ia,python,datos'
+        with mock.patch.object(Tag.objects, 'bulk_create', side_effect=concurrent):
+            self.a.save()
+        self.assertEqual(self.counts(), {'ia': 2, 'python': 1, 'datos': 2})
+
+    def test_recount_command(self):
+        Tag.objects.update(course_count=7)
+        call_command('recount_tags', stdout=StringIO())
+        self.assertEqual(self.counts(), {'ia': 2, 'python': 1, 'datos': 1})
+
+
+class DenormalizedCourseTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.source = create_course('Origen', lessons=2)
+        self.target = create_course('Destino', lessons=1)
+        user_rows(Enrollment, self.user).create(user=self.user, course=self.source)
+        user_rows(Enrollment, self.user).create(user=self.user, course=self.target)
+        self.lesson = Lesson.objects.filter(course=self.source).first()
+        user_rows(LessonProgress, self.user).create(user=self.user, lesson=self.lesson, completed=True)
+
+    def test_course_is_filled_on_save(self):
+        self.assertEqual(self.lesson.course_id, self.source.id)
+        self.assertEqual(user_rows(LessonProgress, self.user).get().course_id, self.source.id)
+
+    def test_moving_a_module_moves_lessons_and_progress(self):
+        module = self.lesson.module
+        module.level = Level.objects.get(course=self.target)
+        module.save()
+        self.assertEqual(Lesson.objects.filter(course=self.target).count(), 3)
+        self.assertEqual(user_rows(LessonProgress, self.user).get().course_id, self.target.id)
+        counters = dict(user_rows(Enrollment, self.user).values_list('course_id', 'completed_lessons'))
+        self.assertEqual(counters, {self.source.id: 0, self.target.id: 1})
+
+    def test_per_course_progress_query_has_no_joins(self):
+        with CaptureAllQueries() as ctx:
+            list(user_rows(LessonProgress, self.user).filter(user=self.user, course=self.source, completed=True))
+        self.assertNotIn('JOIN', ctx.captured_queries[0]['sql'])
+
+
+class AsyncViewTests(FileCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.course = create_course(lessons=2)
+        user_rows(Enrollment, self.user).create(user=self.user, course=self.course)
+        self.lesson = Lesson.objects.filter(course=self.course).first()
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.factory = AsyncRequestFactory()
+
+    async def call(self, view, method, path, data=None, **kwargs):
+        if method == 'get':
+            request = self.factory.get(path, headers=self.auth)
+        else:
+            request = getattr(self.factory, method)(path, data=data, content_type='application/json', headers=self.auth)
+        return await view.as_view()(request, **kwargs)
+
+    async def test_heartbeat_is_monotonic(self):
+        for seconds in (10, 30, 20):
+            response = await self.call(
+                AsyncLessonProgressDetail, 'put', '/', {'watched_time': seconds}, lesson_id=self.lesson.id
+            )
+            self.assertEqual(response.status_code, 200)
+        progress = await user_rows(LessonProgress, self.user).aget(user=self.user, lesson=self.lesson)
+        self.assertEqual(progress.watched_time, 30)
+
+        response = await self.call(AsyncLessonProgressDetail, 'get', '/', lesson_id=self.lesson.id)
+        self.assertEqual(json.loads(response.content)['watched_time'], 30)
+
+    async def test_heartbeat_moves_updated_at_and_user_stats(self):
+        await self.call(AsyncLessonProgressDetail, 'put', '/', {'watched_time': 10}, lesson_id=self.lesson.id)
+        self.assertEqual((await sync_to_async(get_user_stats)(self.user.id))['watched_seconds'], 10)
+        rows = user_rows(LessonProgress, self.user)
+        old = timezone.now() - timedelta(days=1)
+        await rows.filter(lesson=self.lesson).aupdate(updated_at=old)
+        await self.call(AsyncLessonProgressDetail, 'put', '/', {'watched_time': 100}, lesson_id=self.lesson.id)
+        progress = await rows.aget(lesson=self.lesson)
+        self.assertEqual(progress.watched_time, 100)
+        self.assertGreater(progress.updated_at, old)
+        stats = await sync_to_async(get_user_stats)(self.user.id)
+        self.assertEqual(stats['watched_seconds'], 100)
+        # Retroceder no cambia nada
+        await self.call(AsyncLessonProgressDetail, 'put', '/', {'watched_time': 50}, lesson_id=self.lesson.id)
+        self.assertEqual((await sync_to_async(get_user_stats)(self.user.id))['watched_seconds'], 100)
+
+    async def test_completion_updates_course_progress(self):
+        await self.call(
+            AsyncLessonProgressDetail, 'put', '/', {'watched_time': 5, 'completed': True}, lesson_id=self.lesson.id
+        )
+        response = await self.call(AsyncCourseProgressView, 'get', '/', course_id=self.course.id)
+        self.assertEqual(json.loads(response.content), {'progress': 50, 'completed': False, 'enrolled': True})
+        self.assertIn('ETag', response)
+
+    async def test_requires_token(self):
+        self.auth = {}
+        response = await self.call(AsyncCourseProgressView, 'get', '/', course_id=self.course.id)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        self.auth = {'Authorization': 'Bearer nope'}
+        response = await self.call(AsyncCourseProgressView, 'get', '/', course_id=self.course.id)
+        self.assertEqual(response.status_code, 401)
+        # El mismo cuerpo que la vista síncrona
+        sync = await sync_to_async(self.client.get)(f'/api/courses/{self.course.id}/progress/', headers=self.auth)
+        self.assertEqual(json.loads(response.content), sync.json())
+        self.assertEqual(response['WWW-Authenticate'], sync['WWW-Authenticate'])
+
+    async def test_structure_matches_sync_view(self):
+        response = await self.call(AsyncCourseStructureView, 'get', '/', course_id=self.course.id)
+        expected = await sync_to_async(get_course_structure)(self.course.id)
+        self.assertEqual(json.loads(response.content), expected)
+        missing = await self.call(AsyncCourseStructureView, 'get', '/', course_id=999)
+        self.assertEqual(missing.status_code, 404)
+
+
+@override_settings(DATABASE_REPLICA={'ALIAS': 'default', 'STICKY_SECONDS': 10})
+class ReplicaRoutingTests(FileCacheMixin, APITestCase):
+    # El alias de réplica apunta a 'default' (existe en DATABASES); se comprueba
+    # si cada lectura se hizo en modo réplica
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.course = create_course(lessons=2)
+        self.lesson = Lesson.objects.filter(course=self.course).first()
+        user_rows(Enrollment, self.user).create(user=self.user, course=self.course)
+        self.reads = []
+        original = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            self.reads.append(routers._use_replica.get())
+            return original(router, model, **hints)
+        patcher = mock.patch.object(ReplicaRouter, 'db_for_read', autospec=True, side_effect=record)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def settle(self):
+        # Como si los últimos cambios de contenido ya hubieran llegado a la réplica
+        patcher = mock.patch.object(routers, '_fresh', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_router_decisions(self):
+        router = ReplicaRouter()
+        with mock.patch.object(routers, 'replica_alias', return_value='replica'):
+            self.assertIsNone(router.db_for_read(Course))
+            with replica_reads():
+                self.assertEqual(router.db_for_read(Course), 'replica')
+        self.assertEqual(router.db_for_write(Course), 'default')
+        with override_settings(DATABASE_REPLICA={'ALIAS': 'replica'}):
+            self.assertIs(router.allow_migrate('replica', 'courses'), False)
+            self.assertIsNone(router.allow_migrate('default', 'courses'))
+
+    def test_recent_changes_read_from_primary(self):
+        url = f'/api/courses/{self.course.id}/structure/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertTrue(self.reads)
+        self.assertFalse(any(self.reads))
+
+        self.reads.clear()
+        self.settle()
+        get_cache().clear()
+        self.client.get(url)
+        self.assertTrue(self.reads)
+        self.assertTrue(all(self.reads))
+
+    def test_writes_make_user_sticky(self):
+        self.client.force_authenticate(self.user)
+        self.settle()
+        # El catálogo pasa siempre por ReplicaRouter; con shards el progreso
+        # se lee con .using() del shard del usuario
+        url = '/api/courses/'
+        self.client.get(url)
+        self.assertTrue(all(self.reads))
+        self.assertFalse(recently_wrote(self.user.id))
+
+        response = self.client.put(f'/api/lesson-progress/{self.lesson.id}/', {'watched_time': 5}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(recently_wrote(self.user.id))
+
+        self.reads.clear()
+        self.client.get(url)
+        self.assertTrue(self.reads)
+        self.assertFalse(any(self.reads))
+
+    def test_flushed_buffer_marks_users(self):
+        other = User.objects.create_user(username='bea@example.com', email='bea@example.com', password='x')
+        flusher = ProgressFlusher(LocMemProgressBuffer(), interval=3600, max_entries=1000)
+        flusher.buffer.add(other.id, self.lesson.id, 30, False)
+        flusher.flush()
+        self.assertTrue(recently_wrote(other.id))
+        self.assertFalse(recently_wrote(self.user.id))
+
+
+# Réplica real: un segundo fichero SQLite con las tablas de courses y una
+# copia del catálogo. Se registra antes de preparar la clase para que entre en sus bases (y en su
+# transacción); sync_replica no puede copiar la base en mitad de esa transacción.
+@override_settings(DATABASE_REPLICA={'ALIAS': 'replica', 'STICKY_SECONDS': 10})
+class ReplicaDatabaseTests(FileCacheMixin, APITestCase):
+    catalog = (Course, Level, Module, Lesson, Tag, CourseTag)
+
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, directory)
+        replica = {**connections.settings[DEFAULT_DB_ALIAS], 'NAME': os.path.join(directory, 'replica.sqlite3')}
+        for databases in (settings.DATABASES, connections.settings):
+            patcher = mock.patch.dict(databases, {'replica': replica})
+            patcher.start()
+            cls.addClassCleanup(patcher.stop)
+        cls.addClassCleanup(connections.__delitem__, 'replica')
+        cls.addClassCleanup(lambda: connections['replica'].close())
+        with connections['replica'].schema_editor() as editor:
+            for model in apps.get_app_config('courses').get_models():
+                editor.create_model(model)
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.course = create_course('Primario', lessons=1)
+        for model in self.catalog:
+            model.objects.using('replica').bulk_create(model.objects.all())
+        Course.objects.using('replica').filter(pk=self.course.pk).update(title='Réplica')
+
+    def settle(self):
+        patcher = mock.patch.object(routers, '_fresh', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def title(self):
+        return self.client.get('/api/courses/').data[0]['title']
+
+    def test_reads_use_the_replica_file_until_the_user_writes(self):
+        # Recién cambiado el catálogo se lee del primario
+        self.assertEqual(self.title(), 'Primario')
+        self.settle()
+        self.assertEqual(self.title(), 'Réplica')
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.title(), 'Réplica')
+        # La inscripción se escribe con .using(shard) cuando hay shards
+        self.client.post(f'/api/courses/{self.course.id}/enroll/')
+        self.assertEqual(self.title(), 'Primario')
+        self.assertEqual(Course.objects.using('replica').get(pk=self.course.pk).title, 'Réplica')
+
+
+class ShardHelperTests(SimpleTestCase):
+    def test_shard_for_is_stable(self):
+        shards = ['default', 'progress_1', 'progress_2']
+        self.assertEqual([shard_for(7, shards) for _ in range(3)], [shard_for(7, shards)] * 3)
+        self.assertEqual({shard_for(user_id, shards) for user_id in range(100)}, set(shards))
+        self.assertIsNone(shard_for(7, ['default']))
+
+    def test_only_combinable_aggregates(self):
+        with self.assertRaises(TypeError):
+            sharded_aggregate(LessonProgress.objects.all(), avg=Avg('watched_time'))
+
+
+# Ejecutar con PROGRESS_SHARDS=2 (o más); el resto de la suite también debe pasar con shards:
+# PROGRESS_SHARDS=3 python manage.py test
+@skipUnless(len(settings.PROGRESS_SHARDS) > 1, 'Sin shards de progreso configurados')
+class ShardingTests(APITestCase):
+    def setUp(self):
+        self.course = create_course(lessons=2)
+        self.lessons = list(Lesson.objects.filter(course=self.course).order_by('order'))
+        # Un usuario en cada shard
+        self.users = {}
+        index = 0
+        while len(self.users) < len(settings.PROGRESS_SHARDS):
+            email = f'user{index}@example.com'
+            index += 1
+            user = User.objects.create_user(username=email, email=email, password='x')
+            self.users.setdefault(shard_for(user.id), user)
+
+    def shards_with(self, model, **filters):
+        return [alias for alias in settings.PROGRESS_SHARDS if model.objects.using(alias).filter(**filters).exists()]
+
+    def test_user_rows_live_on_their_shard(self):
+        for alias, user in self.users.items():
+            self.client.force_authenticate(user)
+            self.client.post(f'/api/courses/{self.course.id}/enroll/')
+            self.client.put(f'/api/lesson-progress/{self.lessons[0].id}/', {'completed': True}, format='json')
+            self.assertEqual(self.shards_with(Enrollment, user=user), [alias])
+            self.assertEqual(self.shards_with(LessonProgress, user=user), [alias])
+
+            response = self.client.get(f'/api/courses/{self.course.id}/progress/')
+            self.assertEqual(response.data, {'progress': 50, 'completed': False, 'enrolled': True})
+            flags = self.client.get('/api/courses/').data[0]
+            self.assertEqual((flags['is_enrolled'], flags['completed']), (True, False))
+
+    def test_aggregates_span_shards(self):
+        save = self.client.put
+        for user in self.users.values():
+            self.client.force_authenticate(user)
+            save(f'/api/lesson-progress/{self.lessons[0].id}/', {'watched_time': 10}, format='json')
+            save(f'/api/lesson-progress/{self.lessons[1].id}/', {'watched_time': 5, 'completed': True}, format='json')
+        users = len(self.users)
+        progress = LessonProgress.objects.filter(course=self.course)
+        self.assertEqual(sharded_count(progress), 2 * users)
+        self.assertEqual(
+            sharded_aggregate(progress, watched=Sum('watched_time'), learners=Count('user', distinct=True)),
+            {'watched': 15 * users, 'learners': users},
+        )
+        per_lesson = sharded_values(progress, ['lesson_id'], done=Count('id'), watched=Sum('watched_time'))
+        self.assertCountEqual(per_lesson, [
+            {'lesson_id': self.lessons[0].id, 'done': users, 'watched': 10 * users},
+            {'lesson_id': self.lessons[1].id, 'done': users, 'watched': 5 * users},
+        ])
+
+    def test_reshard_moves_misplaced_rows(self):
+        alias, user = next((alias, user) for alias, user in self.users.items() if alias != 'default')
+        # Filas escritas antes de activar el sharding: todas en default
+        Enrollment.objects.using('default').create(user=user, course=self.course)
+        LessonProgress.objects.using('default').create(
+            user=user, lesson=self.lessons[0], course=self.course, completed=True
+        )
+        call_command('reshard_progress', stdout=StringIO())
+        self.assertEqual(self.shards_with(Enrollment, user=user), [alias])
+        self.assertEqual(self.shards_with(LessonProgress, user=user), [alias])
+        counters = Enrollment.objects.using(alias).values_list('total_lessons', 'completed_lessons').get(user=user)
+        self.assertEqual(counters, (2, 1))
+
+    def test_reshard_merges_rows_present_in_both_shards(self):
+        alias, user = next((alias, user) for alias, user in self.users.items() if alias != 'default')
+        earlier = timezone.now() - timedelta(days=2)
+        later = timezone.now() - timedelta(days=1)
+        for db, watched_time, completed, updated_at in (('default', 50, True, earlier), (alias, 80, False, later)):
+            Enrollment.objects.using(db).create(user=user, course=self.course)
+            LessonProgress.objects.using(db).create(
+                user=user, lesson=self.lessons[0], course=self.course, watched_time=watched_time, completed=completed
+            )
+            LessonProgress.objects.using(db).filter(user=user).update(updated_at=updated_at)
+        call_command('reshard_progress', stdout=StringIO())
+        self.assertEqual(self.shards_with(LessonProgress, user=user), [alias])
+        progress = LessonProgress.objects.using(alias).get(user=user)
+        self.assertEqual((progress.watched_time, progress.completed, progress.updated_at), (80, True, later))
+        counters = Enrollment.objects.using(alias).values_list('total_lessons', 'completed_lessons').get(user=user)
+        self.assertEqual(counters, (2, 1))
+
+    def test_deletes_cascade_to_shards(self):
+        for user in self.users.values():
+            self.client.force_authenticate(user)
+            self.client.post(f'/api/courses/{self.course.id}/enroll/')
+            self.client.put(f'/api/lesson-progress/{self.lessons[0].id}/', {'watched_time': 3}, format='json')
+        alias, user = next((alias, user) for alias, user in self.users.items() if alias != 'default')
+        user.delete()
+        self.assertEqual(self.shards_with(LessonProgress, user_id=user.id), [])
+        self.assertEqual(self.shards_with(Enrollment, user_id=user.id), [])
+
+        self.course.delete()
+        self.assertEqual(self.shards_with(LessonProgress), [])
+        self.assertEqual(self.shards_with(Enrollment), [])
+
+    def test_version_bumps_wait_for_the_shard_transaction(self):
+        for alias, user in self.users.items():
+            version = get_version(user_scope(user.id))
+            with self.captureOnCommitCallbacks(using=alias, execute=True) as callbacks:
+                save_progress({(user.id, self.lessons[0].id): (10, True)})
+            self.assertTrue(callbacks)
+            self.assertNotEqual(get_version(user_scope(user.id)), version)
+
+    def test_direct_saves_count_watched_time_once(self):
+        for user in self.users.values():
+            self.client.force_authenticate(user)
+            # La fila de UserStats ya existe: los deltas se aplican sobre ella
+            self.assertEqual(self.client.get('/api/user/courses/count/').data['watched_seconds'], 0)
+            progress = LessonProgress(user=user, lesson=self.lessons[0], course=self.course, watched_time=10)
+            progress.save()
+            progress.watched_time = 20
+            progress.save()
+            self.assertEqual(self.client.get('/api/user/courses/count/').data['watched_seconds'], 20)
+
+    def test_reports_and_user_stats_span_shards(self):
+        for user in self.users.values():
+            self.client.force_authenticate(user)
+            self.client.post(f'/api/courses/{self.course.id}/enroll/')
+            self.client.put(f'/api/lesson-progress/{self.lessons[0].id}/', {'watched_time': 7}, format='json')
+            self.assertEqual(self.client.get('/api/user/courses/count/').data['watched_seconds'], 7)
+        rows = list(reports.report_rows('progress', [self.course.id], chunk_size=1))
+        self.assertEqual({row[1] for row in rows}, {user.email for user in self.users.values()})
+        # Borrar el curso purga los shards sin señales: UserStats se reconstruye
+        self.course.delete()
+        self.assertEqual(set(UserStats.objects.values_list('enrolled_courses', 'watched_seconds')), {(0, 0)})
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        # Registro propio: los contadores del proceso no se mezclan entre tests
+        patcher = mock.patch.object(metrics, '_registry', metrics.Registry(metrics.DEFAULTS['BUCKETS']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.course = create_course(lessons=2)
+
+    def sample(self, text, name, **labels):
+        expected = {key: f'"{value}"' for key, value in labels.items()}
+        for line in text.splitlines():
+            series, _, value = line.rpartition(' ')
+            if not series.startswith(name + '{'):
+                continue
+            pairs = series[len(name) + 1:-1].split(',')
+            if dict(pair.split('=', 1) for pair in pairs) == expected:
+                return float(value)
+        return None
+
+    def test_requests_are_recorded_per_url_name(self):
+        url = f'/api/courses/{self.course.id}/structure/'
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.get('/api/courses/999/structure/')
+        self.client.get('/no-existe/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        view = {'view': 'course-structure', 'method': 'GET'}
+        self.assertEqual(self.sample(text, 'http_requests_total', status=200, **view), 2)
+        self.assertEqual(self.sample(text, 'http_requests_total', status=404, **view), 1)
+        self.assertEqual(
+            self.sample(text, 'http_requests_total', view=metrics.UNRESOLVED, method='GET', status=404), 1
+        )
+        self.assertEqual(self.sample(text, 'http_request_duration_seconds_count', **view), 3)
+        self.assertEqual(self.sample(text, 'http_request_duration_seconds_bucket', le='+Inf', **view), 3)
+        # Sólo la primera petición y el curso inexistente llegan a la base
+        self.assertGreater(self.sample(text, 'http_request_sql_queries_total', **view), 0)
+        self.assertGreater(self.sample(text, 'http_response_size_bytes_total', **view), 0)
+
+    def test_database_locked_errors_are_counted(self):
+        url = f'/api/courses/{self.course.id}/structure/'
+        self.client.raise_request_exception = False
+        with mock.patch('courses.views.get_course_structure', side_effect=OperationalError('database is locked')):
+            self.assertEqual(self.client.get(url).status_code, 500)
+        with mock.patch('courses.views.get_course_structure', side_effect=KeyError('x')):
+            self.client.get(url)
+        text = self.client.get('/metrics').content.decode()
+        view = {'view': 'course-structure', 'method': 'GET'}
+        self.assertEqual(self.sample(text, 'http_request_errors_total', error='database_locked', **view), 1)
+        self.assertEqual(self.sample(text, 'http_request_errors_total', error='KeyError', **view), 1)
+        self.assertEqual(self.sample(text, 'http_requests_total', status=500, **view), 2)
+        self.assertEqual(metric_total(text, 'http_request_errors_total', error=metrics.DATABASE_LOCKED), 1)
+
+    def test_multiprocess_mode_sums_worker_dumps(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        url = f'/api/courses/{self.course.id}/structure/'
+        with override_settings(METRICS={'MULTIPROCESS_DIR': directory}):
+            self.client.get(url)
+            # Otro worker con su propio volcado
+            with mock.patch.object(metrics.os, 'getpid', return_value=0):
+                metrics.dump_process_metrics(directory)
+            text = self.client.get('/metrics').content.decode()
+        self.assertEqual(
+            self.sample(text, 'http_requests_total', view='course-structure', method='GET', status=200), 2
+        )
+
+
+class ProfilingTests(FileCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(REQUEST_PROFILING={'DIRECTORY': self.directory, 'INTERVAL': 0.001})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.course = create_course(lessons=2)
+        self.url = f'/api/courses/{self.course.id}/structure/'
+
+    def test_signed_header_profiles_request(self):
+        response = self.client.get(self.url, headers={'X-Profile': profiling.make_token('lenta')})
+        profile_id = response['X-Profile-Id']
+        [profile] = profiling.list_profiles(self.directory)
+        self.assertEqual((profile['id'], profile['label'], profile['view']), (profile_id, 'lenta', 'course-structure'))
+        self.assertTrue(profile['queries'])
+        self.assertTrue(all(query['duration_ms'] >= 0 for query in profile['queries']))
+        self.assertIn('courses/cache.py', profile['queries'][0]['origin'][0])
+        self.assertTrue(os.path.exists(os.path.join(self.directory, f'{profile_id}.collapsed')))
+
+    def test_unsigned_requests_are_not_profiled(self):
+        self.assertNotIn('X-Profile-Id', self.client.get(self.url, headers={'X-Profile': 'lenta'}))
+        self.assertNotIn('X-Profile-Id', self.client.get(self.url))
+        self.assertEqual(profiling.list_profiles(self.directory), [])
+
+    def test_sample_rate(self):
+        with override_settings(REQUEST_PROFILING={'DIRECTORY': self.directory, 'SAMPLE_RATE': 1.0}):
+            self.assertIn('X-Profile-Id', self.client.get(self.url))
+
+    def test_sampled_profiles_are_pruned(self):
+        old = os.path.join(self.directory, 'antiguo.json')
+        with open(old, 'w') as handle:
+            json.dump({'id': 'antiguo', 'created': 0}, handle)
+        os.utime(old, (0, 0))
+        options = {'DIRECTORY': self.directory, 'SAMPLE_RATE': 1.0, 'MAX_PROFILES': 2}
+        ids = []
+        with override_settings(REQUEST_PROFILING=options):
+            for index in range(1, 4):
+                ids.append(self.client.get(self.url)['X-Profile-Id'])
+                # Fechas distintas aunque el sistema de ficheros las redondee
+                os.utime(os.path.join(self.directory, f'{ids[-1]}.json'), (index, index))
+        self.assertEqual(sorted(profile['id'] for profile in profiling.list_profiles(self.directory)), sorted(ids[1:]))
+        # Ni temporales ni pilas huérfanas
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+    def test_unreadable_profiles_are_skipped(self):
+        self.client.get(self.url, headers={'X-Profile': profiling.make_token('lenta')})
+        for name, content in (('roto.json', '{"id": '), ('lista.json', '[]')):
+            with open(os.path.join(self.directory, name), 'w') as handle:
+                handle.write(content)
+        self.assertEqual([profile['label'] for profile in profiling.list_profiles(self.directory)], ['lenta'])
+
+    def test_command_flags_repeated_queries(self):
+        query = {
+            'sql': 'SELECT 1 FROM courses_enrollment WHERE course_id = %s', 'many': False,
+            'duration_ms': 0.5, 'origin': ['courses/serializers.py:60 get_completed'],
+        }
+        profile = {
+            'id': 'p1', 'label': 'manual', 'created': 0, 'method': 'GET', 'path': '/api/courses/',
+            'view': 'course-list', 'status': 200, 'duration_ms': 9.0, 'samples': 0, 'interval': 0.005,
+            'sql_ms': 3.0, 'queries': [query] * 6,
+        }
+        with open(os.path.join(self.directory, 'p1.json'), 'w') as handle:
+            json.dump(profile, handle)
+        out = StringIO()
+        call_command('profiles', stdout=out)
+        self.assertIn('p1', out.getvalue())
+        out = StringIO()
+        call_command('profiles', 'p1', stdout=out)
+        self.assertIn('6x', out.getvalue())
+        self.assertIn('get_completed  <- posible N+1', out.getvalue())
+
+
+class BenchmarkTests(FileCacheMixin, APITestCase):
+    def generate(self):
+        return benchmark.generate_catalog(
+            courses=3, levels=2, modules=2, lessons=2, users=4, progress=30, batch_size=7
+        )
+
+    def test_generate_catalog(self):
+        counts = self.generate()
+        self.assertEqual(
+            counts,
+            {'courses': 3, 'levels': 6, 'modules': 12, 'lessons': 24, 'users': 4,
+             'lesson_progress': 30, 'enrollments': counts['enrollments']},
+        )
+        self.assertEqual(Lesson.objects.exclude(course_id=F('module__level__course_id')).count(), 0)
+        self.assertEqual(sum(Tag.objects.values_list('course_count', flat=True)), 9)
+        self.assertTrue(User.objects.get(username='bench-user-0@example.com').check_password(benchmark.BENCH_PASSWORD))
+        # Los contadores generados coinciden con un recálculo
+        def counters():
+            return {
+                (qs.db, *row) for qs in sharded_querysets(Enrollment.objects.all())
+                for row in qs.values_list('id', 'total_lessons', 'completed_lessons')
+            }
+        generated = counters()
+        recount_enrollments()
+        self.assertEqual(counters(), generated)
+
+    def test_endpoints_within_query_budget(self):
+        self.generate()
+        report = benchmark.run_endpoints(iterations=2)
+        self.assertEqual(list(report['endpoints']), [endpoint['name'] for endpoint in benchmark.ENDPOINTS])
+        failed = {name: result for name, result in report['endpoints'].items() if not result['ok']}
+        self.assertEqual(failed, {})
+        self.assertEqual(report['dataset']['courses'], 3)
+
+    def test_command_writes_report(self):
+        self.generate()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = os.path.join(directory, 'bench.json')
+        call_command('bench_endpoints', iterations=1, only=['tag-list'], output=output, stdout=StringIO())
+        with open(output) as handle:
+            report = json.load(handle)
+        self.assertEqual(list(report['endpoints']), ['tag-list'])
+        self.assertEqual(report['endpoints']['tag-list']['status'], [200])
+
+
+class CatalogImportExportTests(FileCacheMixin, APITestCase):
+    def course_line(self, external_id='curso-ia', title='IA desde cero', lessons=3, tags='ia,python'):
+        return json.dumps({
+            'external_id': external_id, 'title': title, 'description': 'Desc', 'category': 'IA', 'tags': tags,
+            'duration': '4 semanas', 'rating': 4.5, 'cover_image_url': 'https://example.com/c.png',
+            'levels': [{'name': 'Nivel 1', 'order': 1, 'modules': [{'name': 'Módulo 1', 'order': 1, 'lessons': [
+                {'title': f'Lección {index}', 'duration': '10:00', 'video_id': 'abc', 'order': index}
+                for index in range(1, lessons + 1)
+            ]}]}],
+        }) + '\n'
+
+    def import_lines(self, *lines):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_courses', self.write(''.join(lines)), stdout=out)
+        return out.getvalue()
+
+    def write(self, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'catalogo.jsonl')
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_import_is_bulk_and_idempotent(self):
+        lines = [self.course_line(f'curso-{index}', f'Curso {index}') for index in range(5)]
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertIn('5 cursos (5 nuevos)', self.import_lines(*lines))
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "courses_lesson"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual((Course.objects.count(), Lesson.objects.count()), (5, 15))
+        self.assertEqual(Lesson.objects.exclude(course_id=F('module__level__course_id')).count(), 0)
+
+        self.assertIn('5 cursos (0 nuevos)', self.import_lines(*lines))
+        self.assertEqual((Course.objects.count(), Level.objects.count(), Lesson.objects.count()), (5, 5, 15))
+        self.assertEqual(Tag.objects.get(name='python').course_count, 5)
+        response = self.client.get('/api/courses/search/?q=curso')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_reimport_updates_tree_and_enrollment_counters(self):
+        self.import_lines(self.course_line(lessons=2))
+        course = Course.objects.get(external_id='curso-ia')
+        user = User.objects.create_user(username='ana@example.com', password='x')
+        user_rows(Enrollment, user).create(user=user, course=course)
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(f'/api/courses/{course.id}/structure/').data['levels'][0]['modules'][0]
+                         ['lessons'][-1]['title'], 'Lección 2')
+
+        self.import_lines(self.course_line(title='IA avanzada', lessons=3, tags='ia'))
+        course.refresh_from_db()
+        self.assertEqual(course.title, 'IA avanzada')
+        self.assertEqual(user_rows(Enrollment, user).get(user=user).total_lessons, 3)
+        self.assertEqual(list(course.tag_set.values_list('name', flat=True)), ['ia'])
+        self.assertEqual(Tag.objects.get(name='python').course_count, 0)
+        # La versión del curso cambió: la estructura cacheada se renueva
+        lessons = self.client.get(f'/api/courses/{course.id}/structure/').data['levels'][0]['modules'][0]['lessons']
+        self.assertEqual(len(lessons), 3)
+
+    def test_export_round_trips(self):
+        create_course(title='Original', lessons=2)
+        path = self.write('')
+        call_command('export_courses', path, stdout=StringIO())
+        with open(path, encoding='utf-8') as handle:
+            exported = [json.loads(line) for line in handle]
+        self.assertEqual(len(exported), 1)
+        self.assertEqual(len(exported[0]['levels'][0]['modules'][0]['lessons']), 2)
+        # Exportar no escribe: los ids "course-<pk>" sólo están en el fichero
+        self.assertEqual(exported[0]['external_id'], f'course-{Course.objects.get().pk}')
+        self.assertFalse(Lesson.objects.exclude(external_id=None).exists())
+
+        # Importarlo en la misma base actualiza esas filas en vez de duplicarlas
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_courses', path, stdout=StringIO())
+        self.assertEqual((Course.objects.count(), Lesson.objects.count()), (1, 2))
+        self.assertEqual(Course.objects.get().external_id, exported[0]['external_id'])
+
+        Course.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_courses', path, stdout=StringIO())
+        course = Course.objects.get()
+        self.assertEqual((course.title, course.lessons.count()), ('Original', 2))
+
+    def test_children_without_external_id_are_keyed_by_position(self):
+        course = json.loads(self.course_line(lessons=2))
+        for lesson in course['levels'][0]['modules'][0]['lessons']:
+            lesson['order'] = 1
+        self.import_lines(json.dumps(course) + '\n')
+        self.assertEqual(
+            sorted(Lesson.objects.values_list('external_id', flat=True)), ['curso-ia/1/1/1', 'curso-ia/1/1/2']
+        )
+
+    def test_lesson_inserted_in_the_middle_keeps_later_lessons_and_progress(self):
+        self.import_lines(self.course_line(lessons=2))
+        second = Lesson.objects.get(title='Lección 2')
+        user = User.objects.create_user(username='ana@example.com', password='x')
+        user_rows(LessonProgress, user).create(user=user, lesson=second, watched_time=60)
+
+        course = json.loads(self.course_line(lessons=2))
+        lessons = course['levels'][0]['modules'][0]['lessons']
+        lessons.insert(1, {'title': 'Lección nueva', 'video_id': 'xyz', 'order': 2})
+        lessons[2]['order'] = 3
+        self.import_lines(json.dumps(course) + '\n')
+
+        second.refresh_from_db()
+        self.assertEqual((second.title, second.order), ('Lección 2', 3))
+        self.assertEqual(Lesson.objects.get(title='Lección nueva').external_id, 'curso-ia/1/1/2.2')
+        self.assertEqual(Lesson.objects.count(), 3)
+        self.assertEqual(list(user_rows(LessonProgress, user).values_list('lesson_id', flat=True)), [second.pk])
+
+    def test_existing_nodes_cannot_move_to_another_course(self):
+        course = json.loads(self.course_line(lessons=1))
+        course['levels'][0]['modules'][0]['lessons'][0]['external_id'] = 'leccion-1'
+        self.import_lines(json.dumps(course) + '\n')
+        course['external_id'] = 'curso-ml'
+        with self.assertRaisesMessage(CommandError, 'leccion-1 pertenece a curso-ia/1/1'):
+            self.import_lines(self.course_line('curso-otro'), json.dumps(course) + '\n')
+        self.assertEqual(Lesson.objects.get(external_id='leccion-1').course.external_id, 'curso-ia')
+        self.assertEqual(list(Course.objects.values_list('external_id', flat=True)), ['curso-ia'])
+
+    def test_invalid_line_imports_nothing(self):
+        with self.assertRaisesMessage(CommandError, 'línea 2'):
+            call_command('import_courses', self.write(self.course_line() + '{"title": "x"}\n'), stdout=StringIO())
+        self.assertFalse(Course.objects.exists())
+
+
+
+class ReportExportTests(APITestCase):
+    def setUp(self):
+        self.course = create_course(title='Curso, con coma', lessons=2)
+        self.other = create_course(title='Otro', lessons=1)
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.client.force_authenticate(self.user)
+        for course in (self.course, self.other):
+            self.client.post(f'/api/courses/{course.id}/enroll/')
+            for lesson in Lesson.objects.filter(course=course):
+                self.client.put(f'/api/lesson-progress/{lesson.id}/', {'watched_time': 30}, format='json')
+
+    def staff(self):
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        self.user.refresh_from_db()
+
+    def test_streams_csv_filtered_by_course(self):
+        self.assertEqual(self.client.get('/api/reports/progress/').status_code, 403)
+        self.staff()
+        response = self.client.get(f'/api/reports/progress/?course={self.course.id}')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:6], ['user_id', 'email', 'course_id', 'course_title', 'lesson_id', 'lesson_title'])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({(row[1], row[3], row[6]) for row in rows[1:]}, {('ana@example.com', 'Curso, con coma', '30')})
+
+    def test_jsonl_and_date_filters(self):
+        self.staff()
+        response = self.client.get('/api/reports/enrollments/?output=jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual({row['course_title'] for row in rows}, {'Curso, con coma', 'Otro'})
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        response = self.client.get(f'/api/reports/enrollments/?output=jsonl&since={tomorrow}')
+        self.assertEqual(b''.join(response.streaming_content), b'')
+        self.assertEqual(self.client.get('/api/reports/progress/?since=ayer').status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/progress/?output=xml').status_code, 400)
+
+    def test_updated_at_only_moves_on_real_changes(self):
+        self.staff()
+        rows = user_rows(LessonProgress, self.user)
+        # Filas anteriores a la columna: sin fecha, fuera de los filtros por fecha
+        rows.update(updated_at=None)
+        progress = rows.filter(course=self.course).first()
+        progress.save()
+        self.assertIsNone(rows.get(pk=progress.pk).updated_at)
+        progress.watched_time = 45
+        progress.save()
+        self.assertIsNotNone(rows.get(pk=progress.pk).updated_at)
+
+        response = self.client.get('/api/reports/progress/?output=jsonl')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        dated = [json.loads(line)['updated_at'] is not None for line in lines]
+        self.assertEqual(sorted(dated), [False, False, True])
+        yesterday = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get(f'/api/reports/progress/?output=jsonl&since={yesterday}')
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 1)
+
+    def test_command_reads_in_chunks(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'progreso.jsonl')
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('export_progress', 'progress', path, fmt='jsonl', chunk_size=2, stdout=StringIO())
+        with open(path, encoding='utf-8') as handle:
+            rows = [json.loads(line) for line in handle]
+        self.assertEqual(sorted(row['lesson_title'] for row in rows), ['Lección 1', 'Lección 1', 'Lección 2'])
+        # Una búsqueda de usuarios por lote de 2 filas
+        users = [q for q in ctx.captured_queries if 'FROM "auth_user"' in q['sql']]
+        self.assertEqual(len(users), 2)
+
+
+class LoadViewersTests(LiveServerTestCase):
+    def test_viewers_log_in_and_send_heartbeats(self):
+        course = create_course(lessons=3)
+        out = StringIO()
+        call_command(
+            'load_viewers', url=self.live_server_url, users=2, duration=1.5, ramp=0, interval=0.5,
+            course=course.id, create_users=True, json=True, stdout=out,
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['login']['requests'], 2)
+        self.assertEqual(report['structure']['requests'], 2)
+        self.assertGreaterEqual(report['heartbeat']['requests'], 4)
+        self.assertEqual((report['database_locked'], report['database_locked_source']), (0, 'metrics'))
+        self.assertEqual(sharded_count(LessonProgress.objects.filter(course=course)), 2)
+
+    def test_only_local_servers(self):
+        with self.assertRaises(CommandError):
+            call_command('load_viewers', url='http://example.com', stdout=StringIO())
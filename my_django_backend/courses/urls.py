@@ -1,14 +1,30 @@
+from django.conf import settings
 from django.urls import path
 from .views import CourseListView, CourseStructureAPIView, EnrollCourseAPIView, CourseProgressAPIView, LessonProgressAPIView, LessonProgressCourseAPIView
 from .views import LessonProgressDetail, CourseListView  # importa tu vista
+from .views import LessonProgressBatchAPIView, CourseSearchAPIView, TagListAPIView, CourseAnnouncementAPIView
+from .views import BulkEnrollmentAPIView, ReportExportAPIView
+
+# Con COURSES_ASYNC_VIEWS las vistas de progreso y estructura usan la versión async
+if getattr(settings, 'COURSES_ASYNC_VIEWS', False):
+    from .async_views import AsyncCourseStructureView as CourseStructureAPIView
+    from .async_views import AsyncCourseProgressView as CourseProgressAPIView
+    from .async_views import AsyncLessonProgressCourseView as LessonProgressCourseAPIView
+    from .async_views import AsyncLessonProgressDetail as LessonProgressDetail
 
 urlpatterns = [
     path('courses/', CourseListView.as_view(), name='course-list'),
+    path('courses/search/', CourseSearchAPIView.as_view(), name='course-search'),
+    path('tags/', TagListAPIView.as_view(), name='tag-list'),
     path('courses/<int:course_id>/structure/', CourseStructureAPIView.as_view(), name='course-structure'),
     path('courses/<int:course_id>/enroll/', EnrollCourseAPIView.as_view(), name='enroll-course'),
+    path('courses/<int:course_id>/enrollments/bulk/', BulkEnrollmentAPIView.as_view(), name='course-bulk-enroll'),
     path('courses/<int:course_id>/progress/', CourseProgressAPIView.as_view(), name='course-progress'),
+    path('courses/<int:course_id>/announcements/', CourseAnnouncementAPIView.as_view(), name='course-announcement'),
+    path('reports/progress/', ReportExportAPIView.as_view(kind='progress'), name='report-progress'),
+    path('reports/enrollments/', ReportExportAPIView.as_view(kind='enrollments'), name='report-enrollments'),
     path('lesson-progress/<int:lesson_id>/', LessonProgressDetail.as_view()),
-    path('lesson-progress/', LessonProgressAPIView.as_view(), name='lesson-progress-list'),
+    path('lesson-progress/batch/', LessonProgressBatchAPIView.as_view(), name='lesson-progress-batch'),
     path('lesson-progress/', LessonProgressCourseAPIView.as_view(), name='lesson-progress-list'),
     path('courses/', CourseListView.as_view()),  # ejemplo
 
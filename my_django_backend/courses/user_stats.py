@@ -0,0 +1,136 @@
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from users.models import UserStats
+
+from .models import Enrollment, LessonProgress
+from .sharding import sharded_values
+
+# Resumen de cursos por usuario en UserStats: inscritos, en curso,
+# completados y segundos vistos. Se ajusta con deltas al escribir progreso o
+# inscripciones (ver courses.progress, courses.counters y courses.signals) y
+# se reconstruye desde Enrollment/LessonProgress con rebuild_user_stats() (o
+# `manage.py rebuild_user_stats`) cuando falta la fila o tras cargas masivas.
+
+COMPLETED_FIELD = 'completed_courses'
+IN_PROGRESS_FIELD = 'in_progress_courses'
+COURSE_FIELDS = ['enrolled_courses', IN_PROGRESS_FIELD, COMPLETED_FIELD, 'watched_seconds']
+
+
+def is_course_completed(total_lessons, completed_lessons):
+    return total_lessons > 0 and completed_lessons >= total_lessons
+
+
+# Campo de UserStats que cuenta una inscripción con esos contadores (None: sin empezar)
+def course_state_field(total_lessons, completed_lessons):
+    if is_course_completed(total_lessons, completed_lessons):
+        return COMPLETED_FIELD
+    if completed_lessons > 0:
+        return IN_PROGRESS_FIELD
+    return None
+
+
+# Delta de UserStats cuando una inscripción pasa de `before` a `after`
+# ((total_lessons, completed_lessons) o None si no existe)
+def enrollment_delta(before, after):
+    delta = Counter()
+    for counters, sign in ((before, -1), (after, 1)):
+        if counters is None:
+            continue
+        delta['enrolled_courses'] += sign
+        field = course_state_field(*counters)
+        if field:
+            delta[field] += sign
+    return delta
+
+
+# Aplica {user_id: Counter(campo -> delta)} con un UPDATE por campo. Los
+# usuarios sin fila se saltan: get_user_stats() la crea al leerla con los
+# datos ya actualizados (crearla aquí rompería el borrado en cascada de un usuario).
+def apply_stats(deltas):
+    by_field = defaultdict(dict)
+    for user_id, delta in deltas.items():
+        for field, value in delta.items():
+            if value:
+                by_field[field][user_id] = value
+    for field, values in by_field.items():
+        # Un WHEN por valor distinto: en bloque casi todos suman lo mismo
+        users_by_value = defaultdict(list)
+        for user_id, value in values.items():
+            users_by_value[value].append(user_id)
+        increment = Case(
+            *(When(user_id__in=user_ids, then=Value(value)) for value, user_ids in users_by_value.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        UserStats.objects.filter(user_id__in=values).update(**{field: Greatest(F(field) + increment, Value(0))})
+
+
+# Crea (reconstruyendo desde los datos) las filas que falten antes de
+# actualizar otros contadores de UserStats, como las notificaciones
+def ensure_user_stats(user_ids):
+    existing = set(UserStats.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    missing = [user_id for user_id in user_ids if user_id not in existing]
+    if missing:
+        rebuild_user_stats(missing)
+
+
+def rebuild_user_stats(user_ids=None, chunk_size=1000):
+    if user_ids is None:
+        user_ids = get_user_model().objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size)
+    rebuilt = 0
+    chunk = []
+    for user_id in user_ids:
+        chunk.append(user_id)
+        if len(chunk) >= chunk_size:
+            rebuilt += _rebuild_chunk(chunk)
+            chunk = []
+    if chunk:
+        rebuilt += _rebuild_chunk(chunk)
+    return rebuilt
+
+
+def _rebuild_chunk(user_ids):
+    completed = Q(total_lessons__gt=0, completed_lessons__gte=F('total_lessons'))
+    courses = {
+        row['user_id']: row
+        for row in sharded_values(
+            Enrollment.objects.filter(user_id__in=user_ids),
+            ['user_id'],
+            enrolled_courses=Count('id'),
+            completed_courses=Count('id', filter=completed),
+            in_progress_courses=Count('id', filter=Q(completed_lessons__gt=0) & ~completed),
+        )
+    }
+    watched = {
+        row['user_id']: row['watched_seconds']
+        for row in sharded_values(
+            LessonProgress.objects.filter(user_id__in=user_ids), ['user_id'], watched_seconds=Sum('watched_time')
+        )
+    }
+    rows = []
+    for user_id in user_ids:
+        row = courses.get(user_id, {})
+        rows.append(UserStats(
+            user_id=user_id,
+            enrolled_courses=row.get('enrolled_courses') or 0,
+            in_progress_courses=row.get('in_progress_courses') or 0,
+            completed_courses=row.get('completed_courses') or 0,
+            watched_seconds=watched.get(user_id) or 0,
+        ))
+    # unread_notifications no se toca
+    UserStats.objects.bulk_create(rows, update_conflicts=True, unique_fields=['user'], update_fields=COURSE_FIELDS)
+    return len(rows)
+
+
+# Lectura de /api/user/courses/count/: una consulta por clave primaria
+def get_user_stats(user_id):
+    fields = ['unread_notifications', *COURSE_FIELDS]
+    row = UserStats.objects.filter(user_id=user_id).values(*fields).first()
+    if row is None:
+        rebuild_user_stats([user_id])
+        row = UserStats.objects.filter(user_id=user_id).values(*fields).first()
+    return row
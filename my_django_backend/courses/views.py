@@ -1,9 +1,24 @@
+import io
+
+from django.http import StreamingHttpResponse
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from .models import Course, Enrollment, Lesson, LessonProgress
-from .serializers import CourseSerializer, LessonProgressSerializer
+from .serializers import CourseSerializer, LessonProgressSerializer, LessonProgressBatchItemSerializer
+from .cache import get_course_structure, get_lesson_course
+from .pagination import CourseCursorPagination
+from .search import get_search_backend
+from .tags import filter_by_tags, popular_tags
+from .conditional import catalog_scopes, conditional_get, progress_scopes, structure_scopes
+from .progress import save_progress
+from .progress_buffer import buffering_enabled, get_pending_progress, record_progress
+from .routers import note_write, read_replica
+from .sharding import shard_for
+from .bulk_enrollment import ENCODING, bulk_enroll, check_encoding
+from .reports import FORMATS, parse_report_date, render_rows, report_rows
+from users.notifications import notify_enrolled
 
 # Lista de cursos (puedes ajustar el queryset para mostrar todos o solo algunos)
 class CourseListAPIView(generics.ListAPIView):
@@ -11,63 +26,112 @@ class CourseListAPIView(generics.ListAPIView):
     serializer_class = CourseSerializer
     permission_classes = [AllowAny]
 
+    @read_replica(catalog_scopes)
+    @conditional_get(catalog_scopes, per_user=True)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
 # Lista todos los cursos (para catálogo completo)
+# Admite ?page_size=&cursor= (paginación keyset), ?fields= (campos parciales)
+# y ?tags=a,b (cursos con todas esas etiquetas)
 class CourseListView(generics.ListAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    pagination_class = CourseCursorPagination
+
+    @read_replica(catalog_scopes)
+    @conditional_get(catalog_scopes, per_user=True)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_requested_fields(self):
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        return [name.strip() for name in fields.split(',') if name.strip()]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        tags = self.request.query_params.get('tags')
+        if tags:
+            queryset = filter_by_tags(queryset, tags.split(','))
+        fields = self.get_requested_fields()
+        if fields:
+            # Las columnas pesadas (description...) no se leen si no se piden;
+            # id y rating hacen falta para el cursor.
+            model_fields = {f.name for f in Course._meta.concrete_fields}
+            queryset = queryset.only('id', 'rating', *(set(fields) & model_fields))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
+# Etiquetas más usadas con su número de cursos (barra lateral del catálogo)
+class TagListAPIView(APIView):
+    permission_classes = [AllowAny]
+
+    @read_replica()
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+        except ValueError:
+            return Response({'detail': 'limit debe ser un número.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit is not None and limit < 0:
+            return Response({'detail': 'limit no puede ser negativo.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(list(popular_tags(limit)))
+
+# Búsqueda de cursos con ranking, prefijos y facetas por categoría
+class CourseSearchAPIView(APIView):
+    permission_classes = [AllowAny]
+    max_limit = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'detail': 'El parámetro q es obligatorio.'}, status=status.HTTP_400_BAD_REQUEST)
+        category = request.query_params.get('category') or None
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), self.max_limit))
+            offset = max(0, int(request.query_params.get('offset', 0)))
+        except ValueError:
+            return Response({'detail': 'limit y offset deben ser números.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids, total, facets = get_search_backend().search(query, category=category, limit=limit, offset=offset)
+        courses = Course.objects.in_bulk(ids)
+        serializer = CourseSerializer(
+            [courses[course_id] for course_id in ids if course_id in courses],
+            many=True,
+            context={'request': request},
+        )
+        return Response({
+            'count': total,
+            'results': serializer.data,
+            'facets': {'category': facets},
+        })
+
 # Estructura completa de un curso (niveles, módulos, lecciones)
 class CourseStructureAPIView(APIView):
+    # Contenido público: sin autenticación no hay consulta a auth_user
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @read_replica(structure_scopes)
+    @conditional_get(structure_scopes)
     def get(self, request, course_id):
-        try:
-            course = Course.objects.prefetch_related(
-                'levels__modules__lessons'
-            ).get(id=course_id)
-        except Course.DoesNotExist:
+        data = get_course_structure(course_id)
+        if data is None:
             return Response({"detail": "Curso no encontrado."}, status=status.HTTP_404_NOT_FOUND)
-        
-        data = {
-            "id": course.id,
-            "title": course.title,
-            "description": course.description,
-            "cover_image_url": course.cover_image_url,
-            "levels": [
-                {
-                    "id": level.id,
-                    "name": level.name,
-                    "order": level.order,
-                    "modules": [
-                        {
-                            "id": module.id,
-                            "name": module.name,
-                            "order": module.order,
-                            "lessons": [
-                                {
-                                    "id": lesson.id,
-                                    "title": lesson.title,
-                                    "duration": lesson.duration,
-                                    "video_id": lesson.video_id,
-                                    "order": lesson.order,
-                                }
-                                for lesson in module.lessons.all().order_by('order')
-                            ]
-                        }
-                        for module in level.modules.all().order_by('order')
-                    ]
-                }
-                for level in course.levels.all().order_by('order')
-            ]
-        }
         return Response(data)
 
 # Inscripción a un curso
@@ -78,8 +142,11 @@ class EnrollCourseAPIView(APIView):
             course = Course.objects.get(id=course_id)
         except Course.DoesNotExist:
             return Response({'detail': 'Curso no encontrado'}, status=status.HTTP_404_NOT_FOUND)
-        enrollment, created = Enrollment.objects.get_or_create(user=request.user, course=course)
+        enrollment, created = Enrollment.objects.using(shard_for(request.user.id)).get_or_create(
+            user=request.user, course=course
+        )
         if created:
+            note_write()
             return Response({'detail': 'Inscripción exitosa'}, status=status.HTTP_201_CREATED)
         else:
             return Response({'detail': 'Ya estás inscrito en este curso'}, status=status.HTTP_200_OK)
@@ -87,21 +154,22 @@ class EnrollCourseAPIView(APIView):
 # Progreso de un curso para el usuario autenticado
 class CourseProgressAPIView(APIView):
     permission_classes = [IsAuthenticated]
+
+    @read_replica(progress_scopes)
+    @conditional_get(progress_scopes, per_user=True)
     def get(self, request, course_id):
-        try:
-            course = Course.objects.get(id=course_id)
-        except Course.DoesNotExist:
-            return Response({'detail': 'Curso no encontrado'}, status=status.HTTP_404_NOT_FOUND)
-        if not Enrollment.objects.filter(user=request.user, course=course).exists():
+        # Una sola lectura por (user, course): los contadores se mantienen al escribir
+        counters = Enrollment.objects.using(shard_for(request.user.id)).filter(
+            user=request.user, course_id=course_id
+        ).values_list('total_lessons', 'completed_lessons').first()
+        if counters is None:
+            if not Course.objects.filter(id=course_id).exists():
+                return Response({'detail': 'Curso no encontrado'}, status=status.HTTP_404_NOT_FOUND)
             return Response({'progress': 0, 'completed': False, 'enrolled': False})
-        lessons = Lesson.objects.filter(module__level__course=course)
-        total_lessons = lessons.count()
+        total_lessons, completed_lessons = counters
         if total_lessons == 0:
             return Response({'progress': 0, 'completed': False, 'enrolled': True})
-        completed_lessons = LessonProgress.objects.filter(
-            user=request.user, lesson__in=lessons, completed=True
-        ).count()
-        progress_percent = int((completed_lessons / total_lessons) * 100)
+        progress_percent = min(int((completed_lessons / total_lessons) * 100), 100)
         return Response({
             'progress': progress_percent,
             'completed': progress_percent == 100,
@@ -112,10 +180,15 @@ class CourseProgressAPIView(APIView):
 class LessonProgressCourseAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @read_replica()
     def get(self, request):
         course_id = request.GET.get('course_id')
-        lessons = Lesson.objects.filter(module__level__course__id=course_id)
-        progresses = LessonProgress.objects.filter(user=request.user, lesson__in=lessons)
+        # Rango sobre el índice (user, course, completed), sin joins
+        progresses = LessonProgress.objects.using(shard_for(request.user.id)).filter(
+            user=request.user, course_id=course_id
+        ).only(
+            'lesson_id', 'watched_time', 'completed'
+        )
         data = [
             {
                 "lesson": p.lesson_id,
@@ -132,14 +205,18 @@ class LessonProgressAPIView(APIView):
 
     def get(self, request, lesson_id):
         try:
-            progress = LessonProgress.objects.get(user=request.user, lesson_id=lesson_id)
+            progress = LessonProgress.objects.using(shard_for(request.user.id)).get(
+                user=request.user, lesson_id=lesson_id
+            )
         except LessonProgress.DoesNotExist:
             return Response({'watched_time': 0, 'completed': False})
         serializer = LessonProgressSerializer(progress)
         return Response(serializer.data)
 
     def put(self, request, lesson_id):
-        progress, _ = LessonProgress.objects.get_or_create(user=request.user, lesson_id=lesson_id)
+        progress, _ = LessonProgress.objects.using(shard_for(request.user.id)).get_or_create(
+            user=request.user, lesson_id=lesson_id
+        )
         progress.watched_time = request.data.get('watched_time', progress.watched_time)
         progress.completed = request.data.get('completed', progress.completed)
         progress.save()
@@ -150,20 +227,162 @@ class LessonProgressDetail(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, lesson_id):
+        pending = get_pending_progress(request.user.id, lesson_id) if buffering_enabled() else None
         try:
-            progress = LessonProgress.objects.get(user=request.user, lesson_id=lesson_id)
+            progress = LessonProgress.objects.using(shard_for(request.user.id)).get(
+                user=request.user, lesson_id=lesson_id
+            )
         except LessonProgress.DoesNotExist:
+            if pending:
+                return Response({'watched_time': pending[0], 'completed': pending[1]})
             return Response({'watched_time': 0, 'completed': False})
+        if pending:
+            # Combina lo guardado con lo que aún está en el buffer
+            progress.watched_time = max(progress.watched_time, pending[0])
+            progress.completed = progress.completed or pending[1]
         serializer = LessonProgressSerializer(progress)
         return Response(serializer.data)
 
     def put(self, request, lesson_id):
-        progress, _ = LessonProgress.objects.get_or_create(user=request.user, lesson_id=lesson_id)
-        watched_time = request.data.get('watched_time', 0)
-        completed = request.data.get('completed', False)
+        watched_time = int(request.data.get('watched_time', 0))
+        completed = bool(request.data.get('completed', False))
+        if buffering_enabled():
+            # Modo write-behind: el heartbeat se acumula y se escribe en bloque.
+            # La lección se comprueba antes: el flush descartaría el progreso
+            # de una lección inexistente después de haber respondido 202.
+            if get_lesson_course(lesson_id) is None:
+                return Response({'detail': 'Lección no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+            data = record_progress(request.user.id, lesson_id, watched_time, completed)
+            if data is None:
+                return Response({'detail': 'Lección no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'lesson': lesson_id, **data}, status=status.HTTP_202_ACCEPTED)
+
         # Guarda el mayor watched_time (no retrocede si el usuario rebobina)
-        progress.watched_time = max(progress.watched_time, int(watched_time))
-        progress.completed = completed or progress.completed
-        progress.save()
+        results = save_progress({(request.user.id, lesson_id): (watched_time, completed)})
+        progress = results.get((request.user.id, lesson_id))
+        if progress is None:
+            return Response({'detail': 'Lección no encontrada'}, status=status.HTTP_404_NOT_FOUND)
         serializer = LessonProgressSerializer(progress)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+# Recibe muchas actualizaciones de progreso en una sola petición
+# (clientes offline/móviles que encolan heartbeats)
+class LessonProgressBatchAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_items = 500
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'detail': 'Se esperaba una lista de actualizaciones.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response(
+                {'detail': f'Máximo {self.max_items} actualizaciones por petición.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        validated = []
+        updates = {}
+        for item in items:
+            serializer = LessonProgressBatchItemSerializer(data=item)
+            if not serializer.is_valid():
+                validated.append((item, serializer.errors))
+                continue
+            data = serializer.validated_data
+            key = (request.user.id, data['lesson'])
+            # Si la misma lección llega varias veces se combina antes de escribir
+            old_watched, old_completed = updates.get(key, (0, False))
+            updates[key] = (max(old_watched, data['watched_time']), old_completed or data['completed'])
+            validated.append((data, None))
+
+        saved = save_progress(updates)
+        results = []
+        for data, errors in validated:
+            lesson_id = data.get('lesson') if isinstance(data, dict) else None
+            if errors:
+                results.append({'lesson': lesson_id, 'status': 'error', 'errors': errors})
+                continue
+            progress = saved.get((request.user.id, lesson_id))
+            if progress is None:
+                results.append({'lesson': lesson_id, 'status': 'error', 'errors': {'lesson': ['Lección no encontrada']}})
+                continue
+            results.append({
+                'lesson': lesson_id,
+                'status': 'ok',
+                'watched_time': progress.watched_time,
+                'completed': progress.completed,
+            })
+        return Response(results)
+
+
+# Anuncio para todos los inscritos en un curso (sólo staff). Las
+# notificaciones se crean en lotes (users.notifications.notify_enrolled).
+class CourseAnnouncementAPIView(APIView):
+    permission_classes = [IsAdminUser]
+    max_length = 500
+
+    def post(self, request, course_id):
+        message = str(request.data.get('message') or '').strip()
+        if not message or len(message) > self.max_length:
+            return Response(
+                {'detail': f'message es obligatorio (máximo {self.max_length} caracteres).'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not Course.objects.filter(id=course_id).exists():
+            return Response({'detail': 'Curso no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        notified = notify_enrolled(course_id, message, request.data.get('link') or None)
+        return Response({'notified': notified}, status=status.HTTP_201_CREATED)
+
+
+# Inscripción masiva: CSV de correos subido como `file` (multipart). Django
+# guarda en disco los ficheros grandes y se leen línea a línea. Responde el
+# recuento y las primeras max_errors filas fallidas con su motivo.
+class BulkEnrollmentAPIView(APIView):
+    permission_classes = [IsAdminUser]
+    max_errors = 100
+
+    def post(self, request, course_id):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'Falta el fichero CSV (campo "file").'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Course.objects.filter(id=course_id).exists():
+            return Response({'detail': 'Curso no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        errors = []
+
+        def on_error(line, email, reason):
+            if len(errors) < self.max_errors:
+                errors.append({'line': line, 'email': email, 'error': reason})
+
+        try:
+            check_encoding(upload.file)
+        except UnicodeDecodeError:
+            return Response({'detail': 'El fichero debe estar en UTF-8.'}, status=status.HTTP_400_BAD_REQUEST)
+        lines = io.TextIOWrapper(upload.file, encoding=ENCODING, newline='')
+        report = bulk_enroll(course_id, lines, on_error=on_error)
+        return Response({**report, 'errors': errors})
+
+
+# Exportación de progreso o inscripciones (kind) para informes, en streaming.
+# ?output=csv|jsonl (por defecto csv; `format` lo reserva DRF), ?course= (se
+# puede repetir) y ?since= / ?until= (fecha o fecha y hora ISO).
+class ReportExportAPIView(APIView):
+    permission_classes = [IsAdminUser]
+    kind = None
+
+    def get(self, request):
+        fmt = request.query_params.get('output', 'csv')
+        if fmt not in FORMATS:
+            return Response({'detail': f"output admite: {', '.join(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            course_ids = [int(value) for value in request.query_params.getlist('course')]
+            since, until = (
+                parse_report_date(request.query_params[name]) if request.query_params.get(name) else None
+                for name in ('since', 'until')
+            )
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = report_rows(self.kind, course_ids, since, until)
+        response = StreamingHttpResponse(render_rows(self.kind, rows, fmt), content_type=FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{self.kind}.{fmt}"'
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'courses.metrics.MetricsMiddleware',  # mide la petición completa
+    'courses.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # <-- debe ir primero
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -52,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'courses.routers.StickyWriteMiddleware',
 ]
 ROOT_URLCONF = 'my_django_backend.urls'
 
@@ -72,6 +76,16 @@ TEMPLATES = [
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Cola de correo saliente (users/outbox.py): las vistas encolan y el worker
+# `python manage.py send_queued_mail` envía con EMAIL_BACKEND.
+EMAIL_OUTBOX = {
+    'BACKEND': 'users.outbox.DatabaseOutbox',
+    'BATCH_SIZE': 50,  # mensajes por conexión
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 30,  # segundos hasta el primer reintento, se duplica en cada fallo
+    'MAX_RETRY_DELAY': 3600,
+}
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",   # <-- AGREGADO
     "http://127.0.0.1:5173",
@@ -79,6 +93,12 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 WSGI_APPLICATION = 'my_django_backend.wsgi.application'
+ASGI_APPLICATION = 'my_django_backend.asgi.application'
+
+# Vistas async para progreso y estructura de cursos (courses/async_views.py).
+# Activar sólo al servir con ASGI (uvicorn/daphne); con WSGI cada vista async
+# se ejecuta en su propio event loop y no aporta nada.
+COURSES_ASYNC_VIEWS = os.environ.get('COURSES_ASYNC_VIEWS') == '1'
 
 
 # Database
@@ -88,10 +108,71 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Muchos heartbeats concurrentes: WAL permite leer mientras se escribe,
+        # IMMEDIATE toma el bloqueo de escritura al empezar la transacción (sin
+        # "database is locked" al promocionar el bloqueo) y timeout espera turno.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
+    }
+}
+
+# Réplica de lectura opcional (courses/routers.py). Con DATABASE_REPLICA_NAME
+# el catálogo, la estructura y los resúmenes de progreso se leen de ese
+# fichero SQLite; `python manage.py sync_replica` lo copia desde el primario.
+# Con Postgres basta con apuntar el alias a la réplica en streaming.
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DATABASE_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
     }
+
+# Sharding del progreso por usuario (courses/sharding.py). Con PROGRESS_SHARDS=N
+# LessonProgress y Enrollment se reparten entre 'default' y N-1 ficheros SQLite
+# más; tras cambiar N hay que ejecutar `python manage.py reshard_progress`.
+PROGRESS_SHARDS = ['default']
+for index in range(1, int(os.environ.get('PROGRESS_SHARDS', 1))):
+    DATABASES[f'progress_{index}'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'progress_{index}.sqlite3',
+    }
+    PROGRESS_SHARDS.append(f'progress_{index}')
+
+DATABASE_ROUTERS = ['courses.sharding.ShardRouter', 'courses.routers.ReplicaRouter']
+
+DATABASE_REPLICA = {
+    'ALIAS': 'replica',
+    'STICKY_SECONDS': 10,  # lecturas al primario tras una escritura del usuario
 }
 
 
+# Cache
+# La estructura de cada curso se guarda en COURSES_CACHE_ALIAS bajo una versión
+# de contenido que se renueva al guardar o borrar Course/Level/Module/Lesson.
+# Con LocMemCache cada proceso tiene su propia cache y sus propias versiones:
+# un cambio hecho en otro worker se ve al caducar la versión
+# (COURSES_CACHE_VERSION_TIMEOUT segundos). En producción con varios workers
+# usa un backend compartido (FileBasedCache, Redis, Memcached); con él la
+# caducidad puede subir o ser None.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'courses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'courses',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+COURSES_CACHE_ALIAS = 'courses'
+COURSES_CACHE_VERSION_TIMEOUT = 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -136,6 +217,49 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT sin consulta a auth_user por petición (ver users/authentication.py)
+        'users.authentication.StatelessJWTAuthentication',
     ),
-}
\ No newline at end of file
+}
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.TokenObtainPairSerializer',
+}
+
+# Cache en memoria del estado de los usuarios autenticados por JWT
+# (is_active y versión de tokens): una revocación tarda como mucho TTL
+# segundos en verse en los demás procesos.
+JWT_USER_CACHE = {
+    'TTL': 30,
+    'MAX_ENTRIES': 10000,
+}
+
+# Buffer write-behind para los heartbeats de progreso de lecciones.
+# Con ENABLED=True los PUT a /api/lesson-progress/<id>/ se acumulan en memoria
+# (sólo el último estado por usuario y lección) y se escriben en bloque.
+LESSON_PROGRESS_BUFFER = {
+    'ENABLED': False,
+    'BACKEND': 'courses.progress_buffer.LocMemProgressBuffer',
+    'FLUSH_INTERVAL': 5,  # segundos entre escrituras en bloque
+    'MAX_ENTRIES': 500,  # fuerza una escritura al llegar a este número de entradas
+}
+
+# Métricas por endpoint en /metrics (courses/metrics.py). Con varios procesos
+# (gunicorn) cada worker vuelca sus totales en METRICS_MULTIPROC_DIR y /metrics
+# los suma; vaciar el directorio al desplegar para poner los contadores a cero.
+METRICS = {
+    'ENABLED': True,
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROC_DIR'),
+    'FLUSH_INTERVAL': 5,
+}
+
+# Perfilado bajo demanda (courses/profiling.py): peticiones con la cabecera
+# X-Profile firmada (`python manage.py profiles --token`) o una fracción
+# SAMPLE_RATE de todas. Los resultados se consultan con `manage.py profiles`.
+REQUEST_PROFILING = {
+    'SAMPLE_RATE': float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    'DIRECTORY': BASE_DIR / 'profiles',
+    'INTERVAL': 0.005,
+    'MAX_AGE': 3600,
+    'MAX_PROFILES': 500,
+}
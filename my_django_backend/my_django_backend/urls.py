@@ -4,6 +4,7 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from courses.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,4 +13,5 @@ urlpatterns = [
     path('api/auth/', include('users.urls')),  # Si tienes endpoints de auth, déjalo, pero puedes separar las rutas de auth y user en distintos archivos si lo prefieres
     path('api/auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics_view, name='metrics'),  # Prometheus; no exponer fuera de la red interna
 ]
\ No newline at end of file
@@ -0,0 +1,160 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import UserTokenState
+
+# Autenticación JWT sin leer auth_user en cada petición. El token lleva el id
+# del usuario y la versión de sus tokens (claim `ver`, ver
+# users.serializers.TokenObtainPairSerializer); request.user es un User con
+# sólo id e is_active cargados. El resto de campos se leen de la base al
+# usarlos; las vistas que necesitan el modelo completo llaman a get_full_user().
+#
+# La revocación (cambio de contraseña, revoke_tokens) y la desactivación se
+# comprueban contra una cache en memoria del proceso con caducidad TTL: un
+# token revocado deja de valer en este proceso al instante y en los demás en
+# TTL segundos como mucho.
+
+DEFAULTS = {
+    'TTL': 30,  # segundos que se confía en el estado (is_active, versión) leído
+    'MAX_ENTRIES': 10000,
+}
+
+VERSION_CLAIM = 'ver'
+
+
+def token_state_settings():
+    return {**DEFAULTS, **getattr(settings, 'JWT_USER_CACHE', {})}
+
+
+class TokenStateCache:
+    def __init__(self):
+        self._entries = {}  # user_id -> (caduca, is_active, versión)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1:]
+
+    def set(self, user_id, is_active, version):
+        options = token_state_settings()
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= options['MAX_ENTRIES']:
+                self._entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+                if len(self._entries) >= options['MAX_ENTRIES']:
+                    self._entries.clear()
+            self._entries[user_id] = (now + options['TTL'], is_active, version)
+
+    def invalidate(self, user_id):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+token_states = TokenStateCache()
+
+
+def _state_query(user_id):
+    return get_user_model().objects.filter(pk=user_id).values_list('is_active', 'token_state__version')
+
+
+def _remember(user_id, row):
+    if row is None:
+        return None
+    is_active, version = row[0], row[1] or 0
+    token_states.set(user_id, is_active, version)
+    return is_active, version
+
+
+def get_token_state(user_id):
+    state = token_states.get(user_id)
+    if state is None:
+        state = _remember(user_id, _state_query(user_id).first())
+    return state
+
+
+async def aget_token_state(user_id):
+    state = token_states.get(user_id)
+    if state is None:
+        state = _remember(user_id, await _state_query(user_id).afirst())
+    return state
+
+
+# Invalida todos los tokens emitidos para el usuario
+def revoke_tokens(user_id):
+    _, created = UserTokenState.objects.get_or_create(user_id=user_id, defaults={'version': 1})
+    if not created:
+        UserTokenState.objects.filter(user_id=user_id).update(version=F('version') + 1)
+    transaction.on_commit(lambda: token_states.invalidate(user_id))
+
+
+def get_token_version(user):
+    return UserTokenState.objects.filter(user=user).values_list('version', flat=True).first() or 0
+
+
+def lightweight_user(user_id, is_active):
+    # Instancia con sólo id e is_active: el resto de campos quedan diferidos y
+    # save() sólo escribiría lo cargado
+    User = get_user_model()
+    return User.from_db(DEFAULT_DB_ALIAS, [User._meta.pk.attname, 'is_active'], [user_id, is_active])
+
+
+def get_full_user(user):
+    if not user.get_deferred_fields():
+        return user
+    return get_user_model().objects.get(pk=user.pk)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def _user_id(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+        return get_user_model()._meta.pk.to_python(user_id)
+
+    def _check(self, user_id, state, validated_token):
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        is_active, version = state
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        # Los tokens emitidos antes de existir la versión equivalen a la 0
+        if validated_token.get(VERSION_CLAIM, 0) != version:
+            raise AuthenticationFailed('El token ha sido revocado.', code="token_revoked")
+        return lightweight_user(user_id, is_active)
+
+    def get_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        return self._check(user_id, get_token_state(user_id), validated_token)
+
+
+# Variante para las vistas async: la validación del token es pura CPU y, si
+# el estado no está en la cache, se lee con el ORM async sin ocupar un hilo.
+class AsyncJWTAuthentication(StatelessJWTAuthentication):
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        return self._check(user_id, await aget_token_state(user_id), validated_token)
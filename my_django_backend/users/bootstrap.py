@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+
+from courses.models import Enrollment
+from courses.sharding import shard_for
+from courses.user_stats import COURSE_FIELDS, rebuild_user_stats
+
+from .notifications import notification_page
+
+# Datos que la aplicación necesita al arrancar con sesión, en una sola
+# respuesta. Cada sección cuesta como mucho una consulta: perfil y contadores
+# salen juntos de auth_user con un LEFT JOIN a UserStats.
+
+SECTIONS = ('profile', 'counters', 'notifications', 'courses')
+NOTIFICATIONS_LIMIT = 5
+
+STATS_FIELDS = ['unread_notifications', *COURSE_FIELDS]
+PROFILE_FIELDS = ['email', 'first_name', 'last_name', 'date_joined']
+
+
+# Secciones pedidas en ?include=a,b (todas si no se indica). None si alguna no existe.
+def parse_include(value):
+    if not value:
+        return set(SECTIONS)
+    include = {name.strip() for name in value.split(',') if name.strip()}
+    return include if include <= set(SECTIONS) else None
+
+
+def _user_row(user_id, include):
+    fields = []
+    if 'profile' in include:
+        fields += PROFILE_FIELDS
+    if 'counters' in include:
+        fields += [f'stats__{field}' for field in STATS_FIELDS]
+    return get_user_model().objects.filter(pk=user_id).values(*fields).first()
+
+
+def _counters(row):
+    return {
+        'enrolled': row['stats__enrolled_courses'],
+        'in_progress': row['stats__in_progress_courses'],
+        'completed': row['stats__completed_courses'],
+        'watched_seconds': row['stats__watched_seconds'],
+        'unread_notifications': row['stats__unread_notifications'],
+    }
+
+
+def build_bootstrap(user_id, include, notifications_limit=NOTIFICATIONS_LIMIT):
+    data = {}
+    if include & {'profile', 'counters'}:
+        row = _user_row(user_id, include)
+        if row is None:
+            return None
+        if 'counters' in include and row['stats__enrolled_courses'] is None:
+            # Aún sin fila de UserStats: se crea una vez y se vuelve a leer
+            rebuild_user_stats([user_id])
+            row = _user_row(user_id, include)
+        if 'profile' in include:
+            data['profile'] = {
+                'email': row['email'],
+                'full_name': f"{row['first_name']} {row['last_name']}".strip(),
+                'avatar_url': '',
+                'created_at': row['date_joined'],
+            }
+        if 'counters' in include:
+            data['counters'] = _counters(row)
+    if 'notifications' in include:
+        data['notifications'], _ = notification_page(user_id, notifications_limit)
+    if 'courses' in include:
+        data['enrolled_course_ids'] = list(
+            Enrollment.objects.using(shard_for(user_id)).filter(user_id=user_id)
+            .order_by('course_id').values_list('course_id', flat=True)
+        )
+    return data
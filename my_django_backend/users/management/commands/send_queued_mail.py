@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.outbox import get_outbox, outbox_settings, send_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Envía el correo encolado (users.outbox) en lotes por una sola conexión de EMAIL_BACKEND '
+        'y reintenta los fallos con espera exponencial. Sin --once se queda esperando mensajes nuevos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Envía lo pendiente y termina.')
+        parser.add_argument('--batch-size', type=int, help='Mensajes por conexión.')
+        parser.add_argument('--interval', type=float, help='Segundos de espera cuando no hay nada que enviar.')
+
+    def handle(self, *args, **options):
+        options_outbox = outbox_settings()
+        batch_size = options['batch_size'] or options_outbox['BATCH_SIZE']
+        interval = options['interval'] if options['interval'] is not None else options_outbox['POLL_INTERVAL']
+        outbox = get_outbox()
+        total_sent = total_failed = 0
+        try:
+            while True:
+                close_old_connections()
+                sent, failed = send_batch(outbox, batch_size)
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f'{sent} enviados, {failed} con error')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'{total_sent} correos enviados, {total_failed} fallos.'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_userstats_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='completed_courses',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='enrolled_courses',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='in_progress_courses',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='watched_seconds',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -1,3 +1,72 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+# Versión de los tokens JWT de un usuario (claim `ver`). Al subirla
+# (users.authentication.revoke_tokens) los tokens ya emitidos dejan de valer.
+class UserTokenState(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='token_state'
+    )
+    version = models.PositiveIntegerField(default=0)
+
+
+# Cola de correo saliente (users.outbox). Las filas se crean en la misma
+# transacción que el cambio que las origina y las envía `send_queued_mail`.
+class QueuedEmail(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pendiente'), (SENT, 'Enviado'), (FAILED, 'Fallido')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField()  # lista de destinatarios
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Próximo intento; también sirve de reserva mientras un worker lo envía
+    next_attempt_at = models.DateTimeField()
+    claim = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='queuedemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+
+# Contadores por usuario mantenidos al escribir (users.notifications y
+# courses.user_stats), para no contar filas en cada lectura
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    unread_notifications = models.PositiveIntegerField(default=0)
+    enrolled_courses = models.PositiveIntegerField(default=0)
+    in_progress_courses = models.PositiveIntegerField(default=0)
+    completed_courses = models.PositiveIntegerField(default=0)
+    watched_seconds = models.PositiveBigIntegerField(default=0)
+
+
+class Notification(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
+    message = models.CharField(max_length=500)
+    link = models.CharField(max_length=200, blank=True, null=True)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Pendientes de leer, de más reciente a más antigua
+            models.Index(fields=['user', 'is_read', 'created_at'], name='notification_unread_idx'),
+            # Feed completo paginado por cursor (created_at, id)
+            models.Index(fields=['user', 'created_at', 'id'], name='notification_feed_idx'),
+        ]
@@ -0,0 +1,109 @@
+import base64
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from courses.models import Enrollment
+from courses.sharding import sharded_querysets
+from courses.user_stats import ensure_user_stats
+
+from .models import Notification, UserStats
+
+# Notificaciones de usuario. El número de no leídas se mantiene en
+# UserStats.unread_notifications en la misma transacción que crea o marca
+# las notificaciones, así que leerlo es una consulta por clave primaria.
+
+FANOUT_CHUNK_SIZE = 1000
+
+
+def _chunks(iterator, size):
+    chunk = []
+    for item in iterator:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _add_unread(user_ids, delta):
+    ensure_user_stats(user_ids)
+    UserStats.objects.filter(user_id__in=user_ids).update(
+        unread_notifications=Greatest(F('unread_notifications') + delta, Value(0))
+    )
+
+
+# Una notificación para cada usuario indicado (INSERT en bloque)
+@transaction.atomic
+def notify_users(user_ids, message, link=None):
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return 0
+    now = timezone.now()
+    Notification.objects.bulk_create([
+        Notification(user_id=user_id, message=message, link=link, created_at=now) for user_id in user_ids
+    ])
+    _add_unread(user_ids, 1)
+    return len(user_ids)
+
+
+# Anuncio a todos los inscritos en un curso, en lotes de chunk_size usuarios:
+# cada lote es un INSERT de notificaciones y un UPDATE de contadores
+def notify_enrolled(course_id, message, link=None, chunk_size=FANOUT_CHUNK_SIZE):
+    total = 0
+    for enrollments in sharded_querysets(Enrollment.objects.filter(course_id=course_id)):
+        user_ids = enrollments.order_by().values_list('user_id', flat=True).iterator(chunk_size=chunk_size)
+        for chunk in _chunks(user_ids, chunk_size):
+            total += notify_users(chunk, message, link)
+    return total
+
+
+def unread_count(user_id):
+    return UserStats.objects.filter(user_id=user_id).values_list('unread_notifications', flat=True).first() or 0
+
+
+# Marca como leídas las notificaciones indicadas (o todas con ids=None)
+# y devuelve cuántas cambiaron
+@transaction.atomic
+def mark_read(user_id, ids=None):
+    notifications = Notification.objects.filter(user_id=user_id, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    updated = notifications.update(is_read=True)
+    if ids is None:
+        UserStats.objects.filter(user_id=user_id).update(unread_notifications=0)
+    elif updated:
+        _add_unread([user_id], -updated)
+    return updated
+
+
+def encode_cursor(notification):
+    value = f"{notification['created_at'].isoformat()}|{notification['id']}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(last_id)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+# Página del feed, de la más reciente a la más antigua, por rango sobre el
+# índice (user, created_at, id) o (user, is_read, created_at) con unread_only.
+# Devuelve (notificaciones, cursor de la siguiente página o None).
+def notification_page(user_id, limit, cursor=None, unread_only=False):
+    notifications = Notification.objects.filter(user_id=user_id).order_by('-created_at', '-id')
+    if unread_only:
+        notifications = notifications.filter(is_read=False)
+    if cursor is not None:
+        created_at, last_id = cursor
+        notifications = notifications.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id))
+    rows = list(notifications.values('id', 'message', 'link', 'is_read', 'created_at')[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,164 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+# Cola de correo saliente. Las vistas encolan con enqueue_mail() (misma firma
+# que send_mail) y vuelven sin esperar al servidor SMTP; el comando
+# `send_queued_mail` envía los mensajes en lotes por una sola conexión de
+# EMAIL_BACKEND y reintenta los fallidos con espera exponencial.
+
+DEFAULTS = {
+    'BACKEND': 'users.outbox.DatabaseOutbox',
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 30,  # segundos hasta el primer reintento; se duplica en cada fallo
+    'MAX_RETRY_DELAY': 3600,
+    'LEASE': 300,  # segundos que un worker se reserva un lote antes de que otro pueda tomarlo
+    'POLL_INTERVAL': 5,  # segundos de espera del worker cuando no hay nada que enviar
+}
+
+
+def outbox_settings():
+    return {**DEFAULTS, **getattr(settings, 'EMAIL_OUTBOX', {})}
+
+
+def get_outbox():
+    return import_string(outbox_settings()['BACKEND'])()
+
+
+def retry_delay(attempts):
+    options = outbox_settings()
+    return min(options['MAX_RETRY_DELAY'], options['RETRY_DELAY'] * 2 ** (attempts - 1))
+
+
+# Interfaz de una cola. Cada mensaje tiene subject, body, html_body,
+# from_email y to (lista); otra implementación podría usar un broker.
+class BaseOutbox:
+    def enqueue(self, messages):
+        raise NotImplementedError
+
+    # Reserva hasta `limit` mensajes listos para enviar
+    def claim(self, limit):
+        raise NotImplementedError
+
+    def mark_sent(self, messages):
+        raise NotImplementedError
+
+    # Programa un reintento o, agotados los intentos, da el mensaje por fallido
+    def mark_failed(self, failures):
+        raise NotImplementedError
+
+    # Devuelve los mensajes a la cola sin gastar un intento (el fallo no es suyo)
+    def reschedule(self, messages, error):
+        raise NotImplementedError
+
+
+# Cola en la tabla QueuedEmail: los mensajes se guardan en la transacción de
+# la petición, así que sólo se envían si ésta se confirma.
+class DatabaseOutbox(BaseOutbox):
+    def enqueue(self, messages):
+        now = timezone.now()
+        QueuedEmail.objects.bulk_create([
+            QueuedEmail(next_attempt_at=now, **message) for message in messages
+        ])
+
+    def claim(self, limit):
+        now = timezone.now()
+        token = uuid.uuid4().hex
+        with transaction.atomic():
+            due = (
+                QueuedEmail.objects.select_for_update(skip_locked=True)
+                .filter(status=QueuedEmail.PENDING, next_attempt_at__lte=now)
+                .order_by('next_attempt_at', 'id')
+            )
+            ids = list(due.values_list('id', flat=True)[:limit])
+            # La reserva caduca sola: si el worker muere, el lote vuelve a estar disponible
+            QueuedEmail.objects.filter(id__in=ids).update(
+                claim=token, next_attempt_at=now + timedelta(seconds=outbox_settings()['LEASE'])
+            )
+        return list(QueuedEmail.objects.filter(id__in=ids, claim=token).order_by('id'))
+
+    def mark_sent(self, messages):
+        QueuedEmail.objects.filter(id__in=[message.id for message in messages]).update(
+            status=QueuedEmail.SENT, sent_at=timezone.now(), claim=''
+        )
+
+    def mark_failed(self, failures):
+        now = timezone.now()
+        max_attempts = outbox_settings()['MAX_ATTEMPTS']
+        for message, error in failures:
+            message.attempts += 1
+            message.last_error = error
+            message.claim = ''
+            if message.attempts >= max_attempts:
+                message.status = QueuedEmail.FAILED
+            else:
+                message.next_attempt_at = now + timedelta(seconds=retry_delay(message.attempts))
+        QueuedEmail.objects.bulk_update(
+            [message for message, _ in failures], ['attempts', 'last_error', 'claim', 'status', 'next_attempt_at']
+        )
+
+    def reschedule(self, messages, error):
+        QueuedEmail.objects.filter(id__in=[message.id for message in messages]).update(
+            last_error=error, claim='', next_attempt_at=timezone.now() + timedelta(seconds=retry_delay(1))
+        )
+
+
+def enqueue_mail(subject, message, from_email, recipient_list, html_message=None):
+    get_outbox().enqueue([{
+        'subject': subject,
+        'body': message,
+        'html_body': html_message or '',
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+        'to': list(recipient_list),
+    }])
+
+
+# Envía un lote por una única conexión. Devuelve (enviados, fallidos).
+def send_batch(outbox=None, limit=None):
+    outbox = outbox or get_outbox()
+    messages = outbox.claim(limit or outbox_settings()['BATCH_SIZE'])
+    if not messages:
+        return 0, 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        # Con el servidor caído no se ha intentado ningún mensaje: no gastan
+        # intentos, o una caída larga los daría todos por fallidos
+        logger.warning('No se pudo conectar con el servidor de correo: %s', exc)
+        outbox.reschedule(messages, f'{type(exc).__name__}: {exc}')
+        return 0, len(messages)
+
+    sent, failures = [], []
+    try:
+        for message in messages:
+            email = EmailMultiAlternatives(
+                message.subject, message.body, message.from_email, message.to, connection=connection
+            )
+            if message.html_body:
+                email.attach_alternative(message.html_body, 'text/html')
+            try:
+                email.send()
+            except Exception as exc:
+                logger.warning('Fallo al enviar el correo %s: %s', message.id, exc)
+                failures.append((message, f'{type(exc).__name__}: {exc}'))
+            else:
+                sent.append(message)
+    finally:
+        connection.close()
+    if sent:
+        outbox.mark_sent(sent)
+    if failures:
+        outbox.mark_failed(failures)
+    return len(sent), len(failures)
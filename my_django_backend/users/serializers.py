@@ -1,5 +1,8 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+
+from .authentication import VERSION_CLAIM, get_token_version
 
 class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,4 +17,14 @@ class RegisterSerializer(serializers.ModelSerializer):
             first_name=validated_data.get('first_name', ''),
             last_name=validated_data.get('last_name', ''),
         )
-        return user
\ No newline at end of file
+        return user
+
+
+# Login (/api/auth/login/): añade la versión de tokens del usuario, que
+# StatelessJWTAuthentication compara sin leer auth_user
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[VERSION_CLAIM] = get_token_version(user)
+        return token
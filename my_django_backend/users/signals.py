@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import revoke_tokens, token_states
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        # Un id reutilizado (p.ej. tras borrar el último usuario) no hereda el estado anterior
+        token_states.invalidate(instance.pk)
+        return
+    # set_password() deja la contraseña en claro en _password hasta después de post_save
+    if getattr(instance, '_password', None) is not None:
+        revoke_tokens(instance.pk)
+    else:
+        # is_active puede haber cambiado: este proceso lo ve al momento
+        transaction.on_commit(lambda: token_states.invalidate(instance.pk))
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: token_states.invalidate(instance.pk))
@@ -1,3 +1,278 @@
-from django.test import TestCase
+import smtplib
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from courses.models import Course, Enrollment
+from courses.testing import APITestCase, CaptureAllQueries, TestCase, user_rows
+
+from . import outbox
+from .authentication import AsyncJWTAuthentication, revoke_tokens, token_states
+from .models import Notification, QueuedEmail, UserStats
+from .notifications import notify_enrolled, notify_users
+
+
+class StatelessJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        token_states.clear()
+        self.addCleanup(token_states.clear)
+        self.user = User.objects.create_user(
+            username='ana@example.com', email='ana@example.com', password='secreta', first_name='Ana'
+        )
+
+    def login(self, password='secreta'):
+        response = self.client.post('/api/auth/login/', {'username': 'ana@example.com', 'password': password})
+        self.assertEqual(response.status_code, 200)
+        return response.data['access']
+
+    def get(self, url, token):
+        return self.client.get(url, headers={'Authorization': f'Bearer {token}'})
+
+    def test_login_adds_token_version(self):
+        token = self.login()
+        self.assertEqual(AccessToken(token)['ver'], 0)
+        revoke_tokens(self.user.id)
+        self.assertEqual(AccessToken(self.login())['ver'], 1)
+
+    def test_no_user_query_while_state_is_cached(self):
+        token = self.login()
+        self.assertEqual(self.get('/api/courses/1/progress/', token).status_code, 404)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.get('/api/courses/1/progress/', token).status_code, 404)
+        self.assertFalse([query for query in ctx.captured_queries if 'auth_user' in query['sql']])
+
+    def test_profile_loads_full_user(self):
+        response = self.get('/api/user/profile/', self.login())
+        self.assertEqual(response.data['email'], 'ana@example.com')
+        self.assertEqual(response.data['full_name'], 'Ana')
+
+    def test_password_change_revokes_tokens(self):
+        token = self.login()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('nueva')
+            self.user.save()
+        self.assertEqual(self.get('/api/user/profile/', token).status_code, 401)
+        self.assertEqual(self.get('/api/user/profile/', self.login('nueva')).status_code, 200)
+
+    def test_deactivation_is_seen_after_save(self):
+        token = self.login()
+        self.assertEqual(self.get('/api/user/profile/', token).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get('/api/user/profile/', token).status_code, 401)
+
+    def test_cached_state_expires_after_ttl(self):
+        token = self.login()
+        with mock.patch('users.authentication.time.monotonic', return_value=1000.0):
+            self.assertEqual(self.get('/api/user/profile/', token).status_code, 200)
+            # Sin señales (update) el cambio sólo se ve al caducar la entrada
+            User.objects.filter(id=self.user.id).update(is_active=False)
+            self.assertEqual(self.get('/api/user/profile/', token).status_code, 200)
+        with mock.patch('users.authentication.time.monotonic', return_value=1031.0):
+            self.assertEqual(self.get('/api/user/profile/', token).status_code, 401)
+
+    def test_async_authentication(self):
+        token = self.login()
+        request = RequestFactory().get('/', headers={'Authorization': f'Bearer {token}'})
+        user, _ = async_to_sync(AsyncJWTAuthentication().aauthenticate)(request)
+        self.assertEqual((user.id, user.is_active), (self.user.id, True))
+        loaded = {field.attname for field in User._meta.concrete_fields} - user.get_deferred_fields()
+        self.assertEqual(loaded, {'id', 'is_active'})
+
+
+class OutboxTests(TestCase):
+    def enqueue(self, count=1):
+        for index in range(count):
+            outbox.enqueue_mail('Hola', f'Mensaje {index}', 'no-reply@educaia.com', [f'u{index}@example.com'])
+
+    def test_registration_enqueues_instead_of_sending(self):
+        response = self.client.post('/api/user/register/', {'email': 'ana@example.com', 'password': 'x'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        queued = QueuedEmail.objects.get()
+        self.assertEqual((queued.to, queued.status), (['ana@example.com'], QueuedEmail.PENDING))
+
+        call_command('send_queued_mail', once=True, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('/activate/', mail.outbox[0].body)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, QueuedEmail.SENT)
+        self.assertIsNotNone(queued.sent_at)
+
+    def test_batch_reuses_one_connection(self):
+        self.enqueue(3)
+        with mock.patch.object(outbox, 'get_connection', wraps=outbox.get_connection) as get_connection:
+            self.assertEqual(outbox.send_batch(limit=10), (3, 0))
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+    def test_failures_retry_with_backoff(self):
+        self.enqueue(2)
+        failing = QueuedEmail.objects.order_by('id').first()
+        original_send = mail.EmailMultiAlternatives.send
+
+        def send(email, *args, **kwargs):
+            if email.to == failing.to:
+                raise smtplib.SMTPRecipientsRefused({})
+            return original_send(email, *args, **kwargs)
+
+        with mock.patch.object(mail.EmailMultiAlternatives, 'send', send), self.assertLogs('users.outbox'):
+            self.assertEqual(outbox.send_batch(), (1, 1))
+            failing.refresh_from_db()
+            self.assertEqual((failing.status, failing.attempts), (QueuedEmail.PENDING, 1))
+            self.assertIn('SMTPRecipientsRefused', failing.last_error)
+            delay = failing.next_attempt_at - timezone.now()
+            self.assertTrue(timedelta(seconds=25) < delay <= timedelta(seconds=30))
+            # Todavía no toca reintentar
+            self.assertEqual(outbox.send_batch(), (0, 0))
+
+            with override_settings(EMAIL_OUTBOX={'MAX_ATTEMPTS': 2}):
+                QueuedEmail.objects.filter(id=failing.id).update(next_attempt_at=timezone.now())
+                self.assertEqual(outbox.send_batch(), (0, 1))
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (QueuedEmail.FAILED, 2))
+
+    def test_retry_delay_doubles_up_to_maximum(self):
+        with override_settings(EMAIL_OUTBOX={'RETRY_DELAY': 10, 'MAX_RETRY_DELAY': 60}):
+            self.assertEqual([outbox.retry_delay(attempt) for attempt in range(1, 6)], [10, 20, 40, 60, 60])
+
+    def test_connection_error_retries_whole_batch(self):
+        self.enqueue(2)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('sin red')), \
+                self.assertLogs('users.outbox'), override_settings(EMAIL_OUTBOX={'MAX_ATTEMPTS': 1}):
+            self.assertEqual(outbox.send_batch(), (0, 2))
+        # Sin conexión no se gasta ningún intento
+        self.assertEqual(set(QueuedEmail.objects.values_list('attempts', 'status')), {(0, QueuedEmail.PENDING)})
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(outbox.send_batch(), (0, 0))
+        QueuedEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.send_batch(), (2, 0))
+
+
+class NotificationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana@example.com', email='ana@example.com', password='x')
+        self.client.force_authenticate(self.user)
+
+    def create_course(self):
+        return Course.objects.create(
+            title='Curso', description='-', category='IA', tags='ia', duration='1 semana', rating=4.0,
+            cover_image_url='https://example.com/c.png',
+        )
+
+    def test_feed_is_cursor_paged_and_honors_limit(self):
+        for index in range(7):
+            notify_users([self.user.id], f'Aviso {index}')
+        response = self.client.get('/api/user/notifications/?limit=5')
+        self.assertEqual([n['message'] for n in response.data], [f'Aviso {i}' for i in range(6, 1, -1)])
+        self.assertEqual(response['X-Unread-Count'], '7')
+        response = self.client.get(f"/api/user/notifications/?limit=5&cursor={response['X-Next-Cursor']}")
+        self.assertEqual([n['message'] for n in response.data], ['Aviso 1', 'Aviso 0'])
+        self.assertNotIn('X-Next-Cursor', response)
+        self.assertEqual(self.client.get('/api/user/notifications/?cursor=x').status_code, 400)
+
+    def test_mark_read_keeps_counter(self):
+        notify_users([self.user.id], 'Uno')
+        notify_users([self.user.id], 'Dos')
+        first = Notification.objects.order_by('id').first()
+        response = self.client.post('/api/user/notifications/mark-read/', {'ids': [first.id, first.id]}, format='json')
+        self.assertEqual(response.data, {'updated': 1, 'unread': 1})
+        # Repetir no descuenta dos veces
+        response = self.client.post('/api/user/notifications/mark-read/', {'ids': [first.id]}, format='json')
+        self.assertEqual(response.data, {'updated': 0, 'unread': 1})
+        unread = self.client.get('/api/user/notifications/?unread=1').data
+        self.assertEqual([n['message'] for n in unread], ['Dos'])
+        response = self.client.post('/api/user/notifications/mark-read/', {'all': True}, format='json')
+        self.assertEqual(response.data, {'updated': 1, 'unread': 0})
+        self.assertEqual(self.client.get('/api/user/notifications/unread-count/').data, {'unread': 0})
+        bad = self.client.post('/api/user/notifications/mark-read/', {'ids': 'x'}, format='json')
+        self.assertEqual(bad.status_code, 400)
+
+    def test_other_users_notifications_are_not_marked(self):
+        other = User.objects.create_user(username='otro@example.com', password='x')
+        notify_users([other.id], 'Privado')
+        notification = Notification.objects.get()
+        response = self.client.post('/api/user/notifications/mark-read/', {'ids': [notification.id]}, format='json')
+        self.assertEqual(response.data['updated'], 0)
+        self.assertEqual(UserStats.objects.get(user=other).unread_notifications, 1)
+
+    def test_fan_out_to_enrolled_users_in_chunks(self):
+        course = self.create_course()
+        students = [User.objects.create_user(username=f's{i}@example.com', password='x') for i in range(5)]
+        for student in students:
+            user_rows(Enrollment, student).create(user=student, course=course)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(notify_enrolled(course.id, 'Nuevo módulo', chunk_size=2), 5)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "users_notification"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(
+            set(UserStats.objects.values_list('user_id', 'unread_notifications')),
+            {(student.id, 1) for student in students},
+        )
+
+    def test_announcement_endpoint_is_staff_only(self):
+        course = self.create_course()
+        user_rows(Enrollment, self.user).create(user=self.user, course=course)
+        url = f'/api/courses/{course.id}/announcements/'
+        self.assertEqual(self.client.post(url, {'message': 'Hola'}, format='json').status_code, 403)
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        self.user.refresh_from_db()
+        response = self.client.post(url, {'message': 'Hola', 'link': '/courses/1'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'notified': 1})
+        self.assertEqual(self.client.get('/api/user/notifications/').data[0]['link'], '/courses/1')
+
+
+class BootstrapTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='ana@example.com', email='ana@example.com', password='x', first_name='Ana', last_name='López'
+        )
+        self.client.force_authenticate(self.user)
+        self.course = Course.objects.create(
+            title='Curso', description='-', category='IA', tags='ia', duration='1 semana', rating=4.0,
+            cover_image_url='https://example.com/c.png',
+        )
+        user_rows(Enrollment, self.user).create(user=self.user, course=self.course)
+        for index in range(3):
+            notify_users([self.user.id], f'Aviso {index}')
+
+    def get(self, url='/api/user/bootstrap/'):
+        with CaptureAllQueries() as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(ctx.captured_queries)
+
+    def test_everything_in_three_queries(self):
+        data, queries = self.get('/api/user/bootstrap/?limit=2')
+        self.assertEqual(queries, 3)
+        self.assertEqual(data['profile']['full_name'], 'Ana López')
+        self.assertEqual(data['counters']['enrolled'], 1)
+        self.assertEqual(data['counters']['unread_notifications'], 3)
+        self.assertEqual([n['message'] for n in data['notifications']], ['Aviso 2', 'Aviso 1'])
+        self.assertEqual(data['enrolled_course_ids'], [self.course.id])
+
+    def test_include_selects_sections(self):
+        data, queries = self.get('/api/user/bootstrap/?include=profile,counters')
+        self.assertEqual((set(data), queries), ({'profile', 'counters'}, 1))
+        data, queries = self.get('/api/user/bootstrap/?include=courses')
+        self.assertEqual((set(data), queries), ({'enrolled_course_ids'}, 1))
+        self.assertEqual(self.client.get('/api/user/bootstrap/?include=profile,x').status_code, 400)
+
+    def test_missing_stats_row_is_created_once(self):
+        UserStats.objects.all().delete()
+        data, _ = self.get('/api/user/bootstrap/?include=counters')
+        self.assertEqual(data['counters']['enrolled'], 1)
+        self.assertEqual(self.get('/api/user/bootstrap/?include=counters')[1], 1)
@@ -1,13 +1,17 @@
 from django.urls import path
 from .views import RegisterView, ActivateView, UserCoursesCountView, UserNotificationsView
-from .views import ProfileView
+from .views import MarkNotificationsReadView, UnreadNotificationsCountView
+from .views import ProfileView, UserBootstrapView
 
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('activate/<uidb64>/<token>/', ActivateView.as_view(), name='activate'),
+    path('bootstrap/', UserBootstrapView.as_view(), name='user-bootstrap'),
     path('courses/count/', UserCoursesCountView.as_view(), name='user-courses-count'),
     path('notifications/', UserNotificationsView.as_view(), name='user-notifications'),
+    path('notifications/unread-count/', UnreadNotificationsCountView.as_view(), name='user-notifications-unread'),
+    path('notifications/mark-read/', MarkNotificationsReadView.as_view(), name='user-notifications-mark-read'),
         path('profile/', ProfileView.as_view(), name='user-profile'),
 
 ]
\ No newline at end of file
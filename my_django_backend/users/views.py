@@ -2,19 +2,27 @@ from django.contrib.auth.models import User
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
+from django.db import transaction
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth.models import User
 
+from courses.user_stats import get_user_stats
+
+from .authentication import get_full_user
+from .bootstrap import NOTIFICATIONS_LIMIT, SECTIONS, build_bootstrap, parse_include
+from .notifications import decode_cursor, mark_read, notification_page, unread_count
+from .outbox import enqueue_mail
+
 
 class ProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
+        # request.user sólo trae id e is_active (StatelessJWTAuthentication)
+        user = get_full_user(request.user)
         return Response({
             "email": user.email,
             "full_name": f"{user.first_name} {user.last_name}".strip(),
@@ -23,7 +31,7 @@ class ProfileView(APIView):
         })
 
     def put(self, request):
-        user = request.user
+        user = get_full_user(request.user)
         full_name = request.data.get("full_name", "")
         avatar_url = request.data.get("avatar_url", "")
         # Divide el nombre en first_name y last_name
@@ -44,23 +52,26 @@ class RegisterView(APIView):
             return Response({"detail": "Email y password requeridos"}, status=400)
         if User.objects.filter(email=email).exists():
             return Response({"detail": "El usuario ya existe con este email."}, status=400)
-        user = User.objects.create_user(
-            username=email,
-            email=email,
-            password=password,
-            first_name=first_name,
-            last_name=last_name,
-            is_active=False
-        )
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        token = default_token_generator.make_token(user)
-        activation_link = f'http://localhost:5173/activate/{uid}/{token}/'
-        send_mail(
-            'Activa tu cuenta',
-            f'Activa tu cuenta haciendo clic aquí: {activation_link}',
-            'no-reply@educaia.com',
-            [email]
-        )
+        # El correo se encola con el usuario: se envía fuera de la petición
+        # (send_queued_mail) y sólo si la cuenta llega a crearse
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username=email,
+                email=email,
+                password=password,
+                first_name=first_name,
+                last_name=last_name,
+                is_active=False
+            )
+            uid = urlsafe_base64_encode(force_bytes(user.pk))
+            token = default_token_generator.make_token(user)
+            activation_link = f'http://localhost:5173/activate/{uid}/{token}/'
+            enqueue_mail(
+                'Activa tu cuenta',
+                f'Activa tu cuenta haciendo clic aquí: {activation_link}',
+                'no-reply@educaia.com',
+                [email]
+            )
         return Response({"detail": "Usuario creado. Revisa tu correo para activar la cuenta."}, status=201)
 
 class ActivateView(APIView):
@@ -76,30 +87,97 @@ class ActivateView(APIView):
             return Response({"detail": "Cuenta activada correctamente."})
         return Response({"detail": "Enlace inválido o expirado."}, status=400)
 
+# Resumen del panel del usuario leído de UserStats (una consulta por clave
+# primaria). `count` son los cursos inscritos, como espera ProfilePage.
 class UserCoursesCountView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def get(self, request):
-        # Simulación: Devuelve 0, adapta a tu modelo real si lo tienes
-        return Response({"count": 0})
+        stats = get_user_stats(request.user.id)
+        return Response({
+            "count": stats['enrolled_courses'],
+            "enrolled": stats['enrolled_courses'],
+            "in_progress": stats['in_progress_courses'],
+            "completed": stats['completed_courses'],
+            "watched_seconds": stats['watched_seconds'],
+        })
+
+# Todo lo que pinta la aplicación al arrancar con sesión en una petición:
+# perfil, contadores, últimas notificaciones e ids de cursos inscritos.
+# ?include=profile,counters (por defecto todo) y ?limit= notificaciones
+# (por defecto 5, máximo 20). Como mucho tres consultas.
+class UserBootstrapView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    max_limit = 20
 
+    def get(self, request):
+        include = parse_include(request.query_params.get('include'))
+        if include is None:
+            return Response(
+                {'detail': f"include admite: {', '.join(SECTIONS)}."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', NOTIFICATIONS_LIMIT)), self.max_limit))
+        except ValueError:
+            return Response({'detail': 'limit debe ser un número.'}, status=status.HTTP_400_BAD_REQUEST)
+        data = build_bootstrap(request.user.id, include, limit)
+        if data is None:
+            return Response({'detail': 'Usuario no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
+# Notificaciones del usuario, de la más reciente a la más antigua.
+# ?limit= (por defecto 20, máximo 100), ?unread=1 sólo no leídas y ?cursor=
+# para la página siguiente, cuyo cursor llega en la cabecera X-Next-Cursor
+# (el cuerpo sigue siendo la lista que espera ProfilePage).
 class UserNotificationsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    default_limit = 20
+    max_limit = 100
+
     def get(self, request):
-        # Simulación: Devuelve notificaciones de ejemplo
-        notifications = [
-            {
-                "id": 1,
-                "message": "Bienvenido a educaIA",
-                "created_at": "2025-08-31T00:00:00Z",
-                "is_read": False,
-                "link": None
-            },
-            {
-                "id": 2,
-                "message": "Tu perfil está casi listo. Completa tu información para una mejor experiencia.",
-                "created_at": "2025-08-30T12:00:00Z",
-                "is_read": True,
-                "link": "/profile/settings"
-            }
-        ]
-        return Response(notifications)
\ No newline at end of file
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.default_limit)), self.max_limit))
+        except ValueError:
+            return Response({'detail': 'limit debe ser un número.'}, status=status.HTTP_400_BAD_REQUEST)
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            cursor = decode_cursor(cursor)
+            if cursor is None:
+                return Response({'detail': 'Cursor inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        unread_only = request.query_params.get('unread') in ('1', 'true')
+        notifications, next_cursor = notification_page(request.user.id, limit, cursor or None, unread_only)
+        response = Response(notifications)
+        response['X-Unread-Count'] = unread_count(request.user.id)
+        if next_cursor:
+            response['X-Next-Cursor'] = next_cursor
+        return response
+
+
+class UnreadNotificationsCountView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread': unread_count(request.user.id)})
+
+
+# Marca como leídas las notificaciones {"ids": [...]} o todas con {"all": true}
+class MarkNotificationsReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    max_ids = 500
+
+    def post(self, request):
+        if request.data.get('all') is True:
+            ids = None
+        else:
+            ids = request.data.get('ids')
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return Response(
+                    {'detail': 'Se esperaba "ids" (lista de enteros) o "all": true.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if len(ids) > self.max_ids:
+                return Response(
+                    {'detail': f'Máximo {self.max_ids} notificaciones por petición.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        updated = mark_read(request.user.id, ids)
+        return Response({'updated': updated, 'unread': unread_count(request.user.id)})
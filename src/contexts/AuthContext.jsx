@@ -7,6 +7,7 @@ export const useAuth = () => useContext(AuthContext);
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [profile, setProfile] = useState(null);
+  const [bootstrap, setBootstrap] = useState(null);
   const [loading, setLoading] = useState(false);
 
   // Al montar, si hay token, carga el perfil
@@ -17,28 +18,48 @@ export const AuthProvider = ({ children }) => {
     }
   }, []);
 
-  // Carga el perfil del usuario autenticado
+  // Carga en una sola petición el perfil, los contadores, las últimas
+  // notificaciones y los cursos inscritos del usuario autenticado
   const fetchProfile = async (token) => {
     setLoading(true);
     try {
-      const res = await fetch('http://localhost:8000/api/auth/profile/', {
+      const res = await fetch('http://localhost:8000/api/user/bootstrap/', {
         headers: { Authorization: `Bearer ${token}` }
       });
       if (!res.ok) throw new Error('No autorizado');
-      const profileData = await res.json();
+      const data = await res.json();
       setUser({
-        email: profileData.email,
-        created_at: profileData.created_at,
+        email: data.profile.email,
+        created_at: data.profile.created_at,
       });
-      setProfile(profileData);
+      setProfile(data.profile);
+      setBootstrap(data);
     } catch (error) {
       setUser(null);
       setProfile(null);
+      setBootstrap(null);
       localStorage.removeItem('authToken');
     }
     setLoading(false);
   };
 
+  // Vuelve a pedir sólo algunas secciones (?include=counters,notifications)
+  // y las mezcla con las ya cargadas; un fallo conserva los datos anteriores
+  const refreshBootstrap = async (sections) => {
+    const token = localStorage.getItem('authToken');
+    if (!token) return;
+    try {
+      const res = await fetch(`http://localhost:8000/api/user/bootstrap/?include=${sections.join(',')}`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      if (!res.ok) return;
+      const data = await res.json();
+      setBootstrap(current => ({ ...current, ...data }));
+    } catch (error) {
+      // Sin red se muestran los datos del inicio de sesión
+    }
+  };
+
   // LOGIN
   const signIn = async (email, password) => {
     setLoading(true);
@@ -79,12 +100,13 @@ export const AuthProvider = ({ children }) => {
     localStorage.removeItem('authToken');
     setUser(null);
     setProfile(null);
+    setBootstrap(null);
   };
 
   const isAuthenticated = !!user;
 
   return (
-    <AuthContext.Provider value={{ user, profile, loading, isAuthenticated, signIn, signUp, signOut, fetchProfile }}>
+    <AuthContext.Provider value={{ user, profile, bootstrap, loading, isAuthenticated, signIn, signUp, signOut, fetchProfile, refreshBootstrap }}>
       {children}
     </AuthContext.Provider>
   );
@@ -63,13 +63,14 @@ useEffect(() => {
   const fetchTrendingCourses = async () => {
     setIsLoadingCourses(true);
     try {
-      const response = await fetch('http://localhost:8000/api/courses/');
+      // Sólo la primera página (mejor valorados) y sin la descripción completa
+      const fields = 'id,title,category,tags,duration,rating,cover_image_url';
+      const response = await fetch(`http://localhost:8000/api/courses/?page_size=6&fields=${fields}`);
       if (!response.ok) throw new Error('No se pudieron cargar los cursos populares');
       const data = await response.json();
-      const formattedCourses = data.map(course => ({
+      const formattedCourses = data.results.map(course => ({
         id: course.id,
         title: course.title,
-        description: course.description,
         category: course.category,
         tags: course.tags ? course.tags.split(',') : [],
         duration: course.duration,
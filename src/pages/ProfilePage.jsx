@@ -92,43 +92,15 @@ const ProfilePage = () => {
 
 // Vista general del perfil (Resumen)
 export const ProfileOverview = () => {
-  const { user, profile } = useAuth();
-  const [enrolledCoursesCount, setEnrolledCoursesCount] = useState(0);
-  const [notifications, setNotifications] = useState([]);
-  const { toast } = useToast();
-
+  const { user, profile, bootstrap, refreshBootstrap } = useAuth();
+  // Contadores y notificaciones llegan con /api/user/bootstrap/ al iniciar
+  // sesión; al abrir el resumen se piden de nuevo para no mostrar los de entonces
   useEffect(() => {
-    const fetchData = async () => { 
-      if (user) {
-        // Cursos inscritos
-        try {
-          const token = localStorage.getItem('authToken');
-          const res = await fetch(`http://localhost:8000/api/user/courses/count/`, {
-            headers: { Authorization: `Bearer ${token}` }
-          });
-          if (!res.ok) throw new Error('No se pudo cargar el número de cursos.');
-          const data = await res.json();
-          setEnrolledCoursesCount(data.count || 0);
-        } catch (error) {
-          toast({ title: 'Error', description: error.message, variant: 'destructive' });
-        }
+    if (user) refreshBootstrap(['counters', 'notifications']);
+  }, [user?.email]);
 
-        // Notificaciones recientes
-        try {
-          const token = localStorage.getItem('authToken');
-          const res = await fetch(`http://localhost:8000/api/user/notifications/?limit=5`, {
-            headers: { Authorization: `Bearer ${token}` }
-          });
-          if (!res.ok) throw new Error('No se pudieron cargar las notificaciones.');
-          const data = await res.json();
-          setNotifications(data || []);
-        } catch (error) {
-          toast({ title: 'Error', description: error.message, variant: 'destructive' });
-        }
-      }
-    };
-    fetchData();
-  }, [user, toast]);
+  const enrolledCoursesCount = bootstrap?.counters?.enrolled || 0;
+  const notifications = bootstrap?.notifications || [];
 
   if (!user) return null;
 